@@ -0,0 +1,2 @@
+# 注册 SQLite 连接配置（connection_created 信号），manage.py、wsgi、asgi 都会先导入本包
+from . import db  # noqa: F401
@@ -3,6 +3,11 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The notification SSE stream (/notifications/stream/) is an async view and
+should be served from this entry point, e.g. ``uvicorn backend.asgi:application``.
+Persistent database connections are disabled here (DJANGO_CONN_MAX_AGE=0), as
+Django recommends for ASGI deployments; WSGI keeps CONN_MAX_AGE from settings.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +17,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# 必须在加载配置之前设置，见 settings.DATABASES
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,44 @@
+# backend/db.py
+"""
+SQLite 生产配置：每个新建的数据库连接执行一遍 SQLITE_PRAGMAS（见 settings）。
+  - journal_mode=WAL：读写互不阻塞，写事务提交只追加 WAL 文件；该设置写在数据库文件里，对所有进程生效；
+  - synchronous=NORMAL：WAL 模式下只在检查点时 fsync，断电最多丢最近提交的事务，不会损坏数据库；
+  - busy_timeout：拿不到写锁时在 SQLite 内部等待重试，而不是立即报 "database is locked"；
+  - mmap_size / cache_size：读多的页面走内存映射与更大的页缓存；
+其余连接层的配置在 DATABASES 里：CONN_MAX_AGE 复用连接（上面的 PRAGMA 只在新建连接时执行一次；
+ASGI 部署下为 0，见 backend/asgi.py），
+OPTIONS["transaction_mode"] = "IMMEDIATE" 让事务一开始就拿写锁——先读后写的事务在升级锁时发生冲突，
+SQLite 会直接报错而不走 busy_timeout 的等待。
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_PRAGMA_NAME_RE = re.compile(r"[a-z_]+")
+_PRAGMA_VALUE_RE = re.compile(r"-?\d+|[A-Za-z_]+")
+
+
+def pragma_statements(pragmas) -> list:
+    """{名称: 值} -> PRAGMA 语句；PRAGMA 不支持参数绑定，名称和值只接受数字或标识符"""
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        if not _PRAGMA_NAME_RE.fullmatch(name) or not _PRAGMA_VALUE_RE.fullmatch(value):
+            raise ImproperlyConfigured(f"SQLITE_PRAGMAS 中的 {name!r}: {value!r} 无效")
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+@receiver(connection_created, dispatch_uid="backend.db.apply_sqlite_pragmas")
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    # 直接用底层连接执行：这时 Django 的连接还在初始化，不经过 cursor() 与查询日志
+    for statement in pragma_statements(pragmas):
+        connection.connection.execute(statement)
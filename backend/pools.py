@@ -0,0 +1,100 @@
+# backend/pools.py
+"""
+各功能共用的后台进程池（上传图片压缩、图片多尺寸版本、批量海报、名单导入的密码哈希）：
+  - 每个服务进程只有一个池，进程数 PROCESS_POOL_WORKERS（None 表示 min(2, 可用 CPU 数)，
+    0 表示不建进程池、各功能在当前线程内直接执行），这就是每个服务进程额外启动的进程总数；
+  - spawn 启动：子进程不继承父进程（多线程的服务进程）的线程与数据库连接；
+    init() 在子进程里先初始化 Django，之后才反序列化交来的任务，所以任务函数可以放在依赖模型的模块里；
+  - 子进程意外退出后进程池不可再用，submit / map 换一个新池重试一次；
+  - 各功能自己的过载上限（排队名额、并发导出数）仍由各自模块控制。
+管理命令可以用 new_pool() 另建一个临时池，按命令行参数使用更多进程，不占服务进程的名额。
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+def init():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    import django
+    django.setup()
+
+
+def available_cpus() -> int:
+    # 容器里 cpu_count() 可能大于实际可用核数
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+
+def max_workers() -> int:
+    configured = getattr(settings, "PROCESS_POOL_WORKERS", None)
+    if configured is not None:
+        return configured
+    return min(2, available_cpus())
+
+
+def new_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init,
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = new_pool(max_workers())
+        return _pool
+
+
+def discard(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(fn, *args):
+    """交给共用进程池，返回 Future；调用方需先确认 max_workers() > 0"""
+    for attempt in range(2):
+        pool = get_pool()
+        try:
+            return pool.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            discard(pool)
+            if attempt:
+                raise
+
+
+def map_all(fn, items, *, workers=None, chunksize=1) -> list:
+    """
+    并行执行并按输入顺序返回结果列表。workers 为 None 时用共用进程池（中途池损坏会整体重试，
+    只用于可重复执行的任务）；指定 workers 时另建一个临时池，用完关闭；进程数不足 2 时在当前线程执行。
+    """
+    items = list(items)
+    if workers is not None:
+        if workers <= 1:
+            return [fn(item) for item in items]
+        with new_pool(workers) as pool:
+            return list(pool.map(fn, items, chunksize=chunksize))
+
+    if max_workers() <= 1:
+        return [fn(item) for item in items]
+    for attempt in range(2):
+        pool = get_pool()
+        try:
+            return list(pool.map(fn, items, chunksize=chunksize))
+        except (BrokenProcessPool, RuntimeError):
+            discard(pool)
+            if attempt:
+                raise
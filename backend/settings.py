@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
     'users',         # 用户管理应用
     'tasks',         # 任务管理应用
     'notifications',  # 通知管理应用
+    'uploads',       # 上传图片及其多尺寸版本
 ]
 
 
@@ -68,6 +70,7 @@ MIDDLEWARE = [
 # CORS_ALLOW_ALL_ORIGINS = True
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['Link']  # 通知列表的下一页游标放在 Link 头中
 CSRF_TRUSTED_ORIGINS = ['http://117.72.148.123']
 
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -75,13 +78,18 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+SIMPLE_JWT = {
+    # 刷新时按数据库中最新的角色 / 等级签发 access token（见 users/authentication.py）
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.ClaimsTokenRefreshSerializer',
+}
+
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -101,6 +109,55 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'  # 通知 SSE 推送需要以 ASGI 方式部署
+
+# SSE 心跳间隔（秒），同时也是跨进程补查新通知的间隔
+NOTIFICATION_STREAM_HEARTBEAT = 15
+
+# 同一用户、同一类型、同一任务的未读通知在该窗口（秒）内合并为一条，0 表示不合并
+NOTIFICATION_COALESCE_WINDOW = 600
+
+# 已读通知保留天数，超过后由 archive_notifications 命令归档（或删除）
+NOTIFICATION_RETENTION_DAYS = 90
+
+# 排行榜快照由 refresh_leaderboards 定时刷新（cron），接口只读快照；超过这个秒数仍未刷新时记录警告
+LEADERBOARD_MAX_AGE = 3600
+
+# 名单导入：接口一次最多导入的行数（每个密码哈希约 0.5 秒，需在代理超时之前返回；
+# 更大的名单用 manage.py import_roster）
+ROSTER_IMPORT_MAX_ROWS = 50
+
+# 用户名片（批量查询接口）缓存秒数
+USER_CARD_CACHE_TIMEOUT = 60
+
+# 二维码海报磁盘缓存（MEDIA_ROOT/qr_cache）的容量上限，以及响应的 Cache-Control max-age（秒）
+QR_POSTER_CACHE_MAX_BYTES = 200 * 1024 * 1024
+QR_POSTER_MAX_AGE = 30 * 24 * 3600
+
+# 批量生成海报：单次最多条数；本进程同时进行的导出数，超过时接口返回 503
+QR_BATCH_MAX_ENTRIES = 500
+QR_BATCH_MAX_CONCURRENT = 2
+
+# 后台进程池（backend/pools.py）的进程数，上传压缩、图片多尺寸版本、批量海报、名单导入共用，
+# 即每个服务进程额外启动的进程总数；None 表示 min(2, 可用 CPU 数)，0 表示不建进程池、在请求内同步执行
+PROCESS_POOL_WORKERS = None
+
+# 上传文件垃圾回收（gc_uploads）的宽限期（天）：这段时间内上传过的文件即使无人引用也保留
+UPLOAD_GC_GRACE_DAYS = 7
+
+# 上传图片压缩（在上面的进程池里执行）：每个服务进程最多排队的张数（None 表示进程数 × 4，超出返回 503）、
+# 等待超时（秒）、压缩力度 fast / balanced / max
+UPLOAD_ENCODE_MAX_PENDING = None
+UPLOAD_ENCODE_TIMEOUT = 30
+UPLOAD_ENCODE_EFFORT = 'balanced'
+
+# 媒体文件服务（/media/）：MEDIA_ACCEL 为 None 时由 Django 流式返回；'nginx' 返回 X-Accel-Redirect，
+# 需要一个 internal 的 location 把 MEDIA_ACCEL_PREFIX 映射到 MEDIA_ROOT；'apache' 返回 X-Sendfile（mod_xsendfile）
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# 需要登录才能访问的子目录前缀，例如 ('private/',)；未按内容哈希命名的文件的缓存时间（秒）
+MEDIA_PROTECTED_PREFIXES = ()
+MEDIA_MAX_AGE = 3600
 
 
 # settings.py
@@ -116,6 +173,21 @@ LEVEL_THRESHOLDS = [
 ]
 
 
+# 缓存：token_version（见 users/authentication.py）、排行榜重建锁等。
+# 默认的 LocMemCache 每个进程一份：一个进程里的角色 / 等级变更或停用，其它进程最晚
+# TOKEN_VERSION_CACHE_TIMEOUT 秒后才生效。多进程部署请改成共享缓存，例如：
+#     CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#                           'LOCATION': 'redis://127.0.0.1:6379/1'}}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# 缓存未命中时从数据库读到的 token_version 缓存多少秒
+TOKEN_VERSION_CACHE_TIMEOUT = 60
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -123,9 +195,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # 持久连接：每个线程的连接最多复用 10 分钟，复用前先检查连接是否可用。只适用于 WSGI 部署：
+        # ASGI 下同步代码在线程池里执行，请求结束时的清理不一定在打开连接的线程上，连接会泄漏，
+        # Django 文档要求关闭持久连接，backend/asgi.py 会在加载配置前把 DJANGO_CONN_MAX_AGE 设为 0
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # 事务开始即拿写锁，并发写入时排队等待，而不是在升级锁时报 "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# 每个新连接执行的 PRAGMA（backend/db.py）；为空时保持 SQLite 默认配置
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,        # 毫秒，与上面的 timeout 一致
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,         # 负数表示 KiB，约 64MB
+    'temp_store': 'memory',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import pools
+from .db import apply_sqlite_pragmas, pragma_statements
+
+
+class SqliteProfileTests(TestCase):
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_connection(self):
+        # 测试库在内存中，journal_mode 固定为 memory；其余设置照常生效
+        self.assertEqual(self._pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self._pragma("busy_timeout"), 20000)
+        self.assertEqual(self._pragma("cache_size"), -64000)
+        self.assertEqual(self._pragma("temp_store"), 2)  # MEMORY
+
+    @override_settings(SQLITE_PRAGMAS={"busy_timeout": 1234})
+    def test_pragmas_read_from_settings(self):
+        connection.ensure_connection()
+        apply_sqlite_pragmas(sender=connection.__class__, connection=connection)
+        self.assertEqual(self._pragma("busy_timeout"), 1234)
+
+
+class PragmaStatementTests(SimpleTestCase):
+    def test_statements(self):
+        self.assertEqual(
+            pragma_statements({"journal_mode": "wal", "cache_size": -2000}),
+            ["PRAGMA journal_mode = wal", "PRAGMA cache_size = -2000"],
+        )
+
+    def test_rejects_unsafe_values(self):
+        for pragmas in ({"journal_mode": "wal; DROP TABLE x"}, {"cache size": 1}, {"synchronous": ""}):
+            with self.assertRaises(ImproperlyConfigured):
+                pragma_statements(pragmas)
+
+
+class ConnMaxAgeTests(SimpleTestCase):
+    def _conn_max_age(self, entry_module):
+        env = {k: v for k, v in os.environ.items() if k not in ("DJANGO_CONN_MAX_AGE", "DJANGO_SETTINGS_MODULE")}
+        output = subprocess.run(
+            [sys.executable, "-c", f"import {entry_module}; from django.conf import settings; "
+                                   "print(settings.DATABASES['default']['CONN_MAX_AGE'])"],
+            cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        return int(output.strip().splitlines()[-1])
+
+    def test_persistent_connections_disabled_under_asgi(self):
+        self.assertEqual(self._conn_max_age("backend.asgi"), 0)
+        self.assertEqual(self._conn_max_age("backend.wsgi"), 600)
+
+
+class ProcessPoolTests(SimpleTestCase):
+    @override_settings(PROCESS_POOL_WORKERS=0)
+    def test_runs_inline_without_workers(self):
+        self.assertEqual(pools.max_workers(), 0)
+        self.assertEqual(pools.map_all(str, [1, 2]), ["1", "2"])
+
+    @override_settings(PROCESS_POOL_WORKERS=1)
+    def test_shared_pool_is_reused_and_replaced_when_broken(self):
+        pool = pools.get_pool()
+        self.addCleanup(lambda: pools.discard(pools.get_pool()))
+        self.assertEqual(pools.submit(abs, -3).result(timeout=60), 3)
+        self.assertIs(pools.get_pool(), pool)
+
+        # 子进程意外退出：池损坏，下一次提交换一个新池
+        with self.assertRaises(BrokenProcessPool):
+            pools.submit(os._exit, 1).result(timeout=60)
+        self.assertEqual(pools.submit(abs, -4).result(timeout=60), 4)
+        self.assertIsNot(pools.get_pool(), pool)
+        self.assertEqual(pools.map_all(abs, [-1, -2]), [1, 2])
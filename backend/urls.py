@@ -14,12 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
 from django.urls import path
-from django.urls import path, include
-from uploads.views import upload_image  # 下面会创建这个视图
+from django.urls import path, include, re_path
+from uploads.views import image_variant, serve_media, upload_image  # 下面会创建这个视图
 from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -30,8 +31,12 @@ urlpatterns = [
     path('tasks/', include('tasks.urls')),
     path('notifications/', include('notifications.urls')),
     path('upload', upload_image, name='api-upload'),
+    path('upload/variants/<int:set_id>/<str:name>.<str:fmt>', image_variant, name='api-upload-variant'),
     path("qr/", include("qrcode_api.urls")),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'), # 刷新 access
 ]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+
+# 媒体文件：权限检查后由前端服务器发送（X-Accel-Redirect / X-Sendfile），未配置时由 Django 流式返回，见 uploads/serving.py
+urlpatterns += [
+    re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", serve_media, name='media'),
+]
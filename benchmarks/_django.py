@@ -0,0 +1,33 @@
+"""
+基准脚本公用的 Django 初始化：使用临时 SQLite 数据库并执行迁移，不触碰项目的 db.sqlite3。
+
+    python benchmarks/bench_xxx.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(db_options=None, overrides=None):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+    from django.conf import settings
+
+    tmpdir = tempfile.mkdtemp(prefix="adventurer-bench-")
+    settings.DATABASES["default"]["NAME"] = os.path.join(tmpdir, "bench.sqlite3")
+    if db_options:
+        settings.DATABASES["default"].update(db_options)
+    for name, value in (overrides or {}).items():
+        setattr(settings, name, value)
+    settings.MEDIA_ROOT = os.path.join(tmpdir, "media")
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    django.setup()
+
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+    return tmpdir
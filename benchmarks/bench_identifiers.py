@@ -0,0 +1,93 @@
+"""
+identifier 分配基准：旧的“随机 + exists() 重试” vs 序号置换分配器，
+分别在 identifier 空间占用 10% / 50% / 90% 时测量每次分配的 SQL 语句数与耗时。
+已占用的全部是旧实现随机生成的 identifier（迁移后的真实情况），序号从 0 开始，新分配器同样会撞上它们；
+旧实现的期望重试次数为 1 / (1 - 占用率)，新分配器每轮固定 3 条语句（读序号、IN 查询、条件 UPDATE），
+每轮按估计的空闲比例多取候选，轮数基本不随占用率增长。
+
+    python benchmarks/bench_identifiers.py [--samples 500]
+"""
+import argparse
+import random
+import time
+
+from _django import setup
+
+setup()
+
+from django.db import connection  # noqa: E402
+
+from users.identifiers import IDENTIFIER_MIN, IDENTIFIER_SPACE  # noqa: E402
+from users.models import CustomUser, IdentifierSequence, allocate_identifiers  # noqa: E402
+
+
+def legacy_generate_unique_user_id():
+    # 旧实现（原样保留以作对比）
+    while True:
+        user_id = ''.join([str(random.randint(0, 9)) for _ in range(6)])
+        if user_id[0] != '0' and not CustomUser.objects.filter(identifier=user_id).exists():
+            return user_id
+
+
+# 迁移前旧实现随机生成的 identifier：按固定种子打乱整个空间，依次取前 N 个
+LEGACY_ORDER = random.Random(0).sample(range(IDENTIFIER_MIN, IDENTIFIER_MIN + IDENTIFIER_SPACE), IDENTIFIER_SPACE)
+
+
+def fill_to(target, current):
+    """插入用户直到占用 target 个 identifier；全部是旧版随机 identifier，新旧两种分配都要面对碰撞"""
+    batch = 20000
+    for start in range(current, target, batch):
+        end = min(start + batch, target)
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(username=f"u{i}", password="!", nickname=f"u{i}", identifier=str(LEGACY_ORDER[i]))
+                for i in range(start, end)
+            ],
+            batch_size=batch,
+        )
+    return target
+
+
+def measure(fn, samples):
+    # 用 execute_wrapper 计数（包含 BEGIN/COMMIT），不受查询日志条数上限影响
+    statements = 0
+
+    def counter(execute, sql, params, many, context):
+        nonlocal statements
+        statements += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        t0 = time.perf_counter()
+        for _ in range(samples):
+            fn()
+        elapsed = time.perf_counter() - t0
+    return statements / samples, elapsed / samples * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'占用率':>6} | {'旧: 语句/次':>10} {'旧: ms/次':>9} | {'新: 语句/次':>10} {'新: ms/次':>9} | {'新: 批量500 ms':>12}")
+    filled = 0
+    for occupancy in (0.10, 0.50, 0.90):
+        filled = fill_to(int(IDENTIFIER_SPACE * occupancy), filled)
+        # 相当于在这个占用率下刚切换到新分配器：序号从 0 开始
+        IdentifierSequence.objects.update_or_create(name="user", defaults={"next_value": 0})
+
+        old_q, old_ms = measure(legacy_generate_unique_user_id, args.samples)
+        new_q, new_ms = measure(lambda: allocate_identifiers(1), args.samples)
+
+        t0 = time.perf_counter()
+        batch = allocate_identifiers(500)
+        batch_ms = (time.perf_counter() - t0) * 1000
+        assert len(set(batch)) == 500
+
+        # 分配出去的只是编号，没有落库，不影响下一档的占用率
+        print(f"{occupancy:>6.0%} | {old_q:>10.2f} {old_ms:>9.3f} | {new_q:>10.2f} {new_ms:>9.3f} | {batch_ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+海报底图 / 字体缓存基准：逐次绘制海报（不经过磁盘缓存），
+“旧”为每次请求前清空 assets 缓存（等价于原先每次重新解码底图、解析字体），
+“新”为缓存命中。统计每次请求的耗时、Python 侧分配峰值（tracemalloc）
+以及新触及的内存（缺页数 × 页大小，近似 Pillow 在 C 层分配的像素缓冲）。
+
+    python benchmarks/bench_qr_assets.py [--repeat 20]
+"""
+import argparse
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+# 固定 glibc 的 mmap 阈值：大块内存每次都向系统申请、释放时归还，缺页数才能反映每次请求的分配量
+if "MALLOC_MMAP_THRESHOLD_" not in os.environ:
+    os.execve(sys.executable, [sys.executable, *sys.argv], {**os.environ, "MALLOC_MMAP_THRESHOLD_": "131072"})
+
+from _django import setup  # noqa: E402
+
+setup()
+
+from qrcode_api import assets, render  # noqa: E402
+
+PAGE_SIZE = resource.getpagesize()
+
+
+def run(repeat, cold):
+    timings, py_peaks, touched = [], [], []
+    for i in range(repeat):
+        if cold:
+            assets.clear()
+        params = {"data": f"https://example.com/u/{i}", "label": "冒险者"}
+        faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+        tracemalloc.start()
+        start = time.perf_counter()
+        render.render_poster(render.normalize_params(params))
+        timings.append((time.perf_counter() - start) * 1000)
+        py_peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        touched.append((resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults) * PAGE_SIZE)
+    return statistics.median(timings), statistics.median(py_peaks), statistics.median(touched)
+
+
+def asset_lookup_ms(repeat, cold):
+    """只测取底图 + 字体这一步"""
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            assets.clear()
+        start = time.perf_counter()
+        assets.get_base_image()
+        assets.get_font(render.TEXT_FONT_SIZE)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    run(2, cold=False)  # 预热导入与缓存
+    print(f"{'':<6} | {'取资源 ms':>9} | {'整个请求 ms':>10} | {'Python 峰值 KB':>13} | {'新触及内存 MB':>12}")
+    for label, cold in (("旧", True), ("新", False)):
+        lookup = asset_lookup_ms(args.repeat, cold)
+        ms, peak, touched = run(args.repeat, cold)
+        print(f"{label:<6} | {lookup:9.2f} | {ms:10.1f} | {peak / 1024:13.1f} | {touched / 1024 / 1024:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+海报输出格式基准：对同一张海报，比较各格式 / 尺寸的绘制耗时、编码耗时与文件大小。
+第一行是改动前的输出方式（全尺寸 RGBA、PNG 默认压缩级别 6），作为对照。
+
+    python benchmarks/bench_qr_formats.py [--repeat 5]
+"""
+import argparse
+import io
+import statistics
+import time
+
+from _django import setup
+
+setup()
+
+from qrcode_api import render  # noqa: E402
+
+QUERY = {"data": "https://example.com/tasks/42/invite?from=123456", "label": "冒险者公会"}
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def encode(image, pil_format, options):
+    buf = io.BytesIO()
+    image.save(buf, format=pil_format, **options)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    render.render_poster(render.normalize_params(QUERY))  # 预热资源缓存
+
+    rows = []
+    params = render.normalize_params(QUERY)
+    compose_ms, image = median_ms(lambda: render.compose_poster(params), args.repeat)
+    rgba = image.convert("RGBA")
+    encode_ms, data = median_ms(lambda: encode(rgba, "PNG", {}), args.repeat)
+    rows.append(("改动前 png(6) RGBA", "原图", compose_ms, encode_ms, len(data)))
+    for level in (3, 6):
+        encode_ms, data = median_ms(lambda: encode(image, "PNG", {"compress_level": level}), args.repeat)
+        rows.append((f"png({level})", "原图", compose_ms, encode_ms, len(data)))
+
+    for width in (None, 621, 310):
+        for fmt, (pil_format, _, options) in render.OUTPUT_FORMATS.items():
+            params = render.normalize_params({**QUERY, "format": fmt, **({"width": width} if width else {})})
+            if pil_format is None:  # svg 不经过 Pillow，生成耗时全部计入“绘制”
+                compose_ms, data = median_ms(lambda: render.render_svg(params), args.repeat)
+                rows.append((fmt, f"{width}px" if width else "原图", compose_ms, 0.0, len(data)))
+                continue
+            compose_ms, image = median_ms(lambda: render.compose_poster(params), args.repeat)
+            if pil_format == "JPEG":
+                image = image.convert("RGB")
+            encode_ms, data = median_ms(lambda: encode(image, pil_format, options), args.repeat)
+            label = f"{fmt}(1)" if fmt == "png" else fmt
+            rows.append((label, f"{width}px" if width else "原图", compose_ms, encode_ms, len(data)))
+
+    print(f"{'格式':<20} {'宽度':<6} | {'绘制 ms':>8} | {'编码 ms':>8} | {'大小 KB':>8}")
+    for label, width, compose_ms, encode_ms, size in rows:
+        print(f"{label:<20} {width:<6} | {compose_ms:8.1f} | {encode_ms:8.1f} | {size / 1024:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+SQLite 并发写入压测：多个线程同时执行
+  - 接取任务（POST /tasks/<id>/apply/，改任务、写接取关系、给发布老师发通知）；
+  - 单条通知（create_notification，带 changed_fields，先查再写的合并路径）；
+  - 群发通知（broadcast_system_notification，只写库不发邮件，按批 bulk_create）。
+每个操作结束后调用 close_old_connections()，模拟一次请求结束时的连接处理（测试客户端本身不会关连接），
+再停顿 --think 毫秒：没有停顿时刚提交的线程总能立刻再抢到写锁，在 busy_timeout 里轮询等待的线程会被饿死，
+与实际请求的到达方式不符。
+依次比较两种配置，各自在独立子进程、独立临时库中运行：
+  - before：SQLite 默认配置（回滚日志、synchronous=FULL、默认 5s 超时、延迟事务、每次请求新建连接）；
+  - after：项目配置（settings.DATABASES 与 SQLITE_PRAGMAS，见 backend/db.py）。
+输出每类操作的吞吐、"database is locked" 次数与 p99 延迟。
+
+    python benchmarks/bench_sqlite_contention.py [--duration 15] [--appliers 4] [--notifiers 2] [--broadcasters 1] [--think 10]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+KINDS = ("apply", "notify", "broadcast")
+PROFILES = {
+    "before": {
+        "db_options": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {}},
+        "overrides": {"SQLITE_PRAGMAS": {}},
+    },
+    "after": {"db_options": None, "overrides": {}},
+}
+
+
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_profile(name, args):
+    """子进程内执行：准备数据、并发压测，最后把结果以一行 JSON 打印出来"""
+    from _django import setup
+
+    profile = PROFILES[name]
+    setup(db_options=profile["db_options"],
+          overrides={"MAX_ACTIVE_TASKS": 10 ** 9, **profile["overrides"]})
+
+    from datetime import timedelta
+
+    from django.db import OperationalError, close_old_connections, connection
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+
+    from notifications.broadcast_utils import broadcast_system_notification
+    from notifications.utils import create_notification
+    from tasks.models import Task
+    from users.identifiers import identifier_for_sequence
+    from users.models import CustomUser
+
+    # 数据：管理员、发布任务的老师（不设邮箱，不触发邮件线程）、接取任务的学生、群发的收件人
+    seq = iter(range(10 ** 9))
+    admin = CustomUser.objects.create_user(username="admin", password="!", is_staff=True,
+                                           role="teacher", identifier=identifier_for_sequence(next(seq)))
+    teacher = CustomUser.objects.create_user(username="teacher", password="!", role="teacher",
+                                             identifier=identifier_for_sequence(next(seq)))
+    students = [
+        CustomUser(username=f"s{i}", password="!", role="student", email=f"s{i}@example.com",
+                   identifier=identifier_for_sequence(next(seq)))
+        for i in range(args.recipients)
+    ]
+    CustomUser.objects.bulk_create(students, batch_size=500)
+    students = list(CustomUser.objects.filter(role="student").order_by("id"))
+    deadline = timezone.now() + timedelta(days=30)
+    Task.objects.bulk_create(
+        [Task(title=f"任务{i}", description="压测", task_type="solo", publisher=teacher,
+              maximum_users=10 ** 6, deadline=deadline) for i in range(args.tasks)],
+        batch_size=500,
+    )
+    task_ids = list(Task.objects.values_list("id", flat=True))
+    connection.close()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {kind: {"ok": 0, "locked": 0, "failed": 0, "ms": []} for kind in KINDS}
+
+    def record(kind, elapsed, outcome):
+        with lock:
+            results[kind][outcome] += 1
+            if outcome == "ok":
+                results[kind]["ms"].append(elapsed * 1000)
+
+    def loop(kind, op):
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    op()
+                    outcome = "ok"
+                except OperationalError as exc:
+                    outcome = "locked" if "locked" in str(exc) else "failed"
+                finally:
+                    close_old_connections()
+                record(kind, time.perf_counter() - start, outcome)
+                stop.wait(args.think / 1000)
+        finally:
+            connection.close()
+
+    def applier(index):
+        student = students[index]
+        client = APIClient(HTTP_HOST="127.0.0.1", raise_request_exception=True)
+        client.force_authenticate(student)
+        order = task_ids[:]
+        random.Random(index).shuffle(order)
+        pending = iter(order)
+
+        def op():
+            client.post(f"/tasks/{next(pending)}/apply/", {}, format="json")
+        return op
+
+    def notifier(index):
+        rng = random.Random(1000 + index)
+
+        def op():
+            user = rng.choice(students)
+            task = Task(pk=rng.choice(task_ids[:50]))
+            create_notification(user=user, type="system", message="任务信息已更新", task=task,
+                                send_email=False, changed_fields=[rng.choice(["title", "deadline", "description"])])
+        return op
+
+    def broadcaster(index):
+        def op():
+            broadcast_system_notification(admin, "压测公告", "系统维护通知", send_email=False,
+                                          verbose=False, batch_size=100)
+        return op
+
+    threads = []
+    for kind, factory, count in (("apply", applier, args.appliers), ("notify", notifier, args.notifiers),
+                                 ("broadcast", broadcaster, args.broadcasters)):
+        threads += [threading.Thread(target=loop, args=(kind, factory(i))) for i in range(count)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        kind: {
+            "ops": r["ok"] / elapsed,
+            "ok": r["ok"],
+            "locked": r["locked"],
+            "failed": r["failed"],
+            "p50": statistics.median(r["ms"]) if r["ms"] else float("nan"),
+            "p99": percentile(r["ms"], 0.99),
+        }
+        for kind, r in results.items()
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=15, help="每种配置的压测秒数")
+    parser.add_argument("--appliers", type=int, default=4, help="接取任务的线程数（每个线程一个学生）")
+    parser.add_argument("--notifiers", type=int, default=2, help="写单条通知的线程数")
+    parser.add_argument("--broadcasters", type=int, default=1, help="群发通知的线程数")
+    parser.add_argument("--think", type=float, default=10, help="每个线程两次操作之间停顿的毫秒数")
+    parser.add_argument("--recipients", type=int, default=300, help="学生人数，即每次群发的收件人数")
+    parser.add_argument("--tasks", type=int, default=2000, help="可接取的任务数")
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args.profile, args)
+        return
+
+    print(f"{args.appliers} 个接取线程、{args.notifiers} 个通知线程、{args.broadcasters} 个群发线程"
+          f"（{args.recipients} 人），操作间隔 {args.think:g}ms，每种配置 {args.duration:g}s")
+    rows = []
+    for name in PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, "--profile", name, *sys.argv[1:]],
+            cwd=Path(__file__).resolve().parent, env=os.environ, check=True, capture_output=True, text=True,
+        ).stdout
+        rows.append((name, json.loads(output.strip().splitlines()[-1])))
+
+    print(f"{'配置':<8} | {'操作':<10} | {'成功':>6} | {'ops/s':>7} | {'locked':>6} | {'其它错误':>8} | "
+          f"{'p50 ms':>8} | {'p99 ms':>8}")
+    for name, result in rows:
+        for kind in KINDS:
+            r = result[kind]
+            print(f"{name:<8} | {kind:<10} | {r['ok']:>6} | {r['ops']:7.1f} | {r['locked']:>6} | {r['failed']:>8} | "
+                  f"{r['p50']:8.1f} | {r['p99']:8.1f}")
+        total = sum(result[kind]["ops"] for kind in KINDS)
+        locked = sum(result[kind]["locked"] for kind in KINDS)
+        print(f"{name:<8} | {'合计':<10} | {'':>6} | {total:7.1f} | {locked:>6} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+上传压缩期间其它接口的延迟：启动多线程的 runserver，若干线程持续上传需要压缩的大图（>2MB 的 JPEG），
+另一个线程反复请求一个轻量接口（已有磁盘缓存的二维码海报），统计它的 p50 / p99。
+依次比较：没有上传（对照）、PROCESS_POOL_WORKERS=0（在请求线程内压缩，改动前的做法）、进程池压缩。
+每次上传的文件末尾追加不同的字节，内容哈希不同，不会被去重跳过压缩。
+
+    python benchmarks/bench_upload_load.py [--duration 15] [--uploaders 4] [--workers 2] [--effort balanced]
+"""
+import argparse
+import http.client
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from _django import BASE_DIR, setup
+
+tmpdir = setup()
+
+from django.conf import settings  # noqa: E402
+from PIL import Image  # noqa: E402
+
+PROBE_PATH = "/qr/compose/?data=https://example.com/probe&label=probe"
+BOUNDARY = "benchboundary7f3a"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_photo():
+    # 平滑噪声放大成 4000x3000，接近照片的压缩难度，JPEG 约 3MB
+    noise = Image.frombytes("RGB", (250, 188), os.urandom(250 * 188 * 3))
+    buf = io.BytesIO()
+    noise.resize((4000, 3000), Image.BICUBIC).save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def multipart(content, index):
+    # JPEG 解码器会忽略 EOI 之后的字节：每次上传的文件哈希不同，但画面相同
+    payload = content + f"bench-{index}".encode()
+    head = (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"p{index}.jpg\"\r\n"
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    return head + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def write_settings(mode_dir, workers, effort):
+    mode_dir.mkdir(parents=True, exist_ok=True)
+    (mode_dir / "bench_settings.py").write_text(
+        "from backend.settings import *  # noqa: F401,F403\n"
+        f"DATABASES['default']['NAME'] = {settings.DATABASES['default']['NAME']!r}\n"
+        f"MEDIA_ROOT = {str(mode_dir / 'media')!r}\n"
+        "DEBUG = False\n"
+        f"PROCESS_POOL_WORKERS = {workers!r}\n"
+        f"UPLOAD_ENCODE_EFFORT = {effort!r}\n"
+    )
+
+
+def start_server(mode_dir, port):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="bench_settings",
+               PYTHONPATH=os.pathsep.join([str(mode_dir), str(BASE_DIR)]))
+    proc = subprocess.Popen(
+        [sys.executable, "manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            status, _ = request(port, "GET", PROBE_PATH)  # 顺便生成探测用的海报缓存
+            if status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("runserver 没有启动")
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    try:
+        conn.request(method, path, body=body, headers={"Host": "127.0.0.1", **(headers or {})})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_mode(label, photo, args, workers, uploaders):
+    mode_dir = Path(tmpdir) / label
+    write_settings(mode_dir, workers, args.effort)
+    port = free_port()
+    proc = start_server(mode_dir, port)
+    stop = threading.Event()
+    probe_ms, upload_ms, statuses = [], [], {}
+    lock = threading.Lock()
+    counter = iter(range(10 ** 9))
+
+    def upload_loop():
+        while not stop.is_set():
+            with lock:
+                index = next(counter)
+            body = multipart(photo, index)
+            start = time.perf_counter()
+            status, _ = request(port, "POST", "/upload", body,
+                                {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    upload_ms.append((time.perf_counter() - start) * 1000)
+
+    def probe_loop():
+        # 每次新建连接：复用连接时 Nagle 与延迟 ACK 会给小请求额外加上约 40ms
+        while not stop.is_set():
+            start = time.perf_counter()
+            request(port, "GET", PROBE_PATH)
+            probe_ms.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=upload_loop) for _ in range(uploaders)]
+    threads.append(threading.Thread(target=probe_loop))
+    try:
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    return {
+        "label": label,
+        "probes": len(probe_ms),
+        "p50": statistics.median(probe_ms) if probe_ms else float("nan"),
+        "p99": percentile(probe_ms, 0.99),
+        "max": max(probe_ms) if probe_ms else float("nan"),
+        "ok": statuses.get(200, 0),
+        "busy": statuses.get(503, 0),
+        "upload_p50": statistics.median(upload_ms) if upload_ms else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=15, help="每种模式的压测秒数")
+    parser.add_argument("--uploaders", type=int, default=4, help="并发上传线程数")
+    parser.add_argument("--workers", type=int, default=None, help="进程池大小，默认同 PROCESS_POOL_WORKERS")
+    parser.add_argument("--effort", default="balanced", choices=["fast", "balanced", "max"])
+    args = parser.parse_args()
+
+    photo = make_photo()
+    print(f"上传文件 {len(photo) / 1024 / 1024:.1f} MB，{args.uploaders} 个上传线程，每种模式 {args.duration:g}s，"
+          f"压缩力度 {args.effort}，可用 CPU {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}")
+
+    results = [
+        run_mode("idle", photo, args, workers=args.workers, uploaders=0),
+        run_mode("inline", photo, args, workers=0, uploaders=args.uploaders),
+        run_mode("pool", photo, args, workers=args.workers, uploaders=args.uploaders),
+    ]
+    print(f"{'模式':<8} | {'探测次数':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'max ms':>8} | "
+          f"{'上传成功':>8} | {'503':>5} | {'上传 p50 ms':>11}")
+    for r in results:
+        print(f"{r['label']:<8} | {r['probes']:>8} | {r['p50']:8.1f} | {r['p99']:8.1f} | {r['max']:8.1f} | "
+              f"{r['ok']:>8} | {r['busy']:>5} | {r['upload_p50']:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+用户搜索基准：10 万用户下对比
+  - 旧写法：nickname/realname icontains 全表扫描；
+  - 新实现：NOCASE 索引前缀匹配 + FTS5 trigram 模糊匹配（users.search.search_users）。
+目标是每次搜索 < 10 ms。
+
+    python benchmarks/bench_user_search.py [--users 100000] [--repeat 50]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from _django import setup
+
+setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from users.identifiers import identifier_for_sequence  # noqa: E402
+from users.models import CustomUser  # noqa: E402
+from users.search import search_users  # noqa: E402
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华"
+HANDLES = ["dragon", "shadow", "knight", "ranger", "wizard", "archer", "phoenix", "tiger", "storm", "blade"]
+
+
+def populate(n):
+    rng = random.Random(42)
+    batch = []
+    for i in range(n):
+        if i % 2:
+            nickname = f"{rng.choice(HANDLES)}{rng.randint(1, 9999)}"
+        else:
+            nickname = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+        realname = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(2))
+        batch.append(CustomUser(username=f"u{i}", password="!", nickname=nickname, realname=realname,
+                                identifier=identifier_for_sequence(i)))
+        if len(batch) == 10000:
+            CustomUser.objects.bulk_create(batch)
+            batch = []
+    CustomUser.objects.bulk_create(batch)
+
+
+def legacy_search(query, limit=20):
+    return list(
+        CustomUser.objects.filter(Q(nickname__icontains=query) | Q(realname__icontains=query))
+        .order_by('nickname').values('identifier', 'nickname')[:limit]
+    )
+
+
+def measure(fn, repeat):
+    fn()  # 预热
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    populate(args.users)
+    print(f"写入 {args.users} 个用户（含触发器同步 FTS）: {time.perf_counter() - start:.1f}s")
+    # FTS 表是空的（触发器丢失）时模糊搜索也会很快，先确认每个用户都已入索引
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM users_customuser_search")
+        indexed = cursor.fetchone()[0]
+    assert indexed == CustomUser.objects.count(), f"FTS 只有 {indexed} 行，同步触发器缺失"
+
+    cases = [
+        ("单字前缀", "王", False),
+        ("两字前缀", "王伟", False),
+        ("英文前缀", "drag", False),
+        ("大小写", "SHADOW12", False),
+        ("模糊: 子串", "hoeni", True),
+        ("模糊: 错字", "phoenxi12", True),
+        ("模糊: 中文", "李伟静", True),
+        ("无结果", "zzzzzz", True),
+    ]
+    print(f"{'场景':<10} {'关键词':<10} | {'旧 中位/p95 ms':>16} | {'新 中位/p95 ms':>16} | 命中")
+    for label, query, fuzzy in cases:
+        old = measure(lambda: legacy_search(query), args.repeat)
+        new = measure(lambda: search_users(query, fuzzy=fuzzy), args.repeat)
+        hits = len(search_users(query, fuzzy=fuzzy))
+        print(f"{label:<10} {query:<10} | {old[0]:7.2f} /{old[1]:7.2f} | {new[0]:7.2f} /{new[1]:7.2f} | {hits}")
+
+    # 改名后索引立即可搜到
+    user = CustomUser.objects.get(username="u0")
+    user.nickname = "独一无二的名字"
+    user.save(update_fields=["nickname"])
+    assert search_users("独一无二")[0]["identifier"] == user.identifier
+    assert [r["identifier"] for r in search_users("一无二的", fuzzy=True)] == [user.identifier]
+    print("改名同步: OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,7 @@ from django.utils.html import strip_tags
 from django.contrib.auth import get_user_model
 
 from .models import Notification
-from .utils import _build_context  # 用你已有的模板样式逻辑
+from .utils import _build_context, bulk_create_notifications  # 用你已有的模板样式逻辑
 
 logger = logging.getLogger(__name__)
 
@@ -22,15 +22,18 @@ def _require_staff(actor):
 
 
 def _iter_chunked(queryset, chunk_size=500):
-    iterator = queryset.iterator(chunk_size=chunk_size)
-    chunk = []
-    for obj in iterator:
-        chunk.append(obj)
-        if len(chunk) >= chunk_size:
-            yield chunk
-            chunk = []
-    if chunk:
+    # 按主键分页，每批一次独立查询：逐批写库时没有读到一半的游标占着读快照，
+    # 否则 SQLite（WAL）在别的连接提交过之后无法把这个连接升级为写，直接报 "database is locked"
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
         yield chunk
+        last_pk = chunk[-1].pk
 
 
 def broadcast_system_notification(
@@ -128,9 +131,8 @@ def broadcast_system_notification(
 
             # 批量写入 Notification
             if create_db_record and new_notifications:
-                with transaction.atomic():
-                    Notification.objects.bulk_create(new_notifications, batch_size=batch_size)
-                    notifications_created += len(new_notifications)
+                bulk_create_notifications(new_notifications, batch_size=batch_size)
+                notifications_created += len(new_notifications)
 
             # 逐封发送（可打印每一封）
             if send_email and email_messages:
@@ -254,9 +256,8 @@ def broadcast_system_notification_bcc(
                         created_at=timezone.now(),
                     ) for u in chunk
                 ]
-                # 使用原子事务 + 较小批次，降低锁冲突概率
-                with transaction.atomic():
-                    Notification.objects.bulk_create(new_notifications, batch_size=200)
+                # 使用原子事务 + 较小批次，降低锁冲突概率（未读计数在同一事务内累加）
+                bulk_create_notifications(new_notifications, batch_size=200)
                 notifications_created += len(new_notifications)
 
             # 发一封带 BCC 的邮件（可选）
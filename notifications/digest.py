@@ -0,0 +1,150 @@
+# apps/notifications/digest.py
+
+import logging
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from .models import Notification
+from .utils import EMAIL_THEME
+
+logger = logging.getLogger(__name__)
+
+# 每个汇总任务负责哪些用户偏好；用户从汇总改回“即时”后残留的待发通知，随每小时任务补发
+DIGEST_DELIVERIES = {
+    "hourly": ("hourly", "immediate"),
+    "daily": ("daily",),
+}
+
+DIGEST_MAX_ITEMS = 20  # 单封邮件最多列出的通知条数，其余只给出数量
+
+
+def _digest_context(user, notifications: list) -> dict:
+    site_url = getattr(settings, "SITE_URL", "https://www.aidiventure.com")
+    items = []
+    for n in notifications[:DIGEST_MAX_ITEMS]:
+        task_url = f"{site_url}/forward/{n.related_task_id}/" if n.related_task_id else None
+        items.append({"notification": n, "task_url": task_url})
+    return {
+        "user": user,
+        "items": items,
+        "total": len(notifications),
+        "remaining": max(len(notifications) - DIGEST_MAX_ITEMS, 0),
+        "site_url": site_url,
+        "theme": EMAIL_THEME,
+        "subject": _digest_subject(len(notifications)),
+    }
+
+
+def _digest_subject(count: int) -> str:
+    return f"[冒险者工会] 你有 {count} 条新通知"
+
+
+def send_notification_digests(
+    frequency: str,
+    *,
+    user_batch_size: int = 200,
+    dry_run: bool = False,
+    fail_silently: bool = True,
+    verbose: bool = False,
+) -> dict:
+    """
+    把选择了汇总发送的用户的待发通知，按用户合并成一封邮件发送。
+    所有邮件共用一个 SMTP 连接；发送成功后才清除 email_pending，失败的留待下次重试。
+    """
+    if frequency not in DIGEST_DELIVERIES:
+        raise ValueError(f"未知的汇总频率: {frequency}")
+
+    User = get_user_model()
+    pending = Notification.objects.filter(
+        email_pending=True,
+        user__email_delivery__in=DIGEST_DELIVERIES[frequency],
+    )
+    user_ids = list(pending.order_by("user_id").values_list("user_id", flat=True).distinct())
+
+    emails_sent = 0
+    notifications_sent = 0
+    skipped_without_email = 0
+
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "https://www.aidiventure.com")
+    timeout = getattr(settings, "EMAIL_TIMEOUT", 20)
+    connection = get_connection(timeout=timeout, fail_silently=fail_silently)
+
+    if verbose:
+        print(f"📬 开始发送 {frequency} 汇总邮件：{len(user_ids)} 个用户...")
+
+    if not dry_run and user_ids:
+        connection.open()
+    try:
+        for start in range(0, len(user_ids), user_batch_size):
+            chunk_ids = user_ids[start:start + user_batch_size]
+            users = User.objects.in_bulk(chunk_ids)
+
+            by_user = {}
+            for n in pending.filter(user_id__in=chunk_ids).order_by("user_id", "-created_at"):
+                by_user.setdefault(n.user_id, []).append(n)
+
+            done_ids = []
+            for user_id, notifications in by_user.items():
+                user = users[user_id]
+                ids = [n.id for n in notifications]
+
+                # 用户已删除邮箱：不再发送，直接清除标记
+                if not user.email:
+                    skipped_without_email += 1
+                    done_ids.extend(ids)
+                    continue
+
+                if dry_run:
+                    emails_sent += 1
+                    notifications_sent += len(ids)
+                    continue
+
+                context = _digest_context(user, notifications)
+                html_content = render_to_string("emails/notification_digest.html", context)
+                text_fallback = strip_tags(html_content)
+                text_fallback += f"\n访问网站：{context['site_url']}"
+
+                msg = EmailMultiAlternatives(
+                    context["subject"], text_fallback, from_email, [user.email],
+                    connection=connection,
+                )
+                msg.attach_alternative(html_content, "text/html")
+
+                try:
+                    sent = msg.send(fail_silently=fail_silently)
+                except Exception as e:
+                    logger.exception("汇总邮件发送失败 user_id=%s: %s", user_id, e)
+                    if not fail_silently:
+                        raise
+                    sent = 0
+
+                if sent:
+                    emails_sent += 1
+                    notifications_sent += len(ids)
+                    done_ids.extend(ids)
+                    if verbose:
+                        print(f"✅ {user.email}：合并 {len(ids)} 条通知")
+                else:
+                    logger.warning("Digest email not sent to %s (user_id=%s)", user.email, user_id)
+
+            if done_ids and not dry_run:
+                Notification.objects.filter(id__in=done_ids).update(email_pending=False)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    summary = {
+        "frequency": frequency,
+        "users": len(user_ids),
+        "emails_sent": emails_sent,
+        "notifications_sent": notifications_sent,
+        "skipped_without_email": skipped_without_email,
+        "dry_run": dry_run,
+    }
+    logger.info("Digest summary: %s", summary)
+    return summary
@@ -0,0 +1,33 @@
+# notifications/management/commands/archive_notifications.py
+from django.core.management.base import BaseCommand
+
+from notifications.retention import archive_read_notifications
+
+
+class Command(BaseCommand):
+    help = "归档（或删除）超过保留期的已读通知，按 id 小批量处理"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="保留天数，默认取 NOTIFICATION_RETENTION_DAYS")
+        parser.add_argument("--delete", action="store_true", help="直接删除，不写入归档表")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.0, help="每批之间暂停的秒数，给线上写入让路")
+        parser.add_argument("--dry-run", action="store_true", help="只统计符合条件的通知数量")
+
+    def handle(self, *args, **options):
+        summary = archive_read_notifications(
+            options["days"],
+            delete_only=options["delete"],
+            batch_size=options["batch_size"],
+            sleep_seconds=options["sleep"],
+            dry_run=options["dry_run"],
+            verbose=options["verbosity"] > 1,
+        )
+        cutoff = summary["cutoff"].strftime("%Y-%m-%d %H:%M")
+        if summary["dry_run"]:
+            self.stdout.write(f"[dry-run] {cutoff} 之前的已读通知共 {summary['matched']} 条")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{cutoff} 之前的已读通知：归档 {summary['archived']} 条，删除 {summary['deleted']} 条，"
+            f"共 {summary['batches']} 批"
+        ))
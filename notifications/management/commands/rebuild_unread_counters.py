@@ -0,0 +1,40 @@
+# notifications/management/commands/rebuild_unread_counters.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from notifications.models import Notification, NotificationCounter
+
+
+class Command(BaseCommand):
+    help = "按通知表重新统计每个用户的未读数，修复未读计数表"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="每批写入的计数行数")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # 一次 GROUP BY 拿到所有用户的真实未读数
+        counts = (
+            Notification.objects.filter(is_read=False)
+            .values("user_id")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        rows = [NotificationCounter(user_id=c["user_id"], unread_count=c["n"]) for c in counts]
+
+        with transaction.atomic():
+            # 先全部清零（覆盖“已无未读”的用户），再批量 upsert 真实值
+            reset = NotificationCounter.objects.exclude(unread_count=0).update(unread_count=0)
+            NotificationCounter.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=["unread_count"],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"未读计数已重建：{len(rows)} 个用户有未读通知，{reset} 行计数先被清零"
+        ))
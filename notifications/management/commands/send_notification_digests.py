@@ -0,0 +1,26 @@
+# notifications/management/commands/send_notification_digests.py
+from django.core.management.base import BaseCommand
+
+from notifications.digest import DIGEST_DELIVERIES, send_notification_digests
+
+
+class Command(BaseCommand):
+    help = "按用户合并待发送的通知邮件（建议 cron 每小时运行 hourly、每天运行 daily）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frequency", choices=sorted(DIGEST_DELIVERIES), required=True)
+        parser.add_argument("--user-batch-size", type=int, default=200)
+        parser.add_argument("--dry-run", action="store_true", help="只统计，不发送也不清除待发标记")
+
+    def handle(self, *args, **options):
+        summary = send_notification_digests(
+            options["frequency"],
+            user_batch_size=options["user_batch_size"],
+            dry_run=options["dry_run"],
+            verbose=options["verbosity"] > 1,
+        )
+        prefix = "[dry-run] " if summary["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary['users']} 个用户，发送 {summary['emails_sent']} 封汇总邮件，"
+            f"合并 {summary['notifications_sent']} 条通知"
+        ))
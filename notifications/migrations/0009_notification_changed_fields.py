@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_archivednotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='changed_fields',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
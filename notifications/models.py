@@ -17,6 +17,8 @@ class Notification(models.Model):
     type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
+    email_pending = models.BooleanField(default=False)  # 等待按用户偏好合并进汇总邮件
+    changed_fields = models.JSONField(default=list, blank=True)  # 任务更新类通知：被修改的字段（合并时累加）
     created_at = models.DateTimeField(default=timezone.now)
 
     related_task = models.ForeignKey('tasks.Task', on_delete=models.CASCADE, null=True, blank=True)
@@ -30,6 +32,57 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # 未读列表：WHERE user=? AND is_read=? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notif_user_read_created_idx'),
+            # 最近通知：WHERE user=? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+            # 汇总邮件任务只扫描待发送的那一小部分
+            models.Index(fields=['user', 'id'], condition=models.Q(email_pending=True), name='notif_email_pending_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.get_type_display()} - {self.message[:30]}"
+
+
+class ArchivedNotification(models.Model):
+    """超过保留期的已读通知归档于此，保留原通知 id，按需查询历史"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_notifications')
+    type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    message = models.TextField()
+    is_read = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    related_task = models.ForeignKey('tasks.Task', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    related_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='archnotif_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"[归档] {self.user} - {self.get_type_display()} - {self.message[:30]}"
+
+
+class NotificationCounter(models.Model):
+    """每个用户一行的未读通知计数，角标接口只需按主键读取这一行"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - 未读 {self.unread_count}"
@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class NotificationCursorPagination(CursorPagination):
+    """
+    通知列表的游标（keyset）分页：?before=<游标> 取下一页，
+    按 (created_at, id) 倒序定位，翻到多深都只扫描一页的数据。
+    """
+    cursor_query_param = 'before'
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        # 响应体保持原来的数组格式（兼容前端），下一页地址放在 Link 头里
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link:
+            headers['Link'] = f'<{next_link}>; rel="next"'
+        return Response(data, headers=headers)
+
+    def get_paginated_response_schema(self, schema):
+        return schema
+
+
+class LatestNotificationPagination(NotificationCursorPagination):
+    page_size = 10  # 与原“最近 10 条”保持一致
@@ -0,0 +1,71 @@
+# notifications/pubsub.py
+"""
+进程内的通知发布/订阅，供 SSE 推送使用。
+
+- 订阅方是 ASGI 事件循环里的协程，每个连接一个 asyncio.Queue；
+- 发布方可以在任意线程（请求线程、sync_to_async 线程、后台线程），
+  通过 loop.call_soon_threadsafe 把消息投递到订阅者所在的事件循环。
+
+多进程部署时，其它进程产生的通知不会经过这里；SSE 视图每次被唤醒（实时事件或心跳）
+都会从已由数据库确认的 id 游标之后补查一次，保证最终不漏消息。
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, payload):
+        # 在订阅者的事件循环线程内执行；队列满时丢弃最旧的一条。
+        # SSE 视图的数据库游标只按查询结果推进，丢掉的新通知会在下次唤醒补查时取回；
+        # 丢掉的 notification_updated 由心跳按 created_at 补查
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(payload)
+
+    def deliver(self, payload):
+        try:
+            self.loop.call_soon_threadsafe(self._put, payload)
+        except RuntimeError:
+            # 事件循环已关闭（连接已断开但还未退订）
+            pass
+
+
+class NotificationBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id) -> Subscription:
+        sub = Subscription(user_id)
+        with self._lock:
+            self._subscribers[user_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.user_id]
+
+    def has_subscribers(self, user_id) -> bool:
+        return bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id, payload, event="notification"):
+        with self._lock:
+            subs = list(self._subscribers.get(user_id, ()))
+        for sub in subs:
+            sub.deliver((event, payload))
+
+
+broker = NotificationBroker()
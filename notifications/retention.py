@@ -0,0 +1,84 @@
+# apps/notifications/retention.py
+
+import time
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, ArchivedNotification
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'type', 'message', 'is_read', 'created_at', 'related_task_id', 'related_user_id')
+
+
+def archive_read_notifications(
+    days: int | None = None,
+    *,
+    delete_only: bool = False,
+    batch_size: int = 500,
+    sleep_seconds: float = 0.0,
+    dry_run: bool = False,
+    verbose: bool = False,
+) -> dict:
+    """
+    把早于 days 天的已读通知搬到归档表（delete_only=True 时直接删除）。
+
+    按 id 升序分批处理，每批一个短事务：先取出下一段 id，再归档并删除这段 id，
+    SQLite 的写锁只在单批内持有，不会长时间阻塞正常请求的写入。
+    只处理已读通知，因此不影响未读计数。
+    """
+    if days is None:
+        days = getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90)
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+    if dry_run:
+        total = candidates.count()
+        return {"cutoff": cutoff, "matched": total, "archived": 0, "deleted": 0, "batches": 0, "dry_run": True}
+
+    archived = 0
+    deleted = 0
+    batches = 0
+    last_id = 0
+    now = timezone.now()
+
+    while True:
+        ids = list(
+            candidates.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            # 在事务内重新按条件读取，跳过期间被改动（例如被合并刷新）的行
+            batch = candidates.filter(id__gte=ids[0], id__lte=last_id)
+            if not delete_only:
+                rows = list(batch.values(*ARCHIVE_FIELDS))
+                ArchivedNotification.objects.bulk_create(
+                    [ArchivedNotification(archived_at=now, **row) for row in rows],
+                    ignore_conflicts=True,
+                )
+                archived += len(rows)
+            count, _ = batch.delete()
+            deleted += count
+
+        batches += 1
+        if verbose:
+            print(f"🗄️ 第 {batches} 批：id ≤ {last_id}，本批删除 {count} 条")
+        if sleep_seconds > 0:
+            time.sleep(sleep_seconds)
+
+    summary = {
+        "cutoff": cutoff,
+        "matched": deleted,
+        "archived": archived,
+        "deleted": deleted,
+        "batches": batches,
+        "dry_run": False,
+    }
+    logger.info("Notification retention summary: %s", summary)
+    return summary
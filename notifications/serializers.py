@@ -1,7 +1,7 @@
 # notifications/serializers.py
 
 from rest_framework import serializers
-from .models import Notification
+from .models import Notification, ArchivedNotification
 
 class NotificationSerializer(serializers.ModelSerializer):
     related_user_nickname = serializers.CharField(source='related_user.nickname', read_only=True)
@@ -11,4 +11,14 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'type', 'message', 'is_read', 'created_at',
-                  'related_task', 'related_user', 'related_user_nickname','related_user_avatar']
\ No newline at end of file
+                  'related_task', 'related_user', 'related_user_nickname','related_user_avatar']
+
+
+class ArchivedNotificationSerializer(serializers.ModelSerializer):
+    related_user_nickname = serializers.CharField(source='related_user.nickname', read_only=True)
+    related_user_avatar = serializers.CharField(source='related_user.avatar', read_only=True)
+
+    class Meta:
+        model = ArchivedNotification
+        fields = ['id', 'type', 'message', 'is_read', 'created_at', 'archived_at',
+                  'related_task', 'related_user', 'related_user_nickname', 'related_user_avatar']
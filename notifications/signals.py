@@ -0,0 +1,76 @@
+# notifications/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import Notification
+from .pubsub import broker
+from .serializers import NotificationSerializer
+
+# bulk_create 不会触发 post_save，批量写入后由 bulk_create_notifications 手动发送
+notifications_bulk_created = Signal()  # kwargs: notifications
+# 合并到已有一行的通知（id 不变，created=False），由 create_notification 手动发送
+notification_updated = Signal()  # kwargs: notification
+
+
+def _publish(notifications, event='notification'):
+    # 没有在线连接的用户直接跳过，避免无谓的序列化
+    targets = [n for n in notifications if broker.has_subscribers(n.user_id)]
+    if not targets:
+        return
+
+    for n in targets:
+        broker.publish(n.user_id, NotificationSerializer(n).data, event)
+
+
+@receiver(post_save, sender=Notification, dispatch_uid='notifications_publish_created')
+def publish_created_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _publish([instance]))
+
+
+@receiver(notifications_bulk_created, dispatch_uid='notifications_publish_bulk_created')
+def publish_bulk_created_notifications(sender, notifications, **kwargs):
+    transaction.on_commit(lambda: _publish(notifications))
+
+
+@receiver(notification_updated, dispatch_uid='notifications_publish_updated')
+def publish_updated_notification(sender, notification, **kwargs):
+    transaction.on_commit(lambda: _publish([notification], 'notification_updated'))
+
+
+# —— 级联删除：任务或用户被删除时，相关的通知随之删除（on_delete=CASCADE），
+# 删除前记下有未读通知受影响的用户，删除后按通知表重算他们的未读计数 ——
+
+def _remember_unread_users(instance, **filters):
+    instance._unread_notification_users = set(
+        Notification.objects.filter(is_read=False, **filters).values_list('user_id', flat=True).distinct()
+    )
+
+
+def _recount_remembered(instance):
+    from .utils import recount_unread
+    recount_unread(getattr(instance, '_unread_notification_users', ()))
+
+
+@receiver(pre_delete, sender='tasks.Task', dispatch_uid='notifications_task_pre_delete')
+def remember_task_unread_users(sender, instance, **kwargs):
+    _remember_unread_users(instance, related_task=instance)
+
+
+@receiver(post_delete, sender='tasks.Task', dispatch_uid='notifications_task_post_delete')
+def recount_task_unread_users(sender, instance, **kwargs):
+    _recount_remembered(instance)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid='notifications_user_pre_delete')
+def remember_related_user_unread_users(sender, instance, **kwargs):
+    # 被删用户自己的计数行随用户一起删除，只需处理 related_user 指向他的别人的通知
+    _remember_unread_users(instance, related_user=instance)
+    instance._unread_notification_users.discard(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL, dispatch_uid='notifications_user_post_delete')
+def recount_related_user_unread_users(sender, instance, **kwargs):
+    _recount_remembered(instance)
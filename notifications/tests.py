@@ -1,3 +1,544 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.models import Task
+from users.models import CustomUser
+from .digest import send_notification_digests
+from .models import ArchivedNotification, Notification, NotificationCounter
+from .retention import archive_read_notifications
+from .utils import bulk_create_notifications, create_notification, get_unread_count
+
+
+def _make_task(publisher):
+    return Task.objects.create(
+        title='任务', description='描述', task_type='solo', publisher=publisher,
+        deadline=timezone.now() + timedelta(days=7),
+    )
+
+
+def _parse_event(chunk):
+    fields = {}
+    for line in chunk.decode().strip().splitlines():
+        key, _, value = line.partition(': ')
+        fields[key] = value
+    return fields
+
+
+@override_settings(NOTIFICATION_STREAM_HEARTBEAT=0.2)
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='stream', password='pw', nickname='流')
+        cls.other = CustomUser.objects.create_user(username='other', password='pw', nickname='别人')
+        cls.old = Notification.objects.create(user=cls.user, type='system', message='旧通知')
+        cls.token = str(AccessToken.for_user(cls.user))
+
+    def _create(self, user, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(user, 'system', message, send_email=False)
+
+    async def _next_event(self, stream):
+        # 跳过心跳注释，返回下一条真正的事件
+        while True:
+            chunk = await anext(stream)
+            if not chunk.startswith(b':'):
+                return _parse_event(chunk)
+
+    async def test_rejects_missing_token(self):
+        response = await self.async_client.get('/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_resume_and_live_push(self):
+        response = await self.async_client.get(
+            f'/notifications/stream/?token={self.token}',
+            headers={'Last-Event-ID': '0'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            self.assertIn('retry', await self._next_event(stream))
+
+            # Last-Event-ID=0：先补发已有的通知
+            replayed = await self._next_event(stream)
+            self.assertEqual(int(replayed['id']), self.old.id)
+
+            # 新通知经 post_save → pub/sub 实时推送；别人的通知不会推过来
+            await sync_to_async(self._create)(self.other, '别人的')
+            live = await sync_to_async(self._create)(self.user, '新通知')
+            event = await self._next_event(stream)
+            self.assertEqual(event['event'], 'notification')
+            self.assertEqual(int(event['id']), live.id)
+            self.assertEqual(json.loads(event['data'])['message'], '新通知')
+
+            # 空闲时发送心跳
+            chunk = await anext(stream)
+            self.assertTrue(chunk.startswith(b': heartbeat'))
+        finally:
+            await stream.aclose()
+
+    async def test_heartbeat_catches_up_unpublished_rows(self):
+        response = await self.async_client.get(
+            '/notifications/stream/',
+            headers={'Authorization': f'Bearer {self.token}'},
+        )
+        stream = response.streaming_content
+        try:
+            await self._next_event(stream)  # retry
+
+            # 模拟其它进程写入：直接落库、不经过本进程的广播
+            missed = await Notification.objects.acreate(user=self.user, type='system', message='其它进程')
+            event = await self._next_event(stream)
+            self.assertEqual(int(event['id']), missed.id)
+        finally:
+            await stream.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=30)
+    async def test_live_event_does_not_skip_earlier_unpublished_row(self):
+        response = await self.async_client.get(f'/notifications/stream/?token={self.token}')
+        stream = response.streaming_content
+        try:
+            await self._next_event(stream)  # retry
+
+            # 其它进程先提交了一条（不经过本进程广播），随后本进程广播了 id 更大的一条；
+            # 心跳 30 秒，两条都必须在这次唤醒时推送
+            missed = await Notification.objects.acreate(user=self.user, type='system', message='其它进程')
+            live = await sync_to_async(self._create)(self.user, '本进程')
+            ids = [int((await asyncio.wait_for(self._next_event(stream), 5))['id']) for _ in range(2)]
+            self.assertEqual(ids, [missed.id, live.id])
+        finally:
+            await stream.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=30)
+    async def test_queue_overflow_is_caught_up_from_database(self):
+        response = await self.async_client.get(f'/notifications/stream/?token={self.token}')
+        stream = response.streaming_content
+        try:
+            await self._next_event(stream)  # retry
+
+            # 订阅队列最多 100 条，最旧的几条被丢弃，仍须按顺序、不重复地全部推送
+            def create_many():
+                with self.captureOnCommitCallbacks(execute=True):
+                    return bulk_create_notifications(
+                        [Notification(user=self.user, type='system', message=f'第{i}条') for i in range(105)]
+                    )
+            created = await sync_to_async(create_many)()
+            ids = [int((await asyncio.wait_for(self._next_event(stream), 5))['id']) for _ in range(105)]
+            self.assertEqual(ids, sorted(n.id for n in created))
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self._next_event(stream), 0.5)
+        finally:
+            await stream.aclose()
+
+    def _update(self, task, field):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(self.user, 'task_update', '任务已修改', task=task,
+                                       send_email=False, changed_fields=[field])
+
+    async def test_coalesced_update_is_pushed(self):
+        task = await sync_to_async(_make_task)(self.other)
+        first = await sync_to_async(self._update)(task, 'title')
+        response = await self.async_client.get(
+            f'/notifications/stream/?token={self.token}', headers={'Last-Event-ID': str(first.id)},
+        )
+        stream = response.streaming_content
+        try:
+            await self._next_event(stream)  # retry
+
+            merged = await sync_to_async(self._update)(task, 'deadline')
+            self.assertEqual(merged.id, first.id)
+            event = await self._next_event(stream)
+            self.assertEqual(event['event'], 'notification_updated')
+            self.assertNotIn('id', event)  # 不改动浏览器的 Last-Event-ID
+            self.assertEqual(json.loads(event['data'])['id'], first.id)
+            self.assertEqual(json.loads(event['data'])['message'], '任务已修改：title, deadline')
+        finally:
+            await stream.aclose()
+
+    async def test_heartbeat_catches_up_coalesced_rows(self):
+        task = await sync_to_async(_make_task)(self.other)
+        first = await sync_to_async(self._update)(task, 'title')
+        response = await self.async_client.get(
+            f'/notifications/stream/?token={self.token}', headers={'Last-Event-ID': str(first.id)},
+        )
+        stream = response.streaming_content
+        try:
+            await self._next_event(stream)  # retry
+
+            # 模拟其它进程合并：直接改库、不经过本进程的广播
+            await Notification.objects.filter(pk=first.pk).aupdate(
+                changed_fields=['title', 'deadline'], message='任务已修改：title, deadline', created_at=timezone.now(),
+            )
+            event = await self._next_event(stream)
+            self.assertEqual(event['event'], 'notification_updated')
+            self.assertEqual(json.loads(event['data'])['message'], '任务已修改：title, deadline')
+        finally:
+            await stream.aclose()
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='counter', password='pw', nickname='计数')
+        cls.other = CustomUser.objects.create_user(username='counter2', password='pw', nickname='别人')
+
+    def _auth(self):
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def _unread(self):
+        response = self.client.get('/notifications/unread-count/', **self._auth())
+        self.assertEqual(response.status_code, 200)
+        return response.json()['unread_count']
+
+    def _create(self, n, user=None):
+        return [create_notification(user or self.user, 'system', f'通知{i}', send_email=False) for i in range(n)]
+
+    def test_create_and_bulk_create_increment(self):
+        self._create(2)
+        self.assertEqual(self._unread(), 2)
+
+        bulk_create_notifications([
+            Notification(user=self.user, type='system', message='群发1'),
+            Notification(user=self.user, type='system', message='群发2'),
+            Notification(user=self.user, type='system', message='已读', is_read=True),
+            Notification(user=self.other, type='system', message='群发'),
+        ])
+        self.assertEqual(self._unread(), 4)
+        self.assertEqual(get_unread_count(self.other.pk), 1)
+
+    def test_single_mark_read_only_decrements_once(self):
+        first, _ = self._create(2)
+        for _ in range(2):
+            response = self.client.post(f'/notifications/{first.pk}/mark-read/', **self._auth())
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._unread(), 1)
+
+        # 别人的通知：404，计数不变
+        theirs, = self._create(1, user=self.other)
+        response = self.client.post(f'/notifications/{theirs.pk}/mark-read/', **self._auth())
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(get_unread_count(self.other.pk), 1)
+
+    def test_batch_and_mark_all_read(self):
+        notes = self._create(4)
+        response = self.client.post(
+            '/notifications/mark-read/', {'ids': [notes[0].pk, notes[1].pk]},
+            content_type='application/json', **self._auth(),
+        )
+        self.assertEqual(response.json(), {'updated': 2, 'unread_count': 2})
+
+        response = self.client.post('/notifications/mark-all-read/', **self._auth())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._unread(), 0)
+
+    def test_missing_counter_row_is_rebuilt_on_read(self):
+        self._create(3)
+        NotificationCounter.objects.filter(user=self.user).delete()
+        self.assertEqual(get_unread_count(self.user.pk), 3)
+        self.assertTrue(NotificationCounter.objects.filter(user=self.user, unread_count=3).exists())
+
+    def test_deleting_task_recounts_cascaded_unread(self):
+        task = _make_task(self.other)
+        for i in range(2):
+            create_notification(self.user, 'task_update', f'任务通知{i}', task=task, send_email=False)
+        create_notification(self.other, 'task_update', '发布者的', task=task, send_email=False)
+        self._create(1)
+        self.assertEqual(self._unread(), 3)
+
+        task.delete()
+        self.assertEqual(self._unread(), 1)
+        self.assertEqual(get_unread_count(self.other.pk), 0)
+
+    def test_deleting_related_user_recounts_cascaded_unread(self):
+        applicant = CustomUser.objects.create_user(username='applicant', password='pw', nickname='申请人')
+        create_notification(self.user, 'invite', '邀请', related_user=applicant, send_email=False)
+        self._create(1)
+        self.assertEqual(self._unread(), 2)
+
+        applicant.delete()
+        self.assertEqual(self._unread(), 1)
+
+    def test_rebuild_command_fixes_drifted_counters(self):
+        self._create(2)
+        self._create(1, user=self.other)
+        Notification.objects.filter(user=self.other).update(is_read=True)  # 绕过计数直接改表
+        NotificationCounter.objects.filter(user=self.user).update(unread_count=99)
+
+        call_command('rebuild_unread_counters', stdout=io.StringIO())
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+        self.assertEqual(get_unread_count(self.other.pk), 0)
+
+
+class RetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='archive', password='pw', nickname='归档')
+        old = timezone.now() - timedelta(days=100)
+        cls.old_read = [
+            Notification.objects.create(user=cls.user, type='system', message=f'旧{i}', is_read=True, created_at=old)
+            for i in range(5)
+        ]
+        cls.old_unread = Notification.objects.create(user=cls.user, type='system', message='旧未读', created_at=old)
+        cls.recent_read = Notification.objects.create(user=cls.user, type='system', message='新', is_read=True)
+
+    def test_dry_run_only_counts(self):
+        summary = archive_read_notifications(90, dry_run=True)
+        self.assertEqual(summary['matched'], 5)
+        self.assertEqual(Notification.objects.count(), 7)
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_archives_old_read_notifications_in_batches(self):
+        summary = archive_read_notifications(90, batch_size=2)
+        self.assertEqual((summary['archived'], summary['deleted'], summary['batches']), (5, 5, 3))
+        self.assertEqual(
+            set(ArchivedNotification.objects.values_list('id', flat=True)), {n.pk for n in self.old_read},
+        )
+        # 未读与保留期内的通知不动
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)), {self.old_unread.pk, self.recent_read.pk},
+        )
+
+    def test_delete_only_skips_archive(self):
+        summary = archive_read_notifications(90, delete_only=True)
+        self.assertEqual((summary['archived'], summary['deleted']), (0, 5))
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_archived_list_endpoint(self):
+        archive_read_notifications(90)
+        response = self.client.get(
+            '/notifications/archived/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 5)
+
+
+class CoalesceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='coalesce', password='pw', email='c@example.com')
+        cls.teacher = CustomUser.objects.create_user(username='coalesce-t', password='pw', role='teacher')
+        cls.task = _make_task(cls.teacher)
+
+    def _update(self, *fields, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(self.user, 'task_update', '任务已修改', task=self.task,
+                                       changed_fields=list(fields), **kwargs)
+
+    @mock.patch('notifications.utils._async_send_email')
+    def test_merges_fields_without_second_email(self, send):
+        first = self._update('title')
+        merged = self._update('deadline', 'title')
+
+        self.assertEqual(merged.pk, first.pk)
+        self.assertEqual(Notification.objects.count(), 1)
+        merged.refresh_from_db()
+        self.assertEqual(merged.changed_fields, ['title', 'deadline'])
+        self.assertEqual(merged.message, '任务已修改：title, deadline')
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+    @mock.patch('notifications.utils._async_send_email')
+    def test_read_or_expired_rows_are_not_merged(self, send):
+        first = self._update('title')
+        Notification.objects.filter(pk=first.pk).update(is_read=True)
+        second = self._update('title')
+        self.assertNotEqual(second.pk, first.pk)
+
+        Notification.objects.filter(pk=second.pk).update(created_at=timezone.now() - timedelta(seconds=601))
+        third = self._update('title')
+        self.assertNotEqual(third.pk, second.pk)
+        self.assertEqual(send.call_count, 3)
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=0)
+    def test_window_zero_disables_merging(self):
+        self._update('title', send_email=False)
+        self._update('title', send_email=False)
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class BatchMarkReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='batch', password='pw')
+        cls.other = CustomUser.objects.create_user(username='batch2', password='pw', role='teacher')
+        cls.task = _make_task(cls.other)
+        cls.mine = [create_notification(cls.user, 'system', f'通知{i}', send_email=False) for i in range(3)]
+        cls.on_task = [
+            create_notification(cls.user, 'task_update', f'任务{i}', task=cls.task, send_email=False)
+            for i in range(2)
+        ]
+        cls.theirs = create_notification(cls.other, 'system', '别人的', send_email=False)
+
+    def _post(self, data):
+        return self.client.post(
+            '/notifications/mark-read/', data, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}',
+        )
+
+    def test_by_ids_ignores_other_users_and_read_rows(self):
+        ids = [self.mine[0].pk, self.mine[1].pk, self.theirs.pk]
+        self.assertEqual(self._post({'ids': ids}).json(), {'updated': 2, 'unread_count': 3})
+        # 重复提交：已读的不再计入
+        self.assertEqual(self._post({'ids': ids}).json(), {'updated': 0, 'unread_count': 3})
+        self.assertFalse(Notification.objects.get(pk=self.theirs.pk).is_read)
+        self.assertEqual(get_unread_count(self.other.pk), 1)
+
+    def test_by_related_task(self):
+        response = self._post({'related_task': self.task.pk})
+        self.assertEqual(response.json(), {'updated': 2, 'unread_count': 3})
+        self.assertFalse(Notification.objects.filter(related_task=self.task, is_read=False).exists())
+
+    def test_invalid_payloads(self):
+        for data in ({}, {'ids': 'abc'}, {'ids': ['x']}, {'ids': list(range(501))}, {'related_task': 'x'}):
+            with self.subTest(data=data):
+                self.assertEqual(self._post(data).status_code, 400)
+        self.assertEqual(get_unread_count(self.user.pk), 5)
+
+
+class DigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def make(name, delivery, email=None):
+            return CustomUser.objects.create_user(
+                username=name, password='pw', nickname=name,
+                email=f'{name}@example.com' if email is None else email, email_delivery=delivery,
+            )
+        cls.hourly = make('hourly', 'hourly')
+        cls.daily = make('daily', 'daily')
+        cls.instant = make('instant', 'immediate')
+
+    def _notify(self, user, n):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [create_notification(user, 'system', f'通知{i}', send_email=True) for i in range(n)]
+
+    def _pending(self, user):
+        return Notification.objects.filter(user=user, email_pending=True).count()
+
+    def test_create_marks_digest_users_pending_without_immediate_email(self):
+        with mock.patch('notifications.utils._async_send_email') as send_now:
+            self._notify(self.hourly, 1)
+            self._notify(self.daily, 1)
+        send_now.assert_not_called()
+        self.assertEqual((self._pending(self.hourly), self._pending(self.daily)), (1, 1))
+
+        with mock.patch('notifications.utils._async_send_email') as send_now:
+            note, = self._notify(self.instant, 1)
+        send_now.assert_called_once_with(note.id)
+        self.assertEqual(self._pending(self.instant), 0)
+
+    def test_groups_notifications_into_one_email_per_user(self):
+        self._notify(self.hourly, 3)
+        self._notify(self.daily, 2)
+
+        summary = send_notification_digests('hourly')
+        self.assertEqual((summary['emails_sent'], summary['notifications_sent']), (1, 3))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['hourly@example.com'])
+        self.assertIn('3', mail.outbox[0].subject)
+        self.assertEqual(self._pending(self.hourly), 0)
+        # 每日汇总的用户不受每小时任务影响
+        self.assertEqual(self._pending(self.daily), 2)
+
+        send_notification_digests('daily')
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self._pending(self.daily), 0)
+
+    def test_failed_send_stays_pending(self):
+        other = CustomUser.objects.create_user(
+            username='other', password='pw', email='other@example.com', email_delivery='hourly',
+        )
+        self._notify(self.hourly, 2)
+        self._notify(other, 1)
+        real_send = EmailMultiAlternatives.send
+
+        def flaky_send(msg, fail_silently=False):
+            if msg.to == ['hourly@example.com']:
+                raise OSError('SMTP 连接中断')
+            return real_send(msg, fail_silently=fail_silently)
+
+        with mock.patch.object(EmailMultiAlternatives, 'send', autospec=True, side_effect=flaky_send), \
+                self.assertLogs('notifications.digest', 'ERROR'):
+            summary = send_notification_digests('hourly')
+        self.assertEqual(summary['emails_sent'], 1)
+        self.assertEqual(self._pending(self.hourly), 2)
+        self.assertEqual(self._pending(other), 0)
+
+        # 下次运行重试成功后清除
+        send_notification_digests('hourly')
+        self.assertEqual(self._pending(self.hourly), 0)
+
+    def test_hourly_job_picks_up_leftovers_after_switching_to_immediate(self):
+        self._notify(self.daily, 2)
+        CustomUser.objects.filter(pk=self.daily.pk).update(email_delivery='immediate')
+
+        self.assertEqual(send_notification_digests('daily')['emails_sent'], 0)
+        summary = send_notification_digests('hourly')
+        self.assertEqual((summary['emails_sent'], summary['notifications_sent']), (1, 2))
+        self.assertEqual(self._pending(self.daily), 0)
+
+    def test_users_without_email_are_cleared_without_sending(self):
+        self._notify(self.hourly, 1)
+        CustomUser.objects.filter(pk=self.hourly.pk).update(email='')
+        summary = send_notification_digests('hourly')
+        self.assertEqual((summary['emails_sent'], summary['skipped_without_email']), (0, 1))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self._pending(self.hourly), 0)
+
+
+class UnreadListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='pager', password='pw', nickname='翻页')
+        cls.sender = CustomUser.objects.create_user(username='sender', password='pw', nickname='发送者')
+        start = timezone.now() - timedelta(hours=1)
+        bulk_create_notifications([
+            Notification(user=cls.user, type='invite', message=f'未读{i}', related_user=cls.sender,
+                         created_at=start + timedelta(minutes=i))
+            for i in range(25)
+        ] + [Notification(user=cls.user, type='system', message='已读', is_read=True, created_at=start)])
+
+    def _get(self, url, **params):
+        response = self.client.get(url, params, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_before_cursor_walks_pages_via_link_header(self):
+        first = self._get('/notifications/unread/')
+        self.assertEqual([n['message'] for n in first.json()], [f'未读{i}' for i in range(24, 4, -1)])
+        link = first['Link']
+        self.assertTrue(link.endswith('rel="next"'))
+        next_url = link[1:link.index('>')]
+        self.assertIn('before=', next_url)
+
+        second = self._get(next_url)
+        self.assertEqual([n['message'] for n in second.json()], [f'未读{i}' for i in range(4, -1, -1)])
+        self.assertNotIn('Link', second)
+
+    def test_page_size_is_capped(self):
+        self.assertEqual(len(self._get('/notifications/unread/', page_size=5).json()), 5)
+        bulk_create_notifications([Notification(user=self.user, type='system', message='x') for _ in range(100)])
+        self.assertEqual(len(self._get('/notifications/unread/', page_size=1000).json()), 100)
+
+    def test_related_user_is_selected_in_the_same_query(self):
+        counts = []
+        for size in (1, 20):
+            with CaptureQueriesContext(connection) as ctx:
+                body = self._get('/notifications/unread/', page_size=size).json()
+            self.assertEqual(len(body), size)
+            counts.append(len(ctx.captured_queries))
+        # 认证取用户一条，列表一条（JOIN related_user），与页大小无关
+        self.assertEqual(counts, [2, 2])
+        self.assertIn('JOIN "users_customuser"', ctx.captured_queries[-1]['sql'])
@@ -2,11 +2,16 @@
 
 from django.urls import path
 from .views import LatestNotificationsView, UnreadNotificationsView, MarkAllAsReadView, MarkNotificationAsReadView, TestCreateNotificationView
+from .views import UnreadCountView, ArchivedNotificationsView, BatchMarkAsReadView, notification_stream
 
 urlpatterns = [
     path('latest/', LatestNotificationsView.as_view(), name='latest-notifications'),
     path('unread/', UnreadNotificationsView.as_view(), name='unread-notifications'),
+    path('unread-count/', UnreadCountView.as_view(), name='unread-notification-count'),
+    path('archived/', ArchivedNotificationsView.as_view(), name='archived-notifications'),
     path('mark-all-read/', MarkAllAsReadView.as_view(), name='mark-all-read'),
+    path('mark-read/', BatchMarkAsReadView.as_view(), name='batch-mark-read'),
     path('<int:pk>/mark-read/', MarkNotificationAsReadView.as_view(), name='mark-notification-read'),
+    path('stream/', notification_stream, name='notification-stream'),
     path('test-create/', TestCreateNotificationView.as_view(), name='test-create-notification'),
 ]
\ No newline at end of file
@@ -10,27 +10,161 @@ from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from collections import Counter
+from datetime import timedelta
 import threading
 import logging
+from .models import NotificationCounter
+from .signals import notification_updated, notifications_bulk_created
 
 logger = logging.getLogger(__name__)
 
-def create_notification(user, type, message, task=None, related_user=None, send_email=True):
-    notification = Notification.objects.create(
-        user=user,
-        type=type,
-        message=message,
-        related_task=task,
-        related_user=related_user
-    )
+def create_notification(user, type, message, task=None, related_user=None, send_email=True, changed_fields=None):
+    """
+    创建一条通知。
+
+    传入 changed_fields（字段名列表）时，消息末尾会拼上“：字段1, 字段2”，并启用合并：
+    NOTIFICATION_COALESCE_WINDOW 秒内同一用户、同一类型、同一任务的未读通知只保留一行，
+    合并字段列表并刷新时间，不再新增行、也不再发邮件。
+    """
+    wants_email = send_email and bool(getattr(user, "email", None))
+    # 选择了每小时/每日汇总的用户，邮件留给 send_notification_digests 统一发送
+    digest = wants_email and getattr(user, "email_delivery", "immediate") != "immediate"
+
+    with transaction.atomic():
+        if changed_fields is not None:
+            coalesced = _coalesce_notification(user, type, message, task, related_user, changed_fields)
+            if coalesced is not None:
+                return coalesced
+
+        notification = Notification.objects.create(
+            user=user,
+            type=type,
+            message=_with_fields(message, changed_fields),
+            related_task=task,
+            related_user=related_user,
+            email_pending=digest,
+            changed_fields=list(changed_fields or []),
+        )
+        increment_unread([user.pk])
 
     # ✅ 提交事务后再异步发邮件，避免阻塞请求与脏数据
-    if send_email and getattr(user, "email", None):
+    if wants_email and not digest:
         transaction.on_commit(lambda: _async_send_email(notification.id))
 
     return notification
 
 
+def _with_fields(message, changed_fields):
+    if not changed_fields:
+        return message
+    return f"{message}：{', '.join(changed_fields)}"
+
+
+def _coalesce_notification(user, type, message, task, related_user, changed_fields):
+    """窗口内已有同一任务的未读通知时，合并到那一行并返回；否则返回 None"""
+    window = getattr(settings, "NOTIFICATION_COALESCE_WINDOW", 0)
+    if task is None or window <= 0:
+        return None
+
+    now = timezone.now()
+    existing = (
+        Notification.objects.filter(
+            user=user, is_read=False, type=type, related_task=task,
+            created_at__gte=now - timedelta(seconds=window),
+        )
+        .order_by('-created_at')
+        .first()
+    )
+    if existing is None:
+        return None
+
+    merged = list(existing.changed_fields)
+    merged += [f for f in changed_fields if f not in merged]
+    existing.changed_fields = merged
+    existing.message = _with_fields(message, merged)
+    existing.created_at = now
+    existing.related_user = related_user
+    existing.save(update_fields=['changed_fields', 'message', 'created_at', 'related_user'])
+    # 合并不会新增行，post_save 的 created 为 False，单独推送一次更新
+    notification_updated.send(sender=Notification, notification=existing)
+    return existing
+
+
+def bulk_create_notifications(notifications, batch_size=200):
+    """批量写入通知（群发等场景），并同步累加每个用户的未读计数"""
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        increment_unread(n.user_id for n in created if not n.is_read)
+        notifications_bulk_created.send(sender=Notification, notifications=created)
+    return created
+
+
+# —— 未读计数：所有增减都用 F() 表达式在数据库里原子完成 ——
+
+def increment_unread(user_ids):
+    """按出现次数累加未读计数（同一用户出现 N 次即 +N）"""
+    per_user = Counter(user_ids)
+    if not per_user:
+        return
+
+    # 计数行不存在时先补一行 0（已存在则忽略），再统一 UPDATE
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=uid) for uid in per_user],
+        ignore_conflicts=True,
+    )
+
+    # 按增量分组，常见情况（每人 +1）只需一条 UPDATE
+    by_delta = {}
+    for uid, delta in per_user.items():
+        by_delta.setdefault(delta, []).append(uid)
+    for delta, uids in by_delta.items():
+        NotificationCounter.objects.filter(user_id__in=uids).update(
+            unread_count=F('unread_count') + delta
+        )
+
+
+def decrement_unread(user_id, count):
+    """已读后扣减未读计数，最低为 0"""
+    if count <= 0:
+        return
+    NotificationCounter.objects.filter(user_id=user_id).update(
+        unread_count=Greatest(F('unread_count') - count, 0)
+    )
+
+
+def recount_unread(user_ids):
+    """按通知表重新统计这些用户的未读数（通知被级联删除之后使用），一条 UPDATE 完成"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    unread = (
+        Notification.objects.filter(user_id=OuterRef('user_id'), is_read=False)
+        .order_by().values('user_id').annotate(n=Count('id')).values('n')
+    )
+    NotificationCounter.objects.filter(user_id__in=user_ids).update(
+        unread_count=Coalesce(Subquery(unread), 0)
+    )
+
+
+def reset_unread(user_id):
+    NotificationCounter.objects.filter(user_id=user_id).update(unread_count=0)
+
+
+def get_unread_count(user_id) -> int:
+    """按主键读取未读数；计数行缺失时现场统计一次并补建"""
+    count = NotificationCounter.objects.filter(pk=user_id).values_list('unread_count', flat=True).first()
+    if count is not None:
+        return count
+
+    count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+    counter, _ = NotificationCounter.objects.get_or_create(user_id=user_id, defaults={'unread_count': count})
+    return counter.unread_count
+
+
 def _subject_for(notification: Notification) -> str:
     subjects = {
         'invite': '组队邀请',
@@ -47,6 +181,14 @@ def _subject_for(notification: Notification) -> str:
     return f"[冒险者工会] {base}"
 
 
+# 颜色主题（你指定的三色）
+EMAIL_THEME = {
+    "primary": "#2B2C57",  # 深色标题/按钮
+    "bg": "#F4F7FE",       # 整体背景
+    "card": "#FFFFFF"      # 卡片内容区
+}
+
+
 def _build_context(notification: Notification) -> dict:
     site_url = getattr(settings, "SITE_URL", "https://www.aidiventure.com")
 
@@ -54,20 +196,13 @@ def _build_context(notification: Notification) -> dict:
     if notification.related_task_id:
         task_url = f"{site_url}/forward/{notification.related_task_id}/"
 
-    # 颜色主题（你指定的三色）
-    theme = {
-        "primary": "#2B2C57",  # 深色标题/按钮
-        "bg": "#F4F7FE",       # 整体背景
-        "card": "#FFFFFF"      # 卡片内容区
-    }
-
     return {
         "user": notification.user,
         "notification": notification,
         "message": notification.message,
         "task_url": task_url,
         "site_url": site_url,
-        "theme": theme,
+        "theme": EMAIL_THEME,
     }
 
 
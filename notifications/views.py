@@ -1,12 +1,25 @@
 # notifications/views.py
 
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from users.authentication import ClaimsJWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import permissions, status
-from .models import Notification
-from .serializers import NotificationSerializer
+from rest_framework import generics, permissions, status
+from .models import Notification, ArchivedNotification
+from .serializers import NotificationSerializer, ArchivedNotificationSerializer
+from .pagination import NotificationCursorPagination, LatestNotificationPagination
 from django.conf import settings
-from .utils import create_notification
+from django.db import transaction
+from django.utils import timezone
+from .utils import create_notification, get_unread_count, decrement_unread, reset_unread
+from .pubsub import broker
 class TestCreateNotificationView(APIView):
     """测试用：创建一条通知"""
     permission_classes = [permissions.IsAuthenticated]
@@ -23,26 +36,28 @@ class TestCreateNotificationView(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
-class LatestNotificationsView(APIView):
-    """获取最近 10 条通知（全部，不管是否已读）"""
+class LatestNotificationsView(generics.ListAPIView):
+    """获取最近的通知（全部，不管是否已读），默认 10 条，可用 ?before= 继续往前翻"""
+    serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LatestNotificationPagination
 
-    def get(self, request):
-        user = request.user
-        notifications = Notification.objects.filter(user=user).order_by('-created_at')[:10]
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        # 排序由游标分页统一施加 (-created_at, -id)
+        return Notification.objects.filter(user=self.request.user).select_related('related_user')
 
 
-class UnreadNotificationsView(APIView):
-    """获取所有未读通知"""
+class UnreadNotificationsView(generics.ListAPIView):
+    """获取未读通知（分页，每页默认 20 条，最多 100 条）"""
+    serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
 
-    def get(self, request):
-        user = request.user
-        unread_notifications = Notification.objects.filter(user=user, is_read=False).order_by('-created_at')
-        serializer = NotificationSerializer(unread_notifications, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return (
+            Notification.objects.filter(user=self.request.user, is_read=False)
+            .select_related('related_user')
+        )
 
 
 class MarkAllAsReadView(APIView):
@@ -51,7 +66,9 @@ class MarkAllAsReadView(APIView):
 
     def post(self, request):
         user = request.user
-        updated_count = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        with transaction.atomic():
+            updated_count = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+            reset_unread(user.id)
         return Response({'message': f'{updated_count} 条通知已标记为已读'}, status=status.HTTP_200_OK)
 
 class MarkNotificationAsReadView(APIView):
@@ -59,14 +76,214 @@ class MarkNotificationAsReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        try:
-            notification = Notification.objects.get(pk=pk, user=request.user)
-        except Notification.DoesNotExist:
+        # 带条件的 UPDATE：只有真正从未读变为已读时才扣减计数
+        with transaction.atomic():
+            updated = Notification.objects.filter(pk=pk, user=request.user, is_read=False).update(is_read=True)
+            decrement_unread(request.user.id, updated)
+
+        if updated:
+            return Response({'message': '通知已标记为已读'}, status=status.HTTP_200_OK)
+
+        if not Notification.objects.filter(pk=pk, user=request.user).exists():
             return Response({'error': '通知不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': '该通知已是已读状态'}, status=status.HTTP_200_OK)
+
+
+class BatchMarkAsReadView(APIView):
+    """
+    批量标记已读：
+      - {"ids": [1, 2, 3]}      按通知 id 列表
+      - {"related_task": 12}    某个任务相关的全部通知
+    只执行一条限定在当前用户范围内的 UPDATE，返回更新条数与最新未读数。
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_IDS = 500
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        related_task = request.data.get('related_task')
+
+        qs = Notification.objects.filter(user=request.user, is_read=False)
+        if ids is not None:
+            if not isinstance(ids, list) or len(ids) > self.MAX_IDS:
+                return Response({'error': f'ids 必须是不超过 {self.MAX_IDS} 个元素的数组'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                ids = [int(i) for i in ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'ids 必须是整数数组'}, status=status.HTTP_400_BAD_REQUEST)
+            qs = qs.filter(id__in=ids)
+        elif related_task is not None:
+            try:
+                qs = qs.filter(related_task_id=int(related_task))
+            except (TypeError, ValueError):
+                return Response({'error': 'related_task 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({'error': '请提供 ids 或 related_task'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            updated = qs.update(is_read=True)
+            decrement_unread(request.user.id, updated)
+
+        return Response({
+            'updated': updated,
+            'unread_count': get_unread_count(request.user.id),
+        }, status=status.HTTP_200_OK)
+
+
+class ArchivedNotificationsView(generics.ListAPIView):
+    """按需查询已归档的历史通知（游标分页，?before= 继续往前翻）"""
+    serializer_class = ArchivedNotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+
+    def get_queryset(self):
+        return ArchivedNotification.objects.filter(user=self.request.user).select_related('related_user')
+
+
+class UnreadCountView(APIView):
+    """获取未读通知数量（按主键读取计数行，不扫描通知表）"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread_count': get_unread_count(request.user.id)})
+
+
+
+# —— SSE 实时推送（需在 ASGI 下运行，见 backend/asgi.py）——
+
+STREAM_REPLAY_LIMIT = 50
+
+
+def _authenticate_stream(request):
+    """
+    复用站点的 JWT 认证校验 access token（只用到 user.id，不查用户表）。
+    EventSource 无法自定义请求头，因此同时支持 ?token= 查询参数。
+    """
+    auth = ClaimsJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        validated = auth.get_validated_token(raw_token)
+        return auth.get_user(validated)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def _notifications_after(user_id, last_id):
+    qs = (
+        Notification.objects.filter(user_id=user_id, id__gt=last_id)
+        .select_related('related_user')
+        .order_by('id')[:STREAM_REPLAY_LIMIT]
+    )
+    return NotificationSerializer(list(qs), many=True).data
+
+
+def _notifications_updated(user_id, last_id, since):
+    """已推送过、之后又被合并刷新的通知（合并时 id 不变、created_at 刷新）"""
+    qs = (
+        Notification.objects.filter(user_id=user_id, id__lte=last_id, created_at__gte=since)
+        .exclude(changed_fields=[])
+        .select_related('related_user')
+        .order_by('id')[:STREAM_REPLAY_LIMIT]
+    )
+    return NotificationSerializer(list(qs), many=True).data
+
+
+def _latest_notification_id(user_id):
+    return Notification.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _format_event(payload, event='notification'):
+    data = json.dumps(payload, cls=JSONEncoder, ensure_ascii=False)
+    if event == 'notification_updated':
+        # 更新事件不带 id 行：浏览器的 Last-Event-ID 保持为最新一条新通知
+        return f"event: {event}\ndata: {data}\n\n"
+    return f"id: {payload['id']}\nevent: {event}\ndata: {data}\n\n"
+
+
+async def notification_stream(request):
+    """
+    GET /notifications/stream/?token=<access token>
+    以 Server-Sent Events 推送当前用户的新通知：
+      - 断线重连时浏览器会带上 Last-Event-ID，先补发该 id 之后的通知；
+      - 空闲时每隔 NOTIFICATION_STREAM_HEARTBEAT 秒发送一次心跳注释；
+      - 每次被唤醒（实时事件或心跳）都从数据库游标 db_id 之后补查，按 id 去重后推送：
+        其它进程写入、未经本进程广播的通知，以及队列溢出时丢掉的事件都由这里补上。
+        db_id 只按数据库查询结果推进，实时事件的 id 可能更大，但不会让游标越过尚未推送的通知；
+      - 合并进已有一行的通知以 notification_updated 事件推送（id 不变，客户端按 id 覆盖）。
+    """
+    user = await sync_to_async(_authenticate_stream)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'error': '未登录或登录已过期'}, status=401)
+
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_id = None
+
+    # 先订阅再确定起点，避免两者之间产生的通知丢失；重复的由 id 去重
+    subscription = broker.subscribe(user.id)
+    checked_at = timezone.now()
+    replay = last_id is not None
+    if not replay:
+        last_id = await sync_to_async(_latest_notification_id)(user.id)
+
+    # db_id：数据库里不大于它的通知都已推送；sent：已推送但大于 db_id 的 id（来自实时事件），用于去重
+    db_id, sent = last_id, set()
+
+    async def catch_up():
+        nonlocal db_id, last_id
+        while True:
+            rows = await sync_to_async(_notifications_after)(user.id, db_id)
+            for payload in rows:
+                db_id = payload['id']
+                if payload['id'] in sent:
+                    continue
+                last_id = max(last_id, payload['id'])
+                yield _format_event(payload)
+            sent.difference_update([i for i in sent if i <= db_id])
+            if len(rows) < STREAM_REPLAY_LIMIT:
+                return
+
+    async def event_stream():
+        nonlocal last_id, checked_at
+        try:
+            yield "retry: 3000\n\n"  # 浏览器断线后 3 秒重连
+
+            if replay:
+                async for chunk in catch_up():
+                    yield chunk
+
+            while True:
+                try:
+                    event, payload = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    since, checked_at = checked_at, timezone.now()
+                    for payload in await sync_to_async(_notifications_updated)(user.id, last_id, since):
+                        yield _format_event(payload, 'notification_updated')
+                    async for chunk in catch_up():
+                        yield chunk
+                    continue
 
-        if notification.is_read:
-            return Response({'message': '该通知已是已读状态'}, status=status.HTTP_200_OK)
+                if event == 'notification_updated':
+                    yield _format_event(payload, event)
+                    continue
+                # 实时事件在提交后发出，补查时已能查到；先按游标补查，比它 id 小、未经广播的通知不会被越过
+                async for chunk in catch_up():
+                    yield chunk
+                if payload['id'] > db_id and payload['id'] not in sent:
+                    sent.add(payload['id'])
+                    last_id = max(last_id, payload['id'])
+                    yield _format_event(payload)
+        finally:
+            broker.unsubscribe(subscription)
 
-        notification.is_read = True
-        notification.save(update_fields=['is_read'])
-        return Response({'message': '通知已标记为已读'}, status=status.HTTP_200_OK)
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 关闭 nginx 对该响应的缓冲
+    return response
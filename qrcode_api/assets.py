@@ -0,0 +1,181 @@
+# qrcode_api/assets.py
+"""
+海报底图与字体的进程内缓存：
+  - 第一次使用时才加载（多线程并发首访只解码一次）；
+  - 每次取用时 os.stat 比对 mtime / 大小，文件被替换后自动重新加载；
+  - 返回的对象在请求之间共享，调用方只能读（底图需先 copy() 再绘制）。
+"""
+import base64
+import io
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image, ImageFont
+
+ASSET_DIR = Path(__file__).resolve().parent
+BASE_IMAGE_PATH = ASSET_DIR / "base_images" / "base.png"
+FONT_PATH = ASSET_DIR / "fonts" / "ZiXinFangHuanYeGeTeTi-2.ttf"
+
+
+def _signature(path):
+    """文件的 (mtime_ns, size)；文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class FileAsset:
+    """按文件签名缓存 loader(path) 的结果"""
+
+    def __init__(self, path, loader):
+        self.path = path
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._signature = None
+        self._value = None
+
+    def get(self):
+        signature = _signature(self.path)
+        if signature is None:
+            return None
+        if signature == self._signature:
+            return self._value
+        with self._lock:
+            if signature != self._signature:  # 其它线程可能已经加载好了
+                value = self._loader(self.path)
+                self._value, self._signature = value, signature
+            return self._value
+
+    @property
+    def signature(self):
+        return _signature(self.path)
+
+    def clear(self):
+        with self._lock:
+            self._signature = self._value = None
+
+
+def _load_base_image(path):
+    image = Image.open(path)
+    # 不透明的底图保持 RGB：合成与编码都比 RGBA 少处理一个通道
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    image.load()
+    return image
+
+
+base_image = FileAsset(BASE_IMAGE_PATH, _load_base_image)
+
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+# 缩小后的底图按宽度缓存，最多保留这么多种尺寸
+SCALED_BASE_LIMIT = 8
+_scaled = {}
+_scaled_lock = threading.Lock()
+
+
+def get_base_image():
+    """解码后的底图（RGB，带透明通道时为 RGBA；共享只读）；文件不存在时返回 None"""
+    return base_image.get()
+
+
+def get_scaled_base(width):
+    """按宽度等比缩小的底图（共享只读），每种宽度只缩放一次"""
+    base = get_base_image()
+    if base is None or width >= base.width:
+        return base
+    key = (width, base_image.signature)
+    scaled = _scaled.get(key)
+    if scaled is not None:
+        return scaled
+
+    with _scaled_lock:
+        scaled = _scaled.get(key)
+        if scaled is None:
+            height = max(1, round(base.height * width / base.width))
+            scaled = base.resize((width, height), Image.LANCZOS)
+            for stale in [k for k in _scaled if k[1] != key[1]]:
+                del _scaled[stale]
+            while len(_scaled) >= SCALED_BASE_LIMIT:
+                del _scaled[next(iter(_scaled))]
+            _scaled[key] = scaled
+    return scaled
+
+
+_data_uris = {}
+
+
+def get_base_data_uri(width):
+    """
+    SVG 海报内嵌用的底图：按宽度缩小后编码为 data URI（不透明底图用 JPEG，带透明通道用 PNG），
+    每种宽度只编码一次。
+    """
+    base = get_base_image()
+    if base is None:
+        return None
+    key = (min(width, base.width), base_image.signature)
+    uri = _data_uris.get(key)
+    if uri is not None:
+        return uri
+
+    scaled = get_scaled_base(key[0])  # 自带加锁，须在下面的锁外调用
+    with _scaled_lock:
+        uri = _data_uris.get(key)
+        if uri is None:
+            buf = io.BytesIO()
+            if scaled.mode == "RGB":
+                scaled.save(buf, format="JPEG", quality=85)
+                mime = "image/jpeg"
+            else:
+                scaled.save(buf, format="PNG", compress_level=1)
+                mime = "image/png"
+            uri = f"data:{mime};base64,{base64.b64encode(buf.getvalue()).decode('ascii')}"
+            for stale in [k for k in _data_uris if k[1] != key[1]]:
+                del _data_uris[stale]
+            while len(_data_uris) >= SCALED_BASE_LIMIT:
+                del _data_uris[next(iter(_data_uris))]
+            _data_uris[key] = uri
+    return uri
+
+
+def get_font(size):
+    """
+    指定字号的字体（共享只读），按 (字号, 字体文件签名) 缓存；
+    字体文件缺失或损坏时回退到 PIL 自带字体（不一定支持中文）。
+    """
+    key = (size, _signature(FONT_PATH))
+    font = _fonts.get(key)
+    if font is not None:
+        return font
+
+    with _fonts_lock:
+        font = _fonts.get(key)
+        if font is None:
+            try:
+                font = ImageFont.truetype(str(FONT_PATH), size=size) if key[1] else ImageFont.load_default()
+            except OSError:
+                font = ImageFont.load_default()
+            # 字体文件变化后，旧签名下各字号的缓存一并丢弃
+            for stale in [k for k in _fonts if k[1] != key[1]]:
+                del _fonts[stale]
+            _fonts[key] = font
+    return font
+
+
+def asset_version():
+    """底图与字体的版本标识，文件任一变化都会改变"""
+    return f"{base_image.signature}:{_signature(FONT_PATH)}"
+
+
+def clear():
+    """清空缓存（测试 / 基准用）"""
+    base_image.clear()
+    with _fonts_lock:
+        _fonts.clear()
+    with _scaled_lock:
+        _scaled.clear()
+        _data_uris.clear()
@@ -0,0 +1,138 @@
+# qrcode_api/batch.py
+"""
+批量生成海报并流式打包成 ZIP：
+  - 海报在进程池中并行绘制（复用 render.py 与磁盘缓存，已生成过的直接读缓存）；
+    使用各功能共用的进程池（backend/pools.py，PROCESS_POOL_WORKERS 为 0 时在请求线程内绘制）；
+  - 同时进行的批量导出最多 QR_BATCH_MAX_CONCURRENT 个，再来的直接拒绝（BatchOverloaded，接口返回 503）；
+  - 每个导出同时在途的任务数有上限，按顺序一张张写进 ZIP 并立即发给客户端，内存中不会堆积全部海报；
+  - PNG / WebP / JPEG 本身已压缩，ZIP 只做存储（ZIP_STORED）；SVG 是文本，单独用 deflate 压缩。
+"""
+import re
+import threading
+import zipfile
+
+from django.conf import settings
+
+from backend import pools
+from . import poster_cache
+from .render import render_poster
+
+
+class BatchOverloaded(Exception):
+    """同时进行的批量导出已达上限"""
+
+
+def render_cached(params: dict) -> bytes:
+    """进程池中执行：取缓存或绘制一张海报"""
+    key = poster_cache.poster_key(params)
+    with poster_cache.open_poster(key, params, render_poster) as fh:
+        return fh.read()
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _get_slots() -> threading.BoundedSemaphore:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(getattr(settings, "QR_BATCH_MAX_CONCURRENT", 2))
+        return _slots
+
+
+def render_many(params_list):
+    """按输入顺序逐个产出海报文件内容；最多同时有 进程数 * 2 张在绘制或等待写出"""
+    workers = pools.max_workers()
+    if workers <= 0:
+        for params in params_list:
+            yield render_cached(params)
+        return
+
+    window = workers * 2
+    pending = []
+    try:
+        items = iter(params_list)
+        for params in items:
+            pending.append(pools.submit(render_cached, params))
+            if len(pending) >= window:
+                break
+        while pending:
+            future = pending.pop(0)
+            yield future.result()
+            next_params = next(items, None)
+            if next_params is not None:
+                pending.append(pools.submit(render_cached, next_params))
+    finally:
+        # 客户端中途断开时生成器被关闭，取消本次导出尚未开始的任务；进程池留给后续请求
+        for future in pending:
+            future.cancel()
+
+
+class _ZipStream:
+    """只支持 write / tell 的缓冲区，zipfile 会自动按不可 seek 的流处理（写数据描述符）"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def entry_filename(index: int, params: dict) -> str:
+    name = re.sub(r'[\\/:*?"<>|\s]+', "_", params["label"] or "").strip("._")
+    return f"{index + 1:03d}_{name or 'poster'}.{params.get('format', 'png')}"
+
+
+def stream_zip(params_list):
+    """生成 ZIP 字节流的分块，供 StreamingHttpResponse 使用"""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as zf:
+        for index, content in enumerate(render_many(params_list)):
+            params = params_list[index]
+            compress = zipfile.ZIP_DEFLATED if params.get("format") == "svg" else zipfile.ZIP_STORED
+            zf.writestr(entry_filename(index, params), content, compress_type=compress)
+            yield stream.drain()
+    yield stream.drain()
+
+
+class _BatchStream:
+    """占用一个导出名额的 ZIP 流；响应结束（含客户端断开）时 Django 调用 close()，归还名额"""
+
+    def __init__(self, chunks, slots):
+        self._chunks = chunks
+        self._slots = slots
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        if self._slots is not None:
+            self._slots.release()
+            self._slots = None
+
+
+def open_batch(params_list):
+    """占用一个导出名额并返回 ZIP 分块的迭代器；名额已满时抛 BatchOverloaded"""
+    slots = _get_slots()
+    if not slots.acquire(blocking=False):
+        raise BatchOverloaded("批量导出繁忙")
+    return _BatchStream(stream_zip(params_list), slots)
@@ -0,0 +1,161 @@
+# qrcode_api/poster_cache.py
+"""
+按内容寻址的海报磁盘缓存（MEDIA_ROOT/qr_cache/）：
+  - 键 = sha256(规范化参数（含输出格式与宽度）+ 底图 / 字体版本)，同一张海报只绘制一次；
+  - 命中时更新文件 mtime，总大小超过 QR_POSTER_CACHE_MAX_BYTES 时按 mtime 淘汰最旧的文件；
+  - 同一键的并发请求只有一个在绘制：进程内用锁，进程间用 flock，其余等待后直接读文件；
+  - 先写临时文件再 os.replace，读者不会看到写了一半的文件。
+调用方先用 poster_key() 算出键（也是 ETag），再用 open_poster() 取文件。
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from . import assets
+
+try:
+    import fcntl
+except ImportError:  # Windows：只做进程内合并
+    fcntl = None
+
+# 绘制逻辑变化时递增，让旧缓存自然失效
+RENDER_VERSION = 3
+
+
+def cache_dir() -> Path:
+    return Path(settings.MEDIA_ROOT) / "qr_cache"
+
+
+def poster_key(params: dict) -> str:
+    payload = json.dumps(
+        {"params": params, "assets": assets.asset_version(), "v": RENDER_VERSION},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path_for(key: str, fmt: str) -> Path:
+    return cache_dir() / key[:2] / f"{key}.{fmt}"
+
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _render_lock(key: str, lock_path: Path):
+    with _key_locks_guard:
+        lock, users = _key_locks.get(key, (threading.Lock(), 0))
+        _key_locks[key] = (lock, users + 1)
+    try:
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(lock_path, "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+    finally:
+        with _key_locks_guard:
+            lock, users = _key_locks[key]
+            if users == 1:
+                del _key_locks[key]
+            else:
+                _key_locks[key] = (lock, users - 1)
+
+
+def _open_cached(path: Path):
+    """命中时打开文件并刷新 mtime（LRU 依据）；未命中返回 None。已打开的文件被淘汰也不影响读取"""
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return fh
+
+
+def open_poster(key: str, params: dict, render):
+    """
+    返回缓存文件的只读文件对象；未命中时调用 render(params) 得到文件内容并写入缓存。
+    """
+    path = _path_for(key, params.get("format", "png"))
+    fh = _open_cached(path)
+    if fh is not None:
+        return fh
+
+    with _render_lock(key, path.with_suffix(".lock")):
+        fh = _open_cached(path)  # 等锁期间可能已被其它请求写好
+        if fh is None:
+            content = render(params)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(content)
+            os.replace(tmp, path)
+            fh = open(path, "rb")
+            _note_written(len(content))
+    return fh
+
+
+_size_guard = threading.Lock()
+_approx_size = None
+
+
+def _note_written(nbytes: int):
+    """累计本进程写入量，估计超限时才扫描目录淘汰"""
+    global _approx_size
+    limit = getattr(settings, "QR_POSTER_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+    with _size_guard:
+        if _approx_size is None:
+            _approx_size = _scan_total()
+        else:
+            _approx_size += nbytes
+        if _approx_size > limit:
+            _approx_size = evict(int(limit * 0.9))
+
+
+def _cached_files():
+    root = cache_dir()
+    if not root.exists():
+        return []
+    files = []
+    for entry in root.glob("*/*"):
+        if entry.suffix in (".lock", ".tmp"):
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, entry))
+    return files
+
+
+def _scan_total() -> int:
+    return sum(size for _, size, _ in _cached_files())
+
+
+def evict(target_bytes: int) -> int:
+    """按 mtime 从旧到新删除文件，直到总大小不超过 target_bytes；返回剩余大小"""
+    files = sorted(_cached_files(), key=lambda f: f[0])
+    total = sum(size for _, size, _ in files)
+    for _, size, entry in files:
+        if total <= target_bytes:
+            break
+        try:
+            entry.unlink()
+            total -= size
+        except FileNotFoundError:
+            pass
+        entry.with_suffix(".lock").unlink(missing_ok=True)
+    return total
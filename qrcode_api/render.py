@@ -0,0 +1,241 @@
+# qrcode_api/render.py
+"""
+二维码海报的参数解析与绘制，供单张接口、磁盘缓存和批量导出共用。
+"""
+import io
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageDraw
+import qrcode
+from qrcode.constants import ERROR_CORRECT_H
+from qrcode.exceptions import DataOverflowError
+
+from . import assets
+
+# 固定的文字位置与样式
+TEXT_Y = 1400
+TEXT_FONT_SIZE = 120
+TEXT_COLOR = (255, 215, 0, 255)
+LABEL_LIMIT = 9
+
+DEFAULT_X = 268
+DEFAULT_Y = 565
+DEFAULT_SIZE = 700
+DEFAULT_BORDER = 0
+
+# 缩小输出时的最小宽度
+MIN_WIDTH = 64
+
+# SVG 内嵌底图的最大像素宽度：二维码与文字是矢量，底图只作背景，
+# 原尺寸（1242 宽）内嵌会让默认宽度的 SVG 比 PNG 还大；更小的输出宽度按输出宽度内嵌
+SVG_BASE_MAX_WIDTH = 720
+
+# 输出格式：(Pillow 格式名, Content-Type, 编码参数)；svg 不经过 Pillow 栅格化，见 render_svg
+# PNG 压缩级别 1：编码比默认的 6 快约 4 倍，体积大约两成（见 benchmarks/bench_qr_formats.py）
+OUTPUT_FORMATS = {
+    "png": ("PNG", "image/png", {"compress_level": 1}),
+    "webp": ("WEBP", "image/webp", {"quality": 85, "method": 2}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85}),
+    "svg": (None, "image/svg+xml", {}),
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+
+class PosterError(ValueError):
+    """参数不合法或底图缺失；status 为对应的 HTTP 状态码"""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def truncate_label(s: str, limit: int = LABEL_LIMIT) -> str:
+    s = (s or "").strip()
+    if len(s) <= limit:
+        return s
+    return s[:limit] + "..."
+
+
+def normalize_params(query) -> dict:
+    """
+    把查询参数整理成绘制所需的规范形式（缺省值补齐、文字截断），
+    相同海报的不同写法得到相同结果，可直接作为缓存键。
+    """
+    data = query.get("data")
+    if not data:
+        raise PosterError("缺少 data 参数")
+    try:
+        params = {
+            "data": data,
+            "label": truncate_label(query.get("label", "")),
+            "x": int(query.get("x", DEFAULT_X)),
+            "y": int(query.get("y", DEFAULT_Y)),
+            "size": int(query.get("size", DEFAULT_SIZE)),
+            "border": int(query.get("border", DEFAULT_BORDER)),
+        }
+    except (TypeError, ValueError):
+        raise PosterError("x/y/size/border 必须为整数")
+    if params["size"] <= 0 or params["border"] < 0:
+        raise PosterError("size 必须为正数，border 不能为负数")
+
+    fmt = (query.get("format") or "png").lower()
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in OUTPUT_FORMATS:
+        raise PosterError(f"format 仅支持 {' / '.join(OUTPUT_FORMATS)}")
+    params["format"] = fmt
+    _check_capacity(data)
+
+    base = _base_image()
+    x, y, size = params["x"], params["y"], params["size"]
+    if x < 0 or y < 0 or x + size > base.width or y + size > base.height:
+        raise PosterError(
+            f"二维码区域超出底图范围。底图大小 {base.width}x{base.height}，"
+            f"请求放置区域 [{x},{y},{x + size},{y + size}]"
+        )
+
+    # 输出宽度：width 优先，其次 scale；与原图同宽时记为 None，便于共用缓存
+    try:
+        width = int(query["width"]) if query.get("width") not in (None, "") else None
+        scale = float(query["scale"]) if query.get("scale") not in (None, "") else 1.0
+    except (TypeError, ValueError):
+        raise PosterError("width 必须为整数，scale 必须为数字")
+    if width is None:
+        if not 0 < scale <= 1:
+            raise PosterError("scale 必须在 (0, 1] 之间")
+        width = round(base.width * scale)
+    if not MIN_WIDTH <= width <= base.width:
+        raise PosterError(f"输出宽度必须在 {MIN_WIDTH} 到 {base.width} 之间")
+    params["width"] = None if width == base.width else width
+    return params
+
+
+def _base_image():
+    base = assets.get_base_image()
+    if base is None:
+        raise PosterError(f"底图不存在: {assets.BASE_IMAGE_PATH}", status=500)
+    return base
+
+
+def _check_capacity(data):
+    """只算所需版本、不生成矩阵；超过最大版本（40）时绘制会抛 ValueError，这里提前报 400"""
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_CORRECT_H)
+    qr.add_data(data)
+    try:
+        qr.best_fit()
+    except (ValueError, DataOverflowError):
+        raise PosterError("data 过长，超出二维码容量")
+
+
+def _make_qr(params: dict) -> qrcode.QRCode:
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=ERROR_CORRECT_H,
+        box_size=1,
+        border=params["border"],
+    )
+    qr.add_data(params["data"])
+    qr.make(fit=True)
+    return qr
+
+
+def compose_poster(params: dict) -> Image.Image:
+    """
+    按规范化参数绘制海报。缩小输出时直接在缩小后的底图上绘制，
+    坐标、二维码边长和字号按同一比例换算。
+    """
+    base = _base_image()
+    width = params.get("width") or base.width
+    scale = width / base.width
+
+    # 共享底图只读，在副本上合成
+    canvas = assets.get_scaled_base(width).copy()
+
+    # 每个模块 1 像素生成，再用最近邻放大：模块边缘保持锐利，也省掉 LANCZOS 的开销
+    size = max(1, round(params["size"] * scale))
+    qr_img = _make_qr(params).make_image(fill_color="black", back_color="white").get_image()
+    qr_img = qr_img.convert(canvas.mode).resize((size, size), Image.NEAREST)
+    canvas.paste(qr_img, (round(params["x"] * scale), round(params["y"] * scale)))
+
+    label = params["label"]
+    if label:
+        draw = ImageDraw.Draw(canvas)
+        font = assets.get_font(max(1, round(TEXT_FONT_SIZE * scale)))
+        text_width = draw.textlength(label, font=font)
+        # 横向居中，纵向位置固定
+        draw.text(((canvas.width - text_width) // 2, round(TEXT_Y * scale)), label, font=font, fill=TEXT_COLOR)
+    return canvas
+
+
+def _qr_path(matrix) -> str:
+    """深色模块按行合并成矩形路径（以模块为单位）"""
+    parts = []
+    for row_index, row in enumerate(matrix):
+        col, n = 0, len(row)
+        while col < n:
+            if not row[col]:
+                col += 1
+                continue
+            start = col
+            while col < n and row[col]:
+                col += 1
+            parts.append(f"M{start} {row_index}h{col - start}v1h-{col - start}z")
+    return "".join(parts)
+
+
+def render_svg(params: dict) -> bytes:
+    """
+    矢量海报：底图按输出宽度（最大 SVG_BASE_MAX_WIDTH）缩小后内嵌，二维码为合并后的矩形路径，文字为 <text>。
+    viewBox 使用原底图坐标，x / y / size / border 与文字居中规则与位图输出一致；
+    文字使用项目字体的字体名，查看端未安装该字体时回退到无衬线字体。
+    """
+    base = _base_image()
+    width = params.get("width") or base.width
+    height = max(1, round(base.height * width / base.width))
+
+    matrix = _make_qr(params).get_matrix()
+    modules = len(matrix)
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'width="{width}" height="{height}" viewBox="0 0 {base.width} {base.height}">',
+        f'<image width="{base.width}" height="{base.height}" preserveAspectRatio="none" '
+        f'xlink:href="{assets.get_base_data_uri(min(width, SVG_BASE_MAX_WIDTH))}"/>',
+        f'<g transform="translate({params["x"]} {params["y"]}) scale({params["size"] / modules:.6g})" '
+        'shape-rendering="crispEdges">',
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>',
+        f'<path d="{_qr_path(matrix)}" fill="#000"/>',
+        '</g>',
+    ]
+
+    label = params["label"]
+    if label:
+        font = assets.get_font(TEXT_FONT_SIZE)
+        # 位图输出以 TEXT_Y 为字顶（上升线），SVG 的 y 是基线
+        ascent = font.getmetrics()[0] if hasattr(font, "getmetrics") else TEXT_FONT_SIZE
+        family = font.getname()[0] if hasattr(font, "getname") else ""
+        font_family = quoteattr(f"'{family}', sans-serif" if family else "sans-serif")
+        r, g, b = TEXT_COLOR[:3]
+        parts.append(
+            f'<text x="{base.width / 2:g}" y="{TEXT_Y + ascent}" text-anchor="middle" '
+            f'font-family={font_family} font-size="{TEXT_FONT_SIZE}" fill="#{r:02x}{g:02x}{b:02x}">'
+            f'{escape(label)}</text>'
+        )
+    parts.append('</svg>')
+    return "\n".join(parts).encode("utf-8")
+
+
+def render_poster(params: dict) -> bytes:
+    """绘制并按 params["format"] 编码"""
+    pil_format, _, options = OUTPUT_FORMATS[params.get("format", "png")]
+    if pil_format is None:
+        return render_svg(params)
+    image = compose_poster(params)
+    if pil_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format=pil_format, **options)
+    return buf.getvalue()
+
+
+def content_type(params: dict) -> str:
+    return OUTPUT_FORMATS[params.get("format", "png")][1]
@@ -1,3 +1,305 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from PIL import Image
+
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+from . import assets, batch, poster_cache, render
+from .render import PosterError, normalize_params
+
+TOO_LONG = "x" * 5000
+
+
+class PosterCapacityTests(TestCase):
+    def test_data_over_qr_capacity_is_rejected(self):
+        normalize_params({"data": "x" * 1000})
+        with self.assertRaises(PosterError) as ctx:
+            normalize_params({"data": TOO_LONG})
+        self.assertEqual(ctx.exception.status, 400)
+
+    def test_compose_returns_400_for_oversized_data(self):
+        response = self.client.get("/qr/compose/", {"data": TOO_LONG})
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchExportTests(TestCase):
+    def setUp(self):
+        self.teacher = CustomUser.objects.create_user(username="teacher", password="pw", role="teacher")
+
+    def _post(self, payload):
+        return self.client.post(
+            "/qr/batch/", payload, content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}",
+        )
+
+    def test_oversized_entries_are_reported_before_streaming(self):
+        response = self._post({"entries": [
+            {"data": "ok", "label": "a"}, {"data": TOO_LONG}, {"data": "ok"}, {"data": TOO_LONG},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e["index"] for e in response.json()["errors"]], [1, 3])
+
+    def test_busy_batch_slots_return_503(self):
+        slots = mock.Mock()
+        slots.acquire.return_value = False
+        with mock.patch.object(batch, "_get_slots", return_value=slots):
+            response = self._post({"entries": [{"data": "ok"}]})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+
+    def test_slot_released_when_stream_closes(self):
+        slots = mock.Mock()
+        slots.acquire.return_value = True
+        with mock.patch.object(batch, "_get_slots", return_value=slots):
+            chunks = batch.open_batch([])
+        self.assertEqual(b"".join(chunks)[:4], b"PK\x05\x06")
+        chunks.close()
+        chunks.close()
+        slots.release.assert_called_once_with()
+
+
+class PosterCacheTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.params = normalize_params({"data": "https://example.com", "label": "缓存"})
+        self.key = poster_cache.poster_key(self.params)
+
+    def _open(self, render):
+        with poster_cache.open_poster(self.key, self.params, render) as fh:
+            return fh.read()
+
+    def test_renders_once_then_serves_from_disk(self):
+        render = mock.Mock(return_value=b"poster")
+        self.assertEqual(self._open(render), b"poster")
+        self.assertEqual(self._open(render), b"poster")
+        render.assert_called_once_with(self.params)
+        # 参数写法不同但规范化后相同，键也相同
+        self.assertEqual(poster_cache.poster_key(normalize_params({"data": "https://example.com", "label": "缓存 "})),
+                         self.key)
+
+    def test_etag_and_304(self):
+        url = "/qr/compose/?data=https://example.com&label=etag"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"') and len(etag) == 66)
+        with mock.patch("qrcode_api.views.render_poster") as render:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], etag)
+        render.assert_not_called()
+
+    def test_eviction_removes_least_recently_used(self):
+        paths = []
+        for i in range(3):
+            path = poster_cache.cache_dir() / "ab" / f"{i}.png"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        # 读取命中会刷新 mtime：最旧的 0 号被读过之后，淘汰的是 1 号
+        poster_cache._open_cached(paths[0]).close()
+
+        self.assertEqual(poster_cache.evict(200), 200)
+        self.assertEqual([p.exists() for p in paths], [True, False, True])
+
+    @override_settings(QR_POSTER_CACHE_MAX_BYTES=250)
+    def test_writes_over_limit_trigger_eviction(self):
+        with mock.patch.object(poster_cache, "_approx_size", None):
+            for i in range(4):
+                params = {**self.params, "label": f"第{i}张"}
+                with poster_cache.open_poster(poster_cache.poster_key(params), params, lambda _: b"x" * 100):
+                    pass
+                time.sleep(0.01)
+            self.assertLessEqual(poster_cache._scan_total(), 250)
+
+    def test_concurrent_requests_render_once(self):
+        calls = []
+
+        def slow_render(params):
+            calls.append(params)
+            time.sleep(0.2)
+            return b"poster"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self._open(slow_render))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [b"poster"] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_render_held_by_another_process(self):
+        if poster_cache.fcntl is None:
+            self.skipTest("没有 fcntl")
+        path = poster_cache._path_for(self.key, "png")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 另一个进程持有 flock 正在绘制（flock 按打开的文件计，同一进程里另开一次即可模拟）
+        holder = open(path.with_suffix(".lock"), "a")
+        poster_cache.fcntl.flock(holder, poster_cache.fcntl.LOCK_EX)
+        render = mock.Mock(return_value=b"mine")
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self._open(render)))
+        waiter.start()
+        time.sleep(0.2)
+        self.assertTrue(waiter.is_alive())
+
+        path.write_bytes(b"theirs")
+        poster_cache.fcntl.flock(holder, poster_cache.fcntl.LOCK_UN)
+        holder.close()
+        waiter.join(5)
+        self.assertEqual(results, [b"theirs"])
+        render.assert_not_called()
+
+
+SVG = "{http://www.w3.org/2000/svg}"
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+
+class SvgPosterTests(TestCase):
+    def _render(self, **query):
+        params = normalize_params({"data": "https://example.com/t/1", "format": "svg", **query})
+        return params, ElementTree.fromstring(render.render_svg(params))
+
+    def _embedded_base(self, root):
+        href = root.find(f"{SVG}image").get(XLINK_HREF)
+        header, _, payload = href.partition(",")
+        self.assertEqual(header, "data:image/jpeg;base64")
+        return Image.open(io.BytesIO(base64.b64decode(payload)))
+
+    def test_default_width_embeds_downscaled_base(self):
+        base = assets.get_base_image()
+        _, root = self._render()
+        self.assertEqual((root.get("width"), root.get("height")), (str(base.width), str(base.height)))
+        self.assertEqual(root.get("viewBox"), f"0 0 {base.width} {base.height}")
+        image = root.find(f"{SVG}image")
+        self.assertEqual((image.get("width"), image.get("height")), (str(base.width), str(base.height)))
+        embedded = self._embedded_base(root)
+        self.assertEqual(embedded.width, render.SVG_BASE_MAX_WIDTH)
+        self.assertEqual(embedded.height, round(base.height * render.SVG_BASE_MAX_WIDTH / base.width))
+
+    def test_small_width_embeds_base_at_output_width(self):
+        base = assets.get_base_image()
+        _, root = self._render(width="300")
+        height = round(base.height * 300 / base.width)
+        self.assertEqual((root.get("width"), root.get("height")), ("300", str(height)))
+        # viewBox 仍是原底图坐标，二维码与文字的位置不随输出宽度变化
+        self.assertEqual(root.get("viewBox"), f"0 0 {base.width} {base.height}")
+        self.assertEqual(self._embedded_base(root).size, (300, height))
+
+    def test_qr_geometry_matches_raster_layout(self):
+        params, root = self._render(x="100", y="200", size="500", border="2")
+        matrix = render._make_qr(params).get_matrix()
+        modules = len(matrix)
+        group = root.find(f"{SVG}g")
+        match = re.fullmatch(r"translate\((\d+) (\d+)\) scale\(([\d.]+)\)", group.get("transform"))
+        self.assertEqual(match.group(1, 2), ("100", "200"))
+        self.assertAlmostEqual(float(match.group(3)) * modules, 500, places=3)
+        rect = group.find(f"{SVG}rect")
+        self.assertEqual((rect.get("width"), rect.get("height")), (str(modules), str(modules)))
+
+        # 路径还原回模块矩阵，应与二维码完全一致
+        drawn = [[False] * modules for _ in range(modules)]
+        for col, row, run in re.findall(r"M(\d+) (\d+)h(\d+)v1h-\d+z", group.find(f"{SVG}path").get("d")):
+            for c in range(int(col), int(col) + int(run)):
+                drawn[int(row)][c] = True
+        self.assertEqual(drawn, matrix)
+
+    def test_label_is_escaped_and_positioned(self):
+        base = assets.get_base_image()
+        _, root = self._render(label="<a&b>")
+        text = root.find(f"{SVG}text")
+        self.assertEqual(text.text, "<a&b>")
+        self.assertEqual(text.get("x"), f"{base.width / 2:g}")
+        ascent = assets.get_font(render.TEXT_FONT_SIZE).getmetrics()[0]
+        self.assertEqual(text.get("y"), str(render.TEXT_Y + ascent))
+        self.assertEqual(text.get("fill"), "#ffd700")
+
+        _, unlabeled = self._render()
+        self.assertIsNone(unlabeled.find(f"{SVG}text"))
+
+
+class PosterOptionsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _get(self, **query):
+        return self.client.get("/qr/compose/", {"data": "https://example.com", **query})
+
+    def _image(self, response):
+        self.assertEqual(response.status_code, 200)
+        return Image.open(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_format_switch(self):
+        cases = {
+            "png": ("image/png", "PNG"),
+            "webp": ("image/webp", "WEBP"),
+            "jpeg": ("image/jpeg", "JPEG"),
+            "JPG": ("image/jpeg", "JPEG"),
+        }
+        for fmt, (mime, pil_format) in cases.items():
+            with self.subTest(fmt=fmt):
+                response = self._get(format=fmt, width="200")
+                self.assertEqual(response["Content-Type"], mime)
+                self.assertEqual(self._image(response).format, pil_format)
+
+        response = self._get(format="svg", download="1")
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="qr_composed.svg"')
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"<svg "))
+        # jpg 与 jpeg 是同一张海报
+        self.assertEqual(normalize_params({"data": "a", "format": "jpg"}), normalize_params({"data": "a", "format": "jpeg"}))
+
+    def test_width_and_scale(self):
+        base = assets.get_base_image()
+        self.assertEqual(self._image(self._get(width="300")).size, (300, round(base.height * 300 / base.width)))
+        self.assertEqual(self._image(self._get(scale="0.5")).width, round(base.width * 0.5))
+
+        # width 优先于 scale；上下限本身可用；与底图同宽（或 scale=1）记为默认宽度，共用同一份缓存
+        self.assertEqual(normalize_params({"data": "a", "width": "100", "scale": "0.5"})["width"], 100)
+        self.assertEqual(normalize_params({"data": "a", "width": str(render.MIN_WIDTH)})["width"], render.MIN_WIDTH)
+        self.assertIsNone(normalize_params({"data": "a", "width": str(base.width)})["width"])
+        self.assertIsNone(normalize_params({"data": "a", "scale": "1"})["width"])
+        self.assertIsNone(normalize_params({"data": "a", "width": ""})["width"])
+
+    def test_invalid_options_return_400(self):
+        base = assets.get_base_image()
+        cases = [
+            {"format": "gif"},
+            {"width": "abc"},
+            {"width": "12.5"},
+            {"width": str(render.MIN_WIDTH - 1)},
+            {"width": str(base.width + 1)},
+            {"scale": "abc"},
+            {"scale": "0"},
+            {"scale": "-0.5"},
+            {"scale": "1.5"},
+            # 按比例算出的宽度也要不小于下限
+            {"scale": "0.01"},
+        ]
+        for query in cases:
+            with self.subTest(query=query), mock.patch.object(poster_cache, "open_poster") as open_poster:
+                response = self._get(**query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("detail", response.json())
+                open_poster.assert_not_called()
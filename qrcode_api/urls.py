@@ -1,7 +1,8 @@
 # apps/qrcode_api/urls.py
 from django.urls import path
-from .views import ComposeQrOnBaseView
+from .views import ComposeQrOnBaseView, ComposeQrBatchView
 
 urlpatterns = [
     path("compose/", ComposeQrOnBaseView.as_view()),
+    path("batch/", ComposeQrBatchView.as_view()),
 ]
@@ -1,12 +1,20 @@
 # apps/qrcode_api/views.py
-import io
-from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny
-from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
-from qrcode.constants import ERROR_CORRECT_H
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated
+
+from . import poster_cache
+from .batch import BatchOverloaded, open_batch
+from .render import PosterError, content_type, normalize_params, render_poster
+
+
+class ImageFormatNegotiation(DefaultContentNegotiation):
+    """?format= 用来选图片格式，不交给 DRF 选渲染器（本视图直接返回图片 / JSON）"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
 
 
 class ComposeQrOnBaseView(APIView):
@@ -17,108 +25,89 @@ class ComposeQrOnBaseView(APIView):
       - x,y:    可选，二维码左上角坐标，默认 (265,560)
       - size:   可选，二维码边长像素，默认 700
       - border: 可选，二维码白边(模块数)，默认 0
+      - format: 可选，png（默认）/ webp / jpeg / svg（二维码为矢量路径，底图内嵌，文字为文本）
+      - width:  可选，输出宽度像素（等比缩小，不超过底图宽度）；或用 scale=0.5 按比例缩小
+
+    同一组参数的海报只绘制一次，之后直接返回磁盘缓存（见 poster_cache.py），
+    并带上强 ETag，客户端可用 If-None-Match 复用本地副本。
     """
     permission_classes = [AllowAny]
+    content_negotiation_class = ImageFormatNegotiation
 
-    # 固定的文字位置与样式（你可以改成你想要的）
-    TEXT_X = 100
-    TEXT_Y = 1400
-    TEXT_FONT_SIZE = 120
-    TEXT_COLOR = (255, 215, 0, 255)  # 纯白
-
-    def _truncate_label(self, s: str, limit: int = 10) -> str:
-        s = (s or "").strip()
-        if len(s) <= limit:
-            return s
-        return s[:limit] + "..."
-
-    def _load_font(self, size: int):
-        """优先加载项目内字体；失败则回退到 PIL 自带字体"""
-        base_dir = Path(__file__).resolve().parent
-        font_path = base_dir / "fonts" / "ZiXinFangHuanYeGeTeTi-2.ttf"  # 自行替换文件名
+    def get(self, request):
         try:
-            if font_path.exists():
-                return ImageFont.truetype(str(font_path), size=size)
-        except Exception:
-            pass
-        # 回退：不一定支持中文
-        return ImageFont.load_default()
+            params = normalize_params(request.query_params)
+        except PosterError as exc:
+            return JsonResponse({"detail": exc.detail}, status=exc.status)
+
+        # 缓存键只由参数和资源版本决定，客户端已有同一张海报时无需绘制
+        key = poster_cache.poster_key(params)
+        etag = f'"{key}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            resp = HttpResponse(status=304)
+        else:
+            resp = FileResponse(poster_cache.open_poster(key, params, render_poster), content_type=content_type(params))
+            if request.query_params.get("download") is not None:  # 任意值即触发下载
+                resp["Content-Disposition"] = f'attachment; filename="qr_composed.{params["format"]}"'
+        resp["ETag"] = etag
+        resp["Cache-Control"] = f"public, max-age={getattr(settings, 'QR_POSTER_MAX_AGE', 30 * 24 * 3600)}"
+        return resp
 
-    def get(self, request):
-        data = request.query_params.get("data")
-        if not data:
-            return JsonResponse({"detail": "缺少 data 参数"}, status=400)
 
-        try:
-            x = int(request.query_params.get("x", 268))
-            y = int(request.query_params.get("y", 565))
-            size = int(request.query_params.get("size", 700))
-            border = int(request.query_params.get("border", 0))
-            download = request.query_params.get("download")  # 任意值即触发下载
-        except ValueError:
-            return JsonResponse({"detail": "x/y/size/border 必须为整数"}, status=400)
-
-        # 读取底图
-        base_dir = Path(__file__).resolve().parent
-        base_path = base_dir / "base_images" / "base.png"
-        if not base_path.exists():
-            return JsonResponse({"detail": f"底图不存在: {base_path}"}, status=500)
-
-        base = Image.open(base_path).convert("RGBA")
-
-        # 生成二维码
-        qr = qrcode.QRCode(
-            version=None,
-            error_correction=ERROR_CORRECT_H,
-            box_size=10,
-            border=border,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-        qr_img = qr_img.resize((size, size), Image.LANCZOS)
-
-        # 合成二维码
-        canvas = base.copy()
-        if x < 0 or y < 0 or x + size > canvas.width or y + size > canvas.height:
-            return JsonResponse({
-                "detail": f"二维码区域超出底图范围。底图大小 {canvas.width}x{canvas.height}，"
-                          f"请求放置区域 [{x},{y},{x+size},{y+size}]"
-            }, status=400)
-        canvas.alpha_composite(qr_img, dest=(x, y))
-
-        # ====== 新增：绘制白色文字（居中） ======
-        label = request.query_params.get("label", "")
-        label = self._truncate_label(label, limit=9)  # 超过 10 字截断加 ...
-        if label:
-            draw = ImageDraw.Draw(canvas)
-            font = self._load_font(self.TEXT_FONT_SIZE)
-
-            # 计算文字宽度并居中
+class IsTeacherOrAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.role in ('teacher', 'admin')
+
+
+class ComposeQrBatchView(APIView):
+    """
+    POST /qr/batch/  批量生成海报并打包下载（老师 / 管理员）
+      {
+        "entries": [{"data": "...", "label": "张三"}, ...],   # 必填，最多 QR_BATCH_MAX_ENTRIES 条
+        "x": 268, "y": 565, "size": 700, "border": 0,         # 可选，所有海报共用
+        "format": "png", "width": 621                         # 可选，同单张接口
+      }
+    返回 ZIP（边绘制边下发），文件名为 “序号_label.扩展名”。
+    条目不合法（含 data 超出二维码容量）时返回 400 与出错条目的 index；
+    同时进行的导出达到 QR_BATCH_MAX_CONCURRENT 时返回 503。
+    """
+    permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
+
+    def post(self, request):
+        entries = request.data.get("entries")
+        if not isinstance(entries, list) or not entries:
+            return JsonResponse({"detail": "entries 必须是非空数组"}, status=400)
+        max_entries = getattr(settings, "QR_BATCH_MAX_ENTRIES", 500)
+        if len(entries) > max_entries:
+            return JsonResponse({"detail": f"一次最多生成 {max_entries} 张海报"}, status=400)
+
+        shared = {
+            k: request.data[k]
+            for k in ("x", "y", "size", "border", "format", "width", "scale") if k in request.data
+        }
+        params_list, errors = [], []
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                errors.append({"index": index, "detail": "每一项必须是对象"})
+                continue
             try:
-                text_width = draw.textlength(label, font=font)  # Pillow >=8.0
-            except AttributeError:
-                text_width, _ = draw.textsize(label, font=font)  # 兼容旧版本
-
-            x = (canvas.width - text_width) // 2
-            y = self.TEXT_Y  # 纵向位置仍然写死
-
-            draw.text(
-                (x, y),
-                label,
-                font=font,
-                fill=self.TEXT_COLOR,
-            )
-        # ====== 新增结束 ======
-
-
-        # 输出 PNG
-        buf = io.BytesIO()
-        out = canvas.convert("RGBA")
-        out.save(buf, format="PNG")
-        buf.seek(0)
-
-        resp = HttpResponse(buf.getvalue(), content_type="image/png")
-        if download is not None:
-            resp["Content-Disposition"] = 'attachment; filename="qr_composed.png"'
+                params_list.append(normalize_params({
+                    **shared, "data": entry.get("data"), "label": entry.get("label", ""),
+                }))
+            except PosterError as exc:
+                if exc.status >= 500:
+                    return JsonResponse({"detail": exc.detail}, status=exc.status)
+                errors.append({"index": index, "detail": exc.detail})
+        if errors:
+            return JsonResponse({"detail": "部分条目不合法", "errors": errors}, status=400)
+
+        try:
+            chunks = open_batch(params_list)
+        except BatchOverloaded:
+            resp = JsonResponse({"detail": "批量导出繁忙，请稍后重试"}, status=503)
+            resp["Retry-After"] = "5"
+            return resp
+
+        resp = StreamingHttpResponse(chunks, content_type="application/zip")
+        resp["Content-Disposition"] = 'attachment; filename="qr_posters.zip"'
         return resp
@@ -5,6 +5,7 @@ from .models import Task
 from rest_framework.exceptions import ValidationError
 
 from users.models import CustomUser  # 引入用户模型
+from uploads.variants import variant_sets_for, variant_urls
 
 class AcceptedUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,6 +18,7 @@ class TaskSerializer(serializers.ModelSerializer):
     deadline = serializers.DateTimeField(format="%Y-%m-%d %H:%M")  # 自定义显示格式
 
     accepted_by = AcceptedUserSerializer(many=True, read_only=True)  # 嵌套序列化用户信息
+    image_variants = serializers.SerializerMethodField()  # 任务图片各尺寸版本的地址，无图片时为 null
 
     class Meta:
         model = Task
@@ -25,8 +27,21 @@ class TaskSerializer(serializers.ModelSerializer):
             'experience_reward', 'token_reward', 'volunteerTime_reward',
             'publisher_nickname', 'publisher_avatar',
             'accepted_by',  # 这里现在是对象数组，包含id、nickname、avatar
-            'is_accepted', 'is_completed', 'required_level'
+            'is_accepted', 'is_completed', 'required_level',
+            'image_variants',
         ]
+
+    def get_image_variants(self, task):
+        if not task.image:
+            return None
+        # 列表序列化时一次查出本页所有任务图片的生成状态，避免每个任务查一次
+        sets = self.context.get('_image_variant_sets')
+        if sets is None:
+            parent = self.parent
+            tasks = parent.instance if parent is not None and parent.instance is not None else [task]
+            sets = variant_sets_for(t.image.name for t in tasks if t.image)
+            self.context['_image_variant_sets'] = sets
+        return variant_urls(task.image.name, sets.get(task.image.name), self.context.get('request'))
     
     def validate(self, attrs):
         request = self.context.get("request")
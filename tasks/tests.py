@@ -1,3 +1,41 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+from .models import Task
+
+
+class ApplyInviteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = CustomUser.objects.create_user(username='teacher', password='pw', role='teacher')
+        cls.leader = CustomUser.objects.create_user(username='leader', password='pw', role='student')
+        cls.mate = CustomUser.objects.create_user(username='mate', password='pw', role='student')
+        cls.task = Task.objects.create(
+            title='组队任务', description='描述', task_type='team', publisher=cls.teacher,
+            maximum_users=3, deadline=timezone.now() + timedelta(days=7),
+        )
+
+    def _apply(self, identifiers):
+        return self.client.post(
+            f'/tasks/{self.task.pk}/apply/', {'invited_identifiers': identifiers}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.leader)}',
+        )
+
+    def test_unknown_invited_identifier_is_rejected_before_changes(self):
+        response = self._apply([self.mate.identifier, '999999'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['not_found'], ['999999'])
+        self.task.refresh_from_db()
+        self.assertIsNone(self.task.leader)
+        self.assertFalse(self.task.accepted_by.exists())
 
-# Create your tests here.
+    def test_duplicate_invites_are_applied_once(self):
+        response = self._apply([self.mate.identifier, self.mate.identifier])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.leader, self.leader)
+        self.assertEqual(list(self.task.invited_users.all()), [self.mate])
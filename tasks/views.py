@@ -64,11 +64,13 @@ class TaskListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        user_level = user.calculate_level()
+        # 用 token 声明中的等级（升级时旧 token 已失效），不必读取经验和称号
+        user_level = user.level
 
         # 等级顺序映射 {"F":0, "E":1, ..., "SSS":7}
         level_order = {lvl: i for i, (_, lvl) in enumerate(settings.LEVEL_THRESHOLDS)}
-        user_level_index = level_order[user_level]
+        # 满级后等级显示为称号名，按最高等级处理
+        user_level_index = level_order.get(user_level, len(level_order) - 1)
 
         params = self.request.query_params
         level_param = params.get("level")  # 例如 ?level=E
@@ -253,12 +255,14 @@ class TaskUpdateView(generics.UpdateAPIView):
                 # 给已接取与受邀的同学各发一条系统通知
                 targets = list(task.accepted_by.all()) + list(task.invited_users.all())
                 for u in targets:
+                    # 传入 changed_fields：老师连续修改时合并成一条通知，只发一封邮件
                     create_notification(
                         user=u,
                         type='system',
-                        message=f'任务《{task.title}》已被老师更新：{", ".join(changed_fields)}',
+                        message=f'任务《{task.title}》已被老师更新',
                         task=task,
-                        related_user=request.user
+                        related_user=request.user,
+                        changed_fields=changed_fields
                     )
         except Exception:
             # 静默忽略通知失败，确保核心更新成功
@@ -299,7 +303,16 @@ class ApplyTaskView(APIView):
 
 
         # 从请求中获取 invited_identifiers（使用 identifier 而不是数据库 id）
-        invited_identifiers = request.data.get('invited_identifiers', [])
+        invited_identifiers = list(dict.fromkeys(request.data.get('invited_identifiers', [])))
+        invited_users = []
+        if task.task_type == 'team' and invited_identifiers:
+            # 一次查询取回全部被邀请者，先校验再改动任务
+            invited_users = list(CustomUser.objects.filter(identifier__in=invited_identifiers))
+            found = {u.identifier for u in invited_users}
+            missing = [i for i in invited_identifiers if i not in found]
+            if missing:
+                return Response({'detail': '部分 identifier 无效或用户不存在', 'not_found': missing}, status=400)
+
         task.accepted_by.add(request.user)
 
         if task.task_type == 'solo':
@@ -314,15 +327,11 @@ class ApplyTaskView(APIView):
                 task.is_started = True
                 task.is_accepted = True
             else:
-                users = CustomUser.objects.filter(identifier__in=invited_identifiers)
-                if users.count() != len(invited_identifiers):
-                    return Response({'detail': '部分 identifier 无效或用户不存在'}, status=400)
-
-                task.invited_users.set(users)
+                task.invited_users.set(invited_users)
                 task.is_accepted = True
 
                 # 给被邀请者发送通知
-                for user in users:
+                for user in invited_users:
                     create_notification(
                         user=user,
                         type='invite',
@@ -560,7 +569,7 @@ class ApproveCompleteTaskView(APIView):
                 student.experience += task.experience_reward
                 student.tokens += task.token_reward
                 student.volunteerTime += task.volunteerTime_reward
-                student.save()
+                student.save(update_fields=['experience', 'tokens', 'volunteerTime'])
                 # ✅ 新增：通知学生（包含奖励）
                 create_notification(
                     user=student,
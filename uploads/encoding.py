@@ -0,0 +1,72 @@
+# uploads/encoding.py
+"""
+上传图片的压缩（解码、缩放、编码）放到独立的进程池里做，处理请求的线程只等待结果：
+  - 使用各功能共用的进程池（backend/pools.py，PROCESS_POOL_WORKERS 为 0 时在请求线程内直接压缩）；
+  - 本进程同时在压缩或排队的图片达到 UPLOAD_ENCODE_MAX_PENDING 时直接拒绝（EncodeOverloaded，接口返回 503），
+    等待超过 UPLOAD_ENCODE_TIMEOUT 秒同样按过载处理；
+  - 压缩力度 UPLOAD_ENCODE_EFFORT：fast / balanced / max（见 imaging.ENCODE_EFFORTS）。
+"""
+import threading
+from concurrent.futures import TimeoutError
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from backend import pools
+from .imaging import ENCODE_EFFORTS, compress_image
+
+
+class EncodeOverloaded(Exception):
+    """压缩队列已满或等待超时"""
+
+
+def encode_effort() -> str:
+    effort = getattr(settings, "UPLOAD_ENCODE_EFFORT", "balanced")
+    if effort not in ENCODE_EFFORTS:
+        raise ImproperlyConfigured(f"UPLOAD_ENCODE_EFFORT 只能是 {' / '.join(ENCODE_EFFORTS)}")
+    return effort
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _get_slots(workers: int) -> threading.BoundedSemaphore:
+    """排队名额；名额在任务真正结束时才归还，超时放弃等待的任务也占着名额"""
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            max_pending = getattr(settings, "UPLOAD_ENCODE_MAX_PENDING", None) or workers * 4
+            _slots = threading.BoundedSemaphore(max_pending)
+        return _slots
+
+
+def compress_upload(f, max_width: int, target_format: str) -> bytes:
+    """压缩上传文件，返回编码后的字节；过载时抛 EncodeOverloaded，图片损坏时抛出解码异常"""
+    effort = encode_effort()
+    # 大文件已落在临时文件里，只把路径交给子进程，避免在进程间复制内容
+    if hasattr(f, "temporary_file_path"):
+        source = f.temporary_file_path()
+    else:
+        f.seek(0)
+        source = f.read()
+
+    workers = pools.max_workers()
+    if workers <= 0:
+        return compress_image(source, max_width, target_format, effort)
+
+    slots = _get_slots(workers)
+    if not slots.acquire(blocking=False):
+        raise EncodeOverloaded("压缩队列已满")
+    try:
+        future = pools.submit(compress_image, source, max_width, target_format, effort)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        return future.result(timeout=getattr(settings, "UPLOAD_ENCODE_TIMEOUT", 30))
+    except TimeoutError:
+        future.cancel()
+        raise EncodeOverloaded("压缩超时")
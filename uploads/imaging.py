@@ -0,0 +1,100 @@
+# uploads/imaging.py
+"""
+Pillow helpers shared by the upload endpoint and the variant worker.
+No Django imports here: compress_image runs in spawned encode-pool processes.
+"""
+import io
+
+from PIL import ExifTags, Image, ImageOps
+
+# EXIF orientations that swap width and height
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def has_alpha(img: Image.Image) -> bool:
+    if img.mode in ("RGBA", "LA"):
+        return True
+    if img.mode == "P" and "transparency" in img.info:
+        return True
+    return False
+
+
+def flatten_to_rgb(img: Image.Image, bg=(255, 255, 255)) -> Image.Image:
+    """Flatten RGBA/LA/P(with transparency) to RGB using a solid background."""
+    if img.mode in ("RGBA", "LA"):
+        alpha = img.split()[-1]
+        base = Image.new("RGB", img.size, bg)
+        base.paste(img.convert("RGB"), mask=alpha)
+        return base
+    if img.mode == "P" and "transparency" in img.info:
+        return img.convert("RGBA").convert("RGB")
+    if img.mode == "P":
+        return img.convert("RGB")
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def display_size(img: Image.Image):
+    """Size after EXIF rotation, read from the header only."""
+    orientation = img.getexif().get(ExifTags.Base.Orientation, 1)
+    if orientation in _ROTATED_ORIENTATIONS:
+        return img.height, img.width
+    return img.size
+
+
+def decode_bounded(img: Image.Image, max_width: int) -> Image.Image:
+    """
+    Decode at most about the size we will keep, then rotate per EXIF.
+    JPEGs decode at 1/2, 1/4 or 1/8 scale via draft(); other formats are
+    reduced by an integer factor before the final LANCZOS resize.
+    """
+    display_w, display_h = display_size(img)
+    if display_w <= max_width:
+        img.load()
+        return ImageOps.exif_transpose(img)
+
+    ratio = max_width / float(display_w)
+    new_display = (max_width, max(1, int(display_h * ratio)))
+    swapped = img.size != (display_w, display_h)
+    target = new_display[::-1] if swapped else new_display
+
+    img.draft(None, target)  # no-op for non-JPEG
+    img.load()
+    factor = min(img.width // target[0], img.height // target[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != target:
+        img = img.resize(target, Image.LANCZOS)
+    return ImageOps.exif_transpose(img)
+
+
+# Encoder options per effort level; higher effort gives smaller files for more CPU
+# (see benchmarks/bench_upload_load.py). "max" is what uploads used before.
+ENCODE_EFFORTS = {
+    "fast": {"JPEG": {"optimize": False, "progressive": False}, "WEBP": {"method": 2}},
+    "balanced": {"JPEG": {"optimize": True, "progressive": False}, "WEBP": {"method": 4}},
+    "max": {"JPEG": {"optimize": True, "progressive": True}, "WEBP": {"method": 6}},
+}
+
+
+def compress_image(source, max_width: int, target_format: str, effort: str = "balanced") -> bytes:
+    """
+    Decode (bounded to max_width), then encode as target_format.
+    source is the raw bytes or a file path, so it can be handed to another process.
+    """
+    img = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    img = decode_bounded(img, max_width)  # respects camera rotation
+    options = ENCODE_EFFORTS[effort].get(target_format, {})
+    buffer = io.BytesIO()
+    if target_format == "JPEG":
+        # Ensure no alpha before saving as JPEG (this was the crash)
+        flatten_to_rgb(img).save(buffer, format="JPEG", quality=80, **options)
+    elif target_format == "WEBP":
+        # Keep transparency; lossless=True would suit line art/icons better
+        img_to_save = img.convert("RGBA") if has_alpha(img) else img.convert("RGB")
+        img_to_save.save(buffer, format="WEBP", quality=80, lossless=False, **options)
+    else:
+        # Fallback (rare)
+        img.save(buffer, format=target_format, optimize=True)
+    return buffer.getvalue()
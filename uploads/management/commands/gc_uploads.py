@@ -0,0 +1,20 @@
+# uploads/management/commands/gc_uploads.py
+from django.core.management.base import BaseCommand
+
+from uploads.media_store import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "重新统计上传文件的引用数，删除宽限期前上传且不再被引用的文件（连同多尺寸版本）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-days", type=int, default=None, help="宽限期天数，默认取 UPLOAD_GC_GRACE_DAYS")
+        parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+
+    def handle(self, *args, **options):
+        summary = collect_garbage(options["grace_days"], dry_run=options["dry_run"])
+        prefix = "[dry-run] 将" if summary["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"检查 {summary['checked']} 个文件，{prefix}删除 {summary['deleted']} 个"
+            f"（{summary['freed_bytes'] / 1024 / 1024:.1f} MB），更新引用数 {summary['recounted']} 个"
+        ))
@@ -0,0 +1,36 @@
+# uploads/management/commands/generate_image_variants.py
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task
+from uploads.models import ImageVariantSet
+from uploads.variants import regenerate
+
+
+class Command(BaseCommand):
+    help = "补做图片多尺寸版本：登记尚未登记的 Task.image，并生成所有 pending 的图片"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="生成进程数，默认使用 PROCESS_POOL_WORKERS 的共用进程池")
+        parser.add_argument("--retry-failed", action="store_true", help="同时重试生成失败的图片")
+        parser.add_argument("--all", action="store_true", help="全部重新生成（原图或版本规格变化后使用）")
+
+    def handle(self, *args, **options):
+        sources = set(
+            Task.objects.exclude(image="").exclude(image__isnull=True).values_list("image", flat=True)
+        )
+        known = set(ImageVariantSet.objects.filter(source__in=sources).values_list("source", flat=True))
+        ImageVariantSet.objects.bulk_create(
+            [ImageVariantSet(source=source) for source in sources - known], ignore_conflicts=True,
+        )
+
+        queryset = ImageVariantSet.objects.all()
+        if not options["all"]:
+            statuses = ["pending", "failed"] if options["retry_failed"] else ["pending"]
+            queryset = queryset.filter(status__in=statuses)
+        set_ids = list(queryset.order_by("id").values_list("id", flat=True))
+
+        summary = regenerate(set_ids, workers=options["workers"])
+        self.stdout.write(self.style.SUCCESS(
+            f"新登记 {len(sources - known)} 张，处理 {len(set_ids)} 张："
+            f"成功 {summary.get('ready', 0)}，失败 {summary.get('failed', 0)}"
+        ))
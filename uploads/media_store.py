@@ -0,0 +1,147 @@
+# uploads/media_store.py
+"""
+按内容寻址的上传存储（images/<sha256 前 32 位>.<扩展名>）：
+  - 上传先对原始字节算哈希，同一文件再次上传时直接返回已存的文件，不再解码和压缩；
+  - 未命中时按最终存储内容（压缩后的字节或原文件）的哈希命名，不同原图压缩出相同结果也只存一份；
+  - MediaBlob 记录引用数，collect_garbage 按实际引用重新统计，删除宽限期内没有再上传、也没有任何引用的文件。
+文件名只取哈希前 32 位，路径长度与原来的 uuid 文件名相同（头像字段限长 50）。
+"""
+import hashlib
+import logging
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from tasks.models import Task
+from users.models import CustomUser
+
+from .models import ImageVariantSet, MediaBlob
+from .variants import VARIANT_FORMATS, VARIANT_WIDTHS, variant_path
+
+logger = logging.getLogger(__name__)
+
+# 头像、任务图片和任务描述里出现的上传文件路径
+_REFERENCE_RE = re.compile(r"images/[0-9a-f]{32}\.[A-Za-z0-9]+")
+
+
+def hash_file(f) -> str:
+    """分块计算上传文件的 sha256，结束后回到文件开头"""
+    digest = hashlib.sha256()
+    for chunk in f.chunks():
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def blob_path(digest: str, ext: str) -> str:
+    return f"images/{digest[:32]}{ext}"
+
+
+def _reuse(queryset):
+    """命中时引用数 +1；刚被垃圾回收删除的记录视为未命中"""
+    blob = queryset.order_by("id").first()
+    if blob is None:
+        return None
+    now = timezone.now()
+    updated = MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1, last_uploaded_at=now)
+    if not updated:
+        return None
+    blob.ref_count += 1
+    blob.last_uploaded_at = now
+    return blob
+
+
+def find_upload(source_digest: str):
+    """按原始内容的哈希查找已存文件"""
+    return _reuse(MediaBlob.objects.filter(source_digest=source_digest))
+
+
+def store(content, *, digest, source_digest, ext, fmt, compressed) -> MediaBlob:
+    """
+    保存一份内容（ContentFile 或上传文件对象），返回 MediaBlob；
+    同样内容已经存过时只增加引用数。
+    """
+    blob = _reuse(MediaBlob.objects.filter(digest=digest))
+    if blob is not None:
+        return blob
+
+    path = blob_path(digest, ext)
+    try:
+        # 记录和文件在同一事务里写入；垃圾回收也在事务里同时删除两者，不会交错
+        with transaction.atomic():
+            blob = MediaBlob.objects.create(
+                digest=digest, source_digest=source_digest, path=path, format=fmt,
+                compressed=compressed, size=content.size, ref_count=1,
+            )
+            if not default_storage.exists(path):  # 之前写入失败遗留的同内容文件可直接复用
+                default_storage.save(path, content)
+    except IntegrityError:
+        # 并发上传了同样的内容，对方已经写好
+        blob = _reuse(MediaBlob.objects.filter(digest=digest))
+        if blob is None:
+            raise
+    return blob
+
+
+def referenced_paths() -> Counter:
+    """统计上传文件当前被引用的次数：头像、任务图片，以及任务描述中出现的图片地址"""
+    counts = Counter()
+    sources = [
+        CustomUser.objects.filter(avatar__contains="images/").values_list("avatar", flat=True),
+        Task.objects.filter(image__contains="images/").values_list("image", flat=True),
+        Task.objects.filter(description__contains="images/").values_list("description", flat=True),
+    ]
+    for values in sources:
+        for text in values.iterator(chunk_size=2000):
+            counts.update(_REFERENCE_RE.findall(text or ""))
+    return counts
+
+
+def _delete_files(path: str):
+    default_storage.delete(path)
+    for variant_set in ImageVariantSet.objects.filter(source=path):
+        for name in VARIANT_WIDTHS:
+            for fmt in VARIANT_FORMATS:
+                default_storage.delete(variant_path(variant_set.pk, name, fmt))
+        variant_set.delete()
+
+
+def collect_garbage(grace_days=None, *, dry_run=False) -> dict:
+    """
+    重新统计宽限期之前上传的文件的引用数，删除没有任何引用的文件（连同其多尺寸版本）。
+    宽限期内的文件不动：刚上传的图片可能还没来得及被任务或头像引用。
+    """
+    if grace_days is None:
+        grace_days = getattr(settings, "UPLOAD_GC_GRACE_DAYS", 7)
+    cutoff = timezone.now() - timedelta(days=grace_days)
+    references = referenced_paths()
+
+    summary = {"checked": 0, "recounted": 0, "deleted": 0, "freed_bytes": 0, "dry_run": dry_run}
+    candidates = MediaBlob.objects.filter(last_uploaded_at__lt=cutoff).values_list("id", "path", "size", "ref_count")
+    for blob_id, path, size, ref_count in candidates.iterator(chunk_size=2000):
+        summary["checked"] += 1
+        count = references.get(path, 0)
+        if count:
+            if count != ref_count and not dry_run:
+                MediaBlob.objects.filter(pk=blob_id).update(ref_count=count)
+                summary["recounted"] += 1
+            continue
+
+        if not dry_run:
+            with transaction.atomic():
+                # 统计期间被重新上传的文件保留
+                deleted, _ = MediaBlob.objects.filter(pk=blob_id, last_uploaded_at__lt=cutoff).delete()
+                if not deleted:
+                    continue
+                _delete_files(path)
+        summary["deleted"] += 1
+        summary["freed_bytes"] += size
+
+    logger.info("Upload GC summary: %s", summary)
+    return summary
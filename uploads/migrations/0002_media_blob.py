@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('source_digest', models.CharField(db_index=True, max_length=64)),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('format', models.CharField(max_length=10)),
+                ('compressed', models.BooleanField(default=False)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_uploaded_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
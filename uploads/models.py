@@ -1,3 +1,41 @@
 from django.db import models
 
-# Create your models here.
+
+class ImageVariantSet(models.Model):
+    """一张已上传图片（上传接口或 Task.image）的缩略图 / 中图 / 大图，由后台进程生成"""
+    STATUS_CHOICES = [
+        ('pending', '生成中'),
+        ('ready', '已生成'),
+        ('failed', '生成失败'),
+    ]
+
+    source = models.CharField(max_length=255, unique=True)  # 原图在 default_storage 中的路径
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    width = models.PositiveIntegerField(null=True, blank=True)   # 原图（按 EXIF 旋转后）的尺寸
+    height = models.PositiveIntegerField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
+
+
+class MediaBlob(models.Model):
+    """按内容寻址存储的上传文件：相同内容只存一份，重复上传直接复用"""
+    digest = models.CharField(max_length=64, unique=True)  # 存储内容的 sha256
+    # 上传原始内容的 sha256（压缩前）；重复上传同一文件时据此跳过重新编码
+    source_digest = models.CharField(max_length=64, db_index=True)
+    path = models.CharField(max_length=255, unique=True)  # default_storage 中的路径
+    format = models.CharField(max_length=10)
+    compressed = models.BooleanField(default=False)
+    size = models.PositiveBigIntegerField(default=0)
+    # 引用数：每次上传 +1，垃圾回收时按实际引用（头像、任务图片与描述）重新统计
+    ref_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.path} ({self.ref_count})'
@@ -0,0 +1,127 @@
+# uploads/serving.py
+"""
+MEDIA_ROOT 下文件的对外服务（/media/<path>，视图见 views.serve_media）：
+  - 权限检查在 Django 里做：只服务 MEDIA_ROOT 内的普通文件，隐藏文件和海报缓存的锁 / 临时文件一律 404，
+    MEDIA_PROTECTED_PREFIXES 下的文件需要登录（session 或 JWT）；
+  - 文件内容交给前端服务器发送：MEDIA_ACCEL = "nginx" 返回 X-Accel-Redirect，
+    需要一个 internal 的 location 把 MEDIA_ACCEL_PREFIX 映射到 MEDIA_ROOT，例如
+        location /protected-media/ { internal; alias /srv/adventurer/media/; }
+    MEDIA_ACCEL = "apache"（mod_xsendfile）返回 X-Sendfile；
+  - 未配置时由 Django 分块流式返回，支持单段 Range 与 ETag / Last-Modified 条件请求；
+  - 按内容哈希命名的文件（去重后的上传图片、海报缓存）内容永不改变，带 immutable 长缓存。
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from django.utils.http import parse_http_date_safe, quote_etag
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.authentication import ClaimsJWTAuthentication
+
+CONTENT_HASHED_PATHS = (
+    re.compile(r"images/[0-9a-f]{32}\.[A-Za-z0-9]+"),             # media_store.blob_path
+    re.compile(r"qr_cache/[0-9a-f]{2}/[0-9a-f]{64}\.[A-Za-z0-9]+"),  # poster_cache._path_for
+)
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_INTERNAL_SUFFIXES = (".lock", ".tmp")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def resolve_media_path(path: str):
+    """URL 中的相对路径 -> 文件系统路径；越出 MEDIA_ROOT、隐藏文件或内部文件返回 None"""
+    parts = path.split("/")
+    if any(not part or part.startswith(".") for part in parts) or path.endswith(_INTERNAL_SUFFIXES):
+        return None
+    try:
+        return safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        return None
+
+
+def is_protected(path: str) -> bool:
+    return path.startswith(tuple(getattr(settings, "MEDIA_PROTECTED_PREFIXES", ())))
+
+
+def is_authenticated(request) -> bool:
+    if request.user.is_authenticated:
+        return True
+    try:
+        return ClaimsJWTAuthentication().authenticate(request) is not None
+    except AuthenticationFailed:
+        return False
+
+
+def is_content_hashed(path: str) -> bool:
+    return any(pattern.fullmatch(path) for pattern in CONTENT_HASHED_PATHS)
+
+
+def file_etag(path: str, st) -> str:
+    """按内容哈希命名的文件直接用哈希，其它文件用 mtime 与大小"""
+    if is_content_hashed(path):
+        return quote_etag(path.rsplit("/", 1)[-1].split(".", 1)[0])
+    return quote_etag(f"{st.st_mtime_ns:x}-{st.st_size:x}")
+
+
+def cache_control(path: str) -> str:
+    scope = "private" if is_protected(path) else "public"
+    if is_content_hashed(path):
+        return f"{scope}, {IMMUTABLE_CACHE_CONTROL}"
+    return f"{scope}, max-age={getattr(settings, 'MEDIA_MAX_AGE', 3600)}"
+
+
+def range_applies(request, etag: str, last_modified: int) -> bool:
+    """If-Range：只有文件没变时才按 Range 返回部分内容"""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def parse_range(header: str, size: int):
+    """
+    解析 Range 头，返回 (start, end)（end 含在内）。
+    多段或无法识别的写法返回 None，按整个文件返回；起点超出文件大小时抛 RangeNotSatisfiable。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # bytes=-N：最后 N 个字节
+            suffix = int(last)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_range(fh, start: int, length: int, block_size: int = STREAM_BLOCK_SIZE):
+    with fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(block_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,16 @@
+# uploads/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from tasks.models import Task
+
+from .variants import schedule
+
+
+@receiver(post_save, sender=Task, dispatch_uid='uploads_task_image_variants')
+def schedule_task_image_variants(sender, instance, update_fields=None, **kwargs):
+    # 只更新其它字段的保存不涉及图片
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image:
+        schedule(instance.image.name)
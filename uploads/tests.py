@@ -1,3 +1,298 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageFile, JpegImagePlugin
+
+from tasks.models import Task
+from users.models import CustomUser
+from .media_store import collect_garbage
+from .models import ImageVariantSet, MediaBlob
+from .variants import VARIANT_FORMATS, VARIANT_WIDTHS, generate_variants, variant_path
+
+
+def _png(size):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _png_header(width, height):
+    """只有文件头（IHDR）、没有像素数据的 PNG，几十个字节就能声明任意尺寸"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IEND', b'')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        # 在请求内同步生成，便于断言
+        override = override_settings(MEDIA_ROOT=self.media_root, PROCESS_POOL_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _upload(self, content):
+        return self.client.post(
+            '/upload', {'file': SimpleUploadedFile('a.png', content)}, HTTP_HOST='127.0.0.1'
+        )
+
+    def test_upload_returns_placeholder_urls_before_variants_are_ready(self):
+        response = self._upload(_png((1000, 500)))
+        self.assertEqual(response.status_code, 200)
+        variants = response.json()['variants']
+        self.assertEqual(set(variants), set(VARIANT_WIDTHS))
+        variant_set = ImageVariantSet.objects.get()
+        self.assertEqual(variant_set.status, 'pending')
+
+        # 生成前重定向到原图
+        redirect = self.client.get(variants['thumbnail']['webp'], HTTP_HOST='127.0.0.1')
+        self.assertEqual(redirect.status_code, 302)
+        self.assertTrue(redirect['Location'].endswith(variant_set.source))
+
+    def test_variants_are_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload(_png((1000, 500)))
+        variant_set = ImageVariantSet.objects.get()
+        self.assertEqual(variant_set.status, 'ready')
+        self.assertEqual((variant_set.width, variant_set.height), (1000, 500))
+
+        for name, max_width in VARIANT_WIDTHS.items():
+            for fmt in VARIANT_FORMATS:
+                with default_storage.open(variant_path(variant_set.pk, name, fmt)) as fh:
+                    # 不放大：原图比 large 窄时保持原宽
+                    self.assertEqual(Image.open(fh).width, min(max_width, 1000))
+
+        redirect = self.client.get(
+            f'/upload/variants/{variant_set.pk}/medium.jpeg', HTTP_HOST='127.0.0.1'
+        )
+        self.assertTrue(redirect['Location'].endswith(variant_path(variant_set.pk, 'medium', 'jpeg')))
+
+    def test_broken_source_is_marked_failed(self):
+        variant_set = ImageVariantSet.objects.create(source='images/missing.png')
+        with self.assertLogs('uploads.variants', level='ERROR'):
+            self.assertEqual(generate_variants(variant_set.pk), 'failed')
+        variant_set.refresh_from_db()
+        self.assertEqual(variant_set.status, 'failed')
+
+
+@override_settings(PROCESS_POOL_WORKERS=0)
+class MediaDedupTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch('uploads.views.MAX_UPLOAD_SIZE', 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _upload(self, content, name='a.png'):
+        return self.client.post(
+            '/upload', {'file': SimpleUploadedFile(name, content)}, HTTP_HOST='127.0.0.1'
+        ).json()
+
+    def test_repeat_upload_reuses_file_without_reencoding(self):
+        content = _png((2400, 1200))  # 超过 MAX_UPLOAD_SIZE，会被压缩
+        first = self._upload(content)
+        with mock.patch('uploads.views.compress_upload') as compress:
+            second = self._upload(content, name='b.png')
+        compress.assert_not_called()
+        self.assertEqual(first['url'], second['url'])
+        self.assertTrue(second['compressed'])
+
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(len(default_storage.listdir('images')[1]), 1)
+
+    def test_gc_removes_only_old_unreferenced_files(self):
+        kept = MediaBlob.objects.get(path=self._upload(_png((10, 10)))['url'].split('/media/')[1])
+        dropped = MediaBlob.objects.get(path=self._upload(_png((20, 20)))['url'].split('/media/')[1])
+        recent = MediaBlob.objects.get(path=self._upload(_png((30, 30)))['url'].split('/media/')[1])
+        MediaBlob.objects.exclude(pk=recent.pk).update(last_uploaded_at=timezone.now() - timedelta(days=30))
+
+        user = CustomUser.objects.create_user(username='gc', password='pw')
+        Task.objects.create(
+            title='t', description=f'海报见 /media/{kept.path}', task_type='solo',
+            publisher=user, deadline=timezone.now(),
+        )
+
+        summary = collect_garbage(grace_days=7)
+        self.assertEqual(summary['deleted'], 1)
+        self.assertEqual(
+            set(MediaBlob.objects.values_list('pk', flat=True)), {kept.pk, recent.pk}
+        )
+        self.assertFalse(default_storage.exists(dropped.path))
+        self.assertTrue(default_storage.exists(kept.path))
+
+
+@override_settings(PROCESS_POOL_WORKERS=2, UPLOAD_ENCODE_MAX_PENDING=1)
+class EncodeOverloadTests(TestCase):
+    def test_full_encode_queue_returns_503(self):
+        from . import encoding
+        slots = mock.Mock()
+        slots.acquire.return_value = False
+        with mock.patch.object(encoding, '_get_slots', return_value=slots), \
+                mock.patch('uploads.views.MAX_UPLOAD_SIZE', 1024):
+            response = self.client.post(
+                '/upload', {'file': SimpleUploadedFile('a.png', _png((2400, 1200)))}, HTTP_HOST='127.0.0.1'
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+@override_settings(PROCESS_POOL_WORKERS=0)
+class UploadValidationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _upload(self, content, name='a.png'):
+        return self.client.post(
+            '/upload', {'file': SimpleUploadedFile(name, content)}, HTTP_HOST='127.0.0.1'
+        )
+
+    def test_oversized_dimensions_rejected_from_header(self):
+        cases = [
+            (30000, 30000),  # Pillow 自己的解压炸弹上限
+            (20000, 10),     # 单边超过 MAX_UPLOAD_DIMENSION
+            (8000, 7000),    # 总像素超过 MAX_UPLOAD_PIXELS
+        ]
+        for size in cases:
+            with self.subTest(size=size), \
+                    mock.patch.object(ImageFile.ImageFile, 'load') as load, \
+                    mock.patch('uploads.views.compress_upload') as compress:
+                response = self._upload(_png_header(*size))
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.content, b'Image dimensions too large')
+            # 只读了文件头，没有解码像素
+            load.assert_not_called()
+            compress.assert_not_called()
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_truncated_images_are_rejected(self):
+        buf = io.BytesIO()
+        Image.frombytes('RGB', (400, 400), os.urandom(400 * 400 * 3)).save(buf, format='PNG')
+        png = buf.getvalue()[:-20000]
+        buf = io.BytesIO()
+        Image.frombytes('RGB', (400, 400), os.urandom(400 * 400 * 3)).save(buf, format='JPEG')
+        jpeg = buf.getvalue()[:-20000]
+
+        # 不压缩的路径由 verify() 检查结构
+        self.assertEqual(self._upload(png).status_code, 400)
+        # 压缩路径在解码时失败
+        with mock.patch('uploads.views.MAX_UPLOAD_SIZE', 1024):
+            self.assertEqual(self._upload(png, name='b.png').status_code, 400)
+            self.assertEqual(self._upload(jpeg, name='c.jpg').status_code, 400)
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(default_storage.exists('images'))
+
+    def test_jpeg_draft_decode_honours_exif_orientation(self):
+        # 存储为 4000x2000 横图，上半红、下半蓝；EXIF 方向 6 表示显示时顺时针转 90°
+        stored = Image.new('RGB', (4000, 2000), (0, 0, 255))
+        stored.paste((255, 0, 0), (0, 0, 4000, 1000))
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        buf = io.BytesIO()
+        stored.save(buf, format='JPEG', exif=exif)
+
+        draft = JpegImagePlugin.JpegImageFile.draft
+        with mock.patch('uploads.views.MAX_UPLOAD_SIZE', 1024), \
+                mock.patch('uploads.views.COMPRESS_MAX_WIDTH', 500), \
+                mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True, side_effect=draft) as spy:
+            response = self._upload(buf.getvalue(), name='photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['compressed'])
+        # 按存储方向请求缩小解码：显示宽 500 对应存储尺寸 1000x500
+        spy.assert_called_once_with(mock.ANY, None, (1000, 500))
+
+        path = response.json()['url'].split('/media/')[1]
+        with default_storage.open(path) as fh:
+            result = Image.open(fh)
+            result.load()
+        self.assertEqual(result.size, (500, 1000))
+        self.assertNotIn(ExifTags.Base.Orientation, result.getexif())
+        # 转正后原来的上半（红）在右侧
+        right, left = result.getpixel((450, 500)), result.getpixel((50, 500))
+        self.assertGreater(right[0], 200)
+        self.assertLess(right[2], 60)
+        self.assertGreater(left[2], 200)
+        self.assertLess(left[0], 60)
+
+
+class ServeMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.content = bytes(range(256)) * 40
+        self.hashed = 'images/' + 'ab' * 16 + '.jpg'
+        default_storage.save(self.hashed, io.BytesIO(self.content))
+        default_storage.save('task_images/a.png', io.BytesIO(self.content))
+
+    def _get(self, path, **headers):
+        return self.client.get(f'/media/{path}', HTTP_HOST='127.0.0.1', **headers)
+
+    def test_full_file_with_cache_headers(self):
+        response = self._get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['ETag'], '"' + 'ab' * 16 + '"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+        other = self._get('task_images/a.png')
+        self.assertNotIn('immutable', other['Cache-Control'])
+        self.assertEqual(self._get('task_images/a.png', HTTP_IF_NONE_MATCH=other['ETag']).status_code, 304)
+
+    def test_range_requests(self):
+        response = self._get(self.hashed, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        suffix = self._get(self.hashed, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-10:])
+
+        self.assertEqual(self._get(self.hashed, HTTP_RANGE=f'bytes={len(self.content)}-').status_code, 416)
+        # If-Range 与当前版本不符时返回整个文件
+        stale = self._get(self.hashed, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_internal_and_outside_paths_are_hidden(self):
+        default_storage.save('qr_cache/ab/x.lock', io.BytesIO(b''))
+        for path in ('qr_cache/ab/x.lock', '../secret', 'images/.hidden', 'images'):
+            self.assertEqual(self._get(path).status_code, 404, path)
+
+    @override_settings(MEDIA_PROTECTED_PREFIXES=('task_images/',))
+    def test_protected_prefix_requires_login(self):
+        self.assertEqual(self._get('task_images/a.png').status_code, 403)
+        user = CustomUser.objects.create_user(username='m', password='pw')
+        self.client.force_login(user)
+        response = self._get('task_images/a.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+    @override_settings(MEDIA_ACCEL='nginx')
+    def test_nginx_accel_redirect(self):
+        response = self._get(self.hashed)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.hashed)
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,150 @@
+# uploads/variants.py
+"""
+上传图片的多尺寸版本（thumbnail / medium / large，各出 WebP 与 JPEG 两份）：
+  - 上传接口或 Task.image 保存后登记一条 ImageVariantSet（pending），事务提交后交给后台进程池生成；
+  - 使用各功能共用的进程池（backend/pools.py），子进程自己建数据库连接，生成完把状态改为 ready / failed；
+  - 生成完成前各版本的地址指向一个重定向接口（先跳到原图占位，完成后跳到对应版本），客户端拿到的地址总是可用；
+  - 进程池只在内存里，进程重启时没做完的任务用 generate_image_variants 命令补做。
+"""
+import io
+import logging
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from backend import pools
+from .imaging import decode_bounded, display_size, flatten_to_rgb, has_alpha
+from .models import ImageVariantSet
+
+logger = logging.getLogger(__name__)
+
+# 各版本的最大宽度；原图更窄时不放大
+VARIANT_WIDTHS = {"thumbnail": 320, "medium": 800, "large": 1600}
+# 格式 -> (扩展名, Pillow 格式名, 编码参数)
+VARIANT_FORMATS = {
+    "webp": ("webp", "WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "JPEG", {"quality": 80, "optimize": True, "progressive": True}),
+}
+
+
+def variant_path(set_id: int, name: str, fmt: str) -> str:
+    return f"variants/{set_id}/{name}.{VARIANT_FORMATS[fmt][0]}"
+
+
+def _fit_width(img: Image.Image, max_width: int) -> Image.Image:
+    if img.width <= max_width:
+        return img
+    height = max(1, round(img.height * max_width / img.width))
+    return img.resize((max_width, height), Image.LANCZOS)
+
+
+def _save_variant(img: Image.Image, path: str, fmt: str):
+    _, pil_format, options = VARIANT_FORMATS[fmt]
+    if pil_format == "JPEG":
+        img = flatten_to_rgb(img)
+    else:
+        img = img.convert("RGBA") if has_alpha(img) else img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format=pil_format, **options)
+    # 重新生成时覆盖旧文件，否则 storage 会另起一个带后缀的文件名
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(buf.getvalue()))
+
+
+def generate_variants(set_id: int) -> str:
+    """生成一组图片的全部版本（进程池中执行），返回最终状态"""
+    variant_set = ImageVariantSet.objects.filter(pk=set_id).first()
+    if variant_set is None:
+        return "missing"
+    try:
+        with default_storage.open(variant_set.source, "rb") as fh:
+            img = Image.open(fh)
+            width, height = display_size(img)
+            # 只解码到最大版本所需的尺寸，之后逐级缩小
+            img = decode_bounded(img, max(VARIANT_WIDTHS.values()))
+        for name, max_width in sorted(VARIANT_WIDTHS.items(), key=lambda item: -item[1]):
+            img = _fit_width(img, max_width)
+            for fmt in VARIANT_FORMATS:
+                _save_variant(img, variant_path(set_id, name, fmt), fmt)
+    except Exception as exc:
+        logger.exception("图片版本生成失败 set_id=%s source=%s", set_id, variant_set.source)
+        ImageVariantSet.objects.filter(pk=set_id).update(
+            status="failed", error=str(exc)[:255], updated_at=timezone.now(),
+        )
+        return "failed"
+
+    ImageVariantSet.objects.filter(pk=set_id).update(
+        status="ready", width=width, height=height, error="", updated_at=timezone.now(),
+    )
+    return "ready"
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        logger.error("图片版本生成任务异常: %s", exc)
+
+
+def submit(set_id: int):
+    """交给后台进程池生成；PROCESS_POOL_WORKERS = 0 时在当前进程同步生成"""
+    if pools.max_workers() <= 0:
+        generate_variants(set_id)
+        return
+    try:
+        pools.submit(generate_variants, set_id).add_done_callback(_log_failure)
+    except (BrokenProcessPool, RuntimeError):
+        logger.error("图片版本生成任务提交失败 set_id=%s，可稍后用 generate_image_variants 补做", set_id)
+
+
+def schedule(source: str) -> ImageVariantSet:
+    """登记一张图片并在事务提交后开始生成（已登记过的不重复生成）"""
+    variant_set, created = ImageVariantSet.objects.get_or_create(source=source)
+    if created:
+        transaction.on_commit(lambda: submit(variant_set.pk))
+    return variant_set
+
+
+def regenerate(set_ids, workers=None):
+    """同步生成多组图片（管理命令用），返回 {状态: 数量}；workers 为 None 时使用共用进程池"""
+    summary = {}
+    for status in pools.map_all(generate_variants, set_ids, workers=workers):
+        summary[status] = summary.get(status, 0) + 1
+    return summary
+
+
+def variant_sets_for(sources) -> dict:
+    """一次查询取出多张图片的登记记录：{source: ImageVariantSet}"""
+    sources = {s for s in sources if s}
+    if not sources:
+        return {}
+    return {vs.source: vs for vs in ImageVariantSet.objects.filter(source__in=sources)}
+
+
+def variant_urls(source: str, variant_set=None, request=None) -> dict:
+    """
+    各版本的地址：{"thumbnail": {"webp": url, "jpeg": url}, ...}
+    生成完成时直接指向文件；生成中指向重定向接口；没有登记或生成失败时都指向原图。
+    """
+    if variant_set is not None and variant_set.status == "ready":
+        def url_for(name, fmt):
+            return default_storage.url(variant_path(variant_set.pk, name, fmt))
+    elif variant_set is not None and variant_set.status == "pending":
+        def url_for(name, fmt):
+            return reverse("api-upload-variant", args=[variant_set.pk, name, fmt])
+    else:
+        original = default_storage.url(source)
+
+        def url_for(name, fmt):
+            return original
+
+    build = request.build_absolute_uri if request is not None else (lambda url: url)
+    return {
+        name: {fmt: build(url_for(name, fmt)) for fmt in VARIANT_FORMATS}
+        for name in VARIANT_WIDTHS
+    }
@@ -1,36 +1,35 @@
 # uploads/views.py
-import uuid, io
+import hashlib, mimetypes, os, stat
+from urllib.parse import quote
 from django.conf import settings
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect,
+    JsonResponse, HttpResponseBadRequest, StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from PIL import Image, ImageOps
+from PIL import Image
+
+from .encoding import EncodeOverloaded, compress_upload
+from .imaging import has_alpha
+from .media_store import find_upload, hash_file, store
+from .models import ImageVariantSet
+from . import serving
+from .variants import VARIANT_FORMATS, VARIANT_WIDTHS, schedule, variant_path, variant_urls
 
 # 默认 2MB（你的注释写了5MB，可一并修正）
 MAX_UPLOAD_SIZE = getattr(settings, "MAX_UPLOAD_SIZE", 2 * 1024 * 1024)
+# Checked from the image header before any pixel is decoded (decompression bombs)
+MAX_UPLOAD_PIXELS = getattr(settings, "MAX_UPLOAD_PIXELS", 50_000_000)
+MAX_UPLOAD_DIMENSION = getattr(settings, "MAX_UPLOAD_DIMENSION", 16384)
+# Compressed uploads are downscaled to this width
+COMPRESS_MAX_WIDTH = 1920
 
-def _has_alpha(img: Image.Image) -> bool:
-    if img.mode in ("RGBA", "LA"):
-        return True
-    if img.mode == "P" and "transparency" in img.info:
-        return True
-    return False
-
-def _flatten_to_rgb(img: Image.Image, bg=(255, 255, 255)) -> Image.Image:
-    """Flatten RGBA/LA/P(with transparency) to RGB using a solid background."""
-    if img.mode in ("RGBA", "LA"):
-        alpha = img.split()[-1]
-        base = Image.new("RGB", img.size, bg)
-        base.paste(img.convert("RGB"), mask=alpha)
-        return base
-    if img.mode == "P" and "transparency" in img.info:
-        return img.convert("RGBA").convert("RGB")
-    if img.mode == "P":
-        return img.convert("RGB")
-    if img.mode != "RGB":
-        return img.convert("RGB")
-    return img
 
 @csrf_exempt
 def upload_image(request):
@@ -43,12 +42,24 @@ def upload_image(request):
 
     need_compress = f.size > MAX_UPLOAD_SIZE
 
+    # The same bytes were uploaded before: reuse the stored file without decoding or re-encoding
+    source_digest = hash_file(f)
+    blob = find_upload(source_digest)
+    if blob is not None:
+        return _upload_response(request, blob)
+
+    # Image.open only parses the header; nothing is decoded yet
     try:
         img = Image.open(f)
-        img = ImageOps.exif_transpose(img)  # respect camera rotation
+    except Image.DecompressionBombError:
+        return HttpResponseBadRequest('Image dimensions too large')
     except Exception:
         return HttpResponseBadRequest('Invalid image')
 
+    width, height = img.size
+    if width * height > MAX_UPLOAD_PIXELS or max(width, height) > MAX_UPLOAD_DIMENSION:
+        return HttpResponseBadRequest('Image dimensions too large')
+
     # Original format/extension (fallback to PNG)
     src_format = (img.format or 'PNG').upper()
 
@@ -57,7 +68,7 @@ def upload_image(request):
     # - PNG/APNG with transparency -> prefer WEBP to keep alpha smaller than PNG
     # - otherwise use JPEG
     if need_compress:
-        if _has_alpha(img):
+        if has_alpha(img):
             target_format = "WEBP"
             ext = ".webp"
         else:
@@ -68,46 +79,129 @@ def upload_image(request):
         target_format = src_format
         ext = '.' + src_format.lower()
 
-    # Optional downscale
-    if need_compress:
-        max_width = 1920
-        if img.width > max_width:
-            ratio = max_width / float(img.width)
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.LANCZOS)
-
     # Prepare bytes
     if need_compress:
-        buffer = io.BytesIO()
-        if target_format == "JPEG":
-            # Ensure no alpha before saving as JPEG (this was the crash)
-            img_to_save = _flatten_to_rgb(img)
-            img_to_save.save(buffer, format="JPEG", optimize=True, quality=80, progressive=True)
-        elif target_format == "WEBP":
-            # Keep transparency; quality can be tuned; lossless=True for line art/icons
-            # Choose lossless for small icon-like images; heuristic: if very small or few colors.
-            lossless = False
-            img_to_save = img.convert("RGBA") if _has_alpha(img) else img.convert("RGB")
-            img_to_save.save(buffer, format="WEBP", quality=80, method=6, lossless=lossless)
-        else:
-            # Fallback (rare)
-            img.save(buffer, format=target_format, optimize=True)
-        buffer.seek(0)
-        content = ContentFile(buffer.read())
-        filename = f"{uuid.uuid4().hex}{ext}"
+        # Decode/resize/encode runs in the encode process pool, off the request thread
+        try:
+            data = compress_upload(f, COMPRESS_MAX_WIDTH, target_format)
+        except EncodeOverloaded:
+            response = HttpResponse('Server busy, please retry later', status=503)
+            response['Retry-After'] = '5'
+            return response
+        except Exception:
+            return HttpResponseBadRequest('Invalid image')
+        content = ContentFile(data)
+        digest = hashlib.sha256(data).hexdigest()
     else:
-        # No compression: save original stream and keep original extension
+        # No compression: the original bytes are stored as-is, so skip decoding
+        # and only check the file structure; storage copies the upload in chunks
+        # (or moves the temporary file) instead of reading it into memory
+        try:
+            img.verify()
+        except Exception:
+            return HttpResponseBadRequest('Invalid image')
         f.seek(0)
-        content = ContentFile(f.read())
-        filename = f"{uuid.uuid4().hex}{ext}"
+        content = f
+        digest = source_digest
 
-    path = f"images/{filename}"
-    saved_path = default_storage.save(path, content)
-    file_url = settings.MEDIA_URL + saved_path
+    # Stored under a content-addressed name; identical output from another upload is shared
+    blob = store(
+        content, digest=digest, source_digest=source_digest,
+        ext=ext, fmt=target_format, compressed=need_compress,
+    )
+    return _upload_response(request, blob)
+
+
+def _upload_response(request, blob):
+    file_url = settings.MEDIA_URL + blob.path
     absolute_url = request.build_absolute_uri(file_url)
 
+    # Variants are generated in the background; until then their URLs redirect to the original
+    variant_set = schedule(blob.path)
+
     return JsonResponse({
         "url": absolute_url,
-        "compressed": need_compress,
-        "format": target_format
+        "compressed": blob.compressed,
+        "format": blob.format,
+        "variants": variant_urls(blob.path, variant_set, request),
     })
+
+
+@require_GET
+def image_variant(request, set_id, name, fmt):
+    """Stable variant URL: the original image while pending or failed, the variant file once ready."""
+    if name not in VARIANT_WIDTHS or fmt not in VARIANT_FORMATS:
+        raise Http404
+    variant_set = get_object_or_404(ImageVariantSet, pk=set_id)
+    if variant_set.status == "ready":
+        response = HttpResponseRedirect(default_storage.url(variant_path(variant_set.pk, name, fmt)))
+        response["Cache-Control"] = "public, max-age=86400"
+    else:
+        response = HttpResponseRedirect(default_storage.url(variant_set.source))
+        response["Cache-Control"] = "no-cache"
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_media(request, path):
+    """Files under MEDIA_ROOT: permission checks here, bytes sent by nginx/Apache when configured (see serving.py)."""
+    full_path = serving.resolve_media_path(path)
+    if full_path is None:
+        raise Http404
+    if serving.is_protected(path) and not serving.is_authenticated(request):
+        return HttpResponseForbidden()
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    accel = getattr(settings, "MEDIA_ACCEL", None)
+    if accel:
+        # The front-end server handles Range and conditional requests itself
+        response = HttpResponse(content_type=content_type)
+        if accel == "nginx":
+            response["X-Accel-Redirect"] = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/") + quote(path)
+        else:
+            response["X-Sendfile"] = full_path
+        response["Cache-Control"] = serving.cache_control(path)
+        return response
+
+    etag = serving.file_etag(path, st)
+    last_modified = int(st.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _stream_media(request, full_path, st.st_size, content_type, etag, last_modified)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = serving.cache_control(path)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _stream_media(request, full_path, size, content_type, etag, last_modified):
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header and serving.range_applies(request, etag, last_modified):
+        try:
+            byte_range = serving.parse_range(range_header, size)
+        except serving.RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+        response.block_size = serving.STREAM_BLOCK_SIZE
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        serving.iter_range(open(full_path, "rb"), start, length), status=206, content_type=content_type,
+    )
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(length)
+    return response
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _ensure_search_triggers(sender, using, **kwargs):
+    from .search import ensure_search_triggers
+    ensure_search_triggers(using)
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # 重建用户表的迁移会删掉 FTS 同步触发器，每次 migrate 后补建（见 users/search.py）
+        post_migrate.connect(_ensure_search_triggers, sender=self, dispatch_uid='users_ensure_search_triggers')
@@ -0,0 +1,103 @@
+# users/authentication.py
+"""
+无状态 JWT 认证：access token 里带上 role / level / token_version，
+认证时直接用声明构造用户，不再每个请求 SELECT 一次 users_customuser。
+
+  - 视图只用到 id / role / level 时完全不查库；访问其它字段时一次性补齐（CustomUser.from_claims）。
+  - 角色、等级、启用状态或密码变化时 token_version 递增并写入缓存，携带旧版本的 access token 被拒绝，
+    前端用 refresh token 换一个带新声明的 access token 即可；
+  - 缓存里没有版本号时读一次库再缓存（current_token_version），不会因为缓存缺失放行旧 token 或停用的账号。
+  - 没有这些声明的旧 token 仍按 simplejwt 原逻辑查库认证。
+"""
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import INACTIVE_TOKEN_VERSION, CustomUser, current_token_version
+
+ROLE_CLAIM = 'role'
+LEVEL_CLAIM = 'level'
+VERSION_CLAIM = 'ver'
+# 只放在 refresh token 里：改密码后旧 refresh token 不能再换新 access token
+PASSWORD_CLAIM = 'pwd'
+
+
+def user_claims(user):
+    return {
+        ROLE_CLAIM: user.role,
+        LEVEL_CLAIM: user.level,
+        VERSION_CLAIM: user.token_version,
+    }
+
+
+class ClaimsRefreshToken(RefreshToken):
+    no_copy_claims = RefreshToken.no_copy_claims + (PASSWORD_CLAIM,)
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[PASSWORD_CLAIM] = get_md5_hash_password(user.password)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        version = validated_token[VERSION_CLAIM]
+        current = current_token_version(user_id)
+        if current == INACTIVE_TOKEN_VERSION:
+            raise AuthenticationFailed('用户不存在或已停用', code='user_inactive')
+        if current != version:
+            raise AuthenticationFailed('登录信息已变更，请刷新令牌', code='token_outdated')
+
+        return CustomUser.from_claims(
+            user_id, validated_token[ROLE_CLAIM], validated_token[LEVEL_CLAIM], version
+        )
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    刷新时查一次库：校验用户仍启用、密码未改，并按最新的 role / level / token_version 签发 access token。
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = CustomUser.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        password_hash = refresh.payload.get(PASSWORD_CLAIM)
+        if password_hash is not None and password_hash != get_md5_hash_password(user.password):
+            raise AuthenticationFailed('密码已修改，请重新登录', code='password_changed')
+
+        access = refresh.access_token
+        for claim, value in user_claims(user).items():
+            access[claim] = value
+        data = {'access': str(access)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    pass
+            for claim, value in user_claims(user).items():
+                refresh[claim] = value
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+
+        return data
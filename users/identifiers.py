@@ -0,0 +1,54 @@
+# users/identifiers.py
+"""
+用户 identifier（6 位数字，首位非 0，共 900000 个）的无碰撞编号。
+
+自增序号 0, 1, 2, ... 经过一个带密钥的 Feistel 置换（20 位，循环行走缩到 900000 以内）
+映射成看起来随机的 identifier。置换是双射，序号不重复则 identifier 一定不重复，
+分配时不再需要“随机一个 → exists() → 重试”。
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+
+IDENTIFIER_MIN = 100000
+IDENTIFIER_SPACE = 900000  # 100000 ~ 999999
+
+_HALF_BITS = 10            # 左右各 10 位，置换域 2^20 = 1048576 ≥ 900000
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+@lru_cache(maxsize=1)
+def _round_keys():
+    # 密钥独立于 SECRET_KEY：更换 SECRET_KEY 不应改变已在使用的编号顺序
+    salt = getattr(settings, "USER_IDENTIFIER_SALT", "adventurer-user-identifier")
+    digest = hashlib.sha256(salt.encode()).digest()
+    return tuple(int.from_bytes(digest[i * 4:(i + 1) * 4], "big") for i in range(_ROUNDS))
+
+
+def _round(value: int, key: int) -> int:
+    # 只需把数字充分打散，不要求密码学强度
+    x = (value * 0x9E3779B1 + key) & 0xFFFFFFFF
+    x ^= x >> 15
+    x = (x * 0x85EBCA6B) & 0xFFFFFFFF
+    x ^= x >> 13
+    return x & _HALF_MASK
+
+
+def _feistel(n: int) -> int:
+    left, right = n >> _HALF_BITS, n & _HALF_MASK
+    for key in _round_keys():
+        left, right = right, left ^ _round(right, key)
+    return (left << _HALF_BITS) | right
+
+
+def identifier_for_sequence(seq: int) -> str:
+    """把第 seq 个序号（0 ≤ seq < 900000）映射成 identifier"""
+    if not 0 <= seq < IDENTIFIER_SPACE:
+        raise ValueError("identifier 序号超出范围")
+    value = _feistel(seq)
+    # 循环行走：落在 900000 之外就继续置换，直到回到域内（仍是双射）
+    while value >= IDENTIFIER_SPACE:
+        value = _feistel(value)
+    return str(IDENTIFIER_MIN + value)
@@ -0,0 +1,66 @@
+# users/leaderboards.py
+"""
+排行榜快照：按指标（经验 / 代币 / 志愿时长）与范围（全站 / 学生 / 老师）
+用窗口函数一次性算出名次写入 LeaderboardEntry，接口只读快照。
+快照只由 refresh_leaderboards 命令（cron）重建，请求内从不重建整张榜单。
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from .models import CustomUser, LeaderboardEntry, LeaderboardSnapshot
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_METRICS = ('experience', 'tokens', 'volunteerTime')
+LEADERBOARD_SCOPES = ('all', 'student', 'teacher')
+
+
+def refresh_leaderboard(metric: str, scope: str, *, batch_size: int = 2000) -> int:
+    """重建单个榜单，返回上榜人数；每个榜单一个事务，写锁只持有这一小段时间"""
+    qs = CustomUser.objects.filter(is_active=True)
+    if scope != 'all':
+        qs = qs.filter(role=scope)
+
+    ranked = qs.annotate(
+        rank=Window(expression=Rank(), order_by=[F(metric).desc()])
+    ).values_list('id', 'rank', metric, 'identifier', 'nickname', 'avatar', 'level')
+
+    entries = [
+        LeaderboardEntry(
+            metric=metric, scope=scope, rank=rank, user_id=uid, value=value,
+            identifier=identifier, nickname=nickname, avatar=avatar, level=level,
+        )
+        for uid, rank, value, identifier, nickname, avatar, level in ranked.iterator(chunk_size=batch_size)
+    ]
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(metric=metric, scope=scope).delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=batch_size)
+        LeaderboardSnapshot.objects.update_or_create(
+            metric=metric, scope=scope,
+            defaults={'total': len(entries), 'refreshed_at': timezone.now()},
+        )
+    logger.info("Leaderboard %s/%s refreshed: %s entries", metric, scope, len(entries))
+    return len(entries)
+
+
+def get_snapshot(metric: str, scope: str) -> LeaderboardSnapshot:
+    """
+    读取榜单概况；还没有快照（refresh_leaderboards 从未运行）时返回一个空的、未保存的快照。
+    快照超过 LEADERBOARD_MAX_AGE 秒仍未刷新时照常返回旧快照，只记一条警告（每个榜单每个周期一次），
+    提醒检查 cron。
+    """
+    snapshot = LeaderboardSnapshot.objects.filter(metric=metric, scope=scope).first()
+    max_age = getattr(settings, 'LEADERBOARD_MAX_AGE', 3600)
+    if snapshot is None or (timezone.now() - snapshot.refreshed_at).total_seconds() > max_age:
+        if cache.add(f'leaderboard_stale_warned:{metric}:{scope}', True, max_age):
+            logger.warning(
+                "Leaderboard %s/%s snapshot is missing or older than %ss; is refresh_leaderboards scheduled?",
+                metric, scope, max_age,
+            )
+    return snapshot or LeaderboardSnapshot(metric=metric, scope=scope, total=0, refreshed_at=None)
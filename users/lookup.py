@@ -0,0 +1,71 @@
+# users/lookup.py
+"""
+按 identifier / username 批量查询用户名片（邀请组队等场景），
+先查缓存，未命中的部分合并成一条 IN 查询。
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import CustomUser
+
+USER_CARD_FIELDS = ('identifier', 'username', 'nickname', 'avatar', 'level')
+
+
+def _identifier_key(identifier):
+    return f'user_card:id:{identifier}'
+
+
+def _username_key(username):
+    return f'user_card:name:{username}'
+
+
+def _dedupe(values):
+    """去空、去重并保持原顺序"""
+    return list(dict.fromkeys(str(v).strip() for v in values if v is not None and str(v).strip()))
+
+
+def get_user_cards(identifiers=(), usernames=()):
+    """
+    返回 (cards, not_found)：
+      cards     —— 按请求顺序排列的用户名片列表（同一用户只出现一次）
+      not_found —— 未找到的 identifier / username 原值
+    找不到的值不缓存，刚注册的用户可以立即被查到。
+    """
+    identifiers = _dedupe(identifiers)
+    usernames = _dedupe(usernames)
+    timeout = getattr(settings, 'USER_CARD_CACHE_TIMEOUT', 60)
+
+    keys = [_identifier_key(i) for i in identifiers] + [_username_key(u) for u in usernames]
+    cached = cache.get_many(keys) if keys else {}
+
+    missing_ids = [i for i in identifiers if _identifier_key(i) not in cached]
+    missing_names = [u for u in usernames if _username_key(u) not in cached]
+
+    if missing_ids or missing_names:
+        qs = CustomUser.objects.none()
+        if missing_ids:
+            qs = qs | CustomUser.objects.filter(identifier__in=missing_ids)
+        if missing_names:
+            qs = qs | CustomUser.objects.filter(username__in=missing_names)
+
+        fresh = {}
+        for row in qs.values(*USER_CARD_FIELDS):
+            fresh[_identifier_key(row['identifier'])] = row
+            fresh[_username_key(row['username'])] = row
+        cache.set_many(fresh, timeout)
+        cached.update(fresh)
+
+    cards, seen, not_found = [], set(), []
+    for value, key in [(i, _identifier_key(i)) for i in identifiers] + [(u, _username_key(u)) for u in usernames]:
+        card = cached.get(key)
+        if card is None:
+            not_found.append(value)
+        elif card['identifier'] not in seen:
+            seen.add(card['identifier'])
+            cards.append(card)
+    return cards, not_found
+
+
+def invalidate_user_card(user):
+    """用户资料变更后清掉名片缓存"""
+    cache.delete_many([_identifier_key(user.identifier), _username_key(user.username)])
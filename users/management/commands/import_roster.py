@@ -0,0 +1,49 @@
+# users/management/commands/import_roster.py
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.pools import available_cpus
+from users.roster import import_roster, parse_roster
+
+
+class Command(BaseCommand):
+    help = "从 CSV / JSON 批量导入学生名单（列：username,password,nickname,realname,email,role）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="名单文件路径")
+        parser.add_argument("--format", choices=["csv", "json"], help="默认按扩展名判断")
+        parser.add_argument("--workers", type=int, default=None, help="哈希密码的进程数，默认等于可用 CPU 核数")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="只校验，不写入")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"文件不存在：{path}")
+        fmt = options["format"] or ("json" if path.suffix.lower() == ".json" else "csv")
+
+        try:
+            records = parse_roster(path.read_bytes(), fmt)
+        except ValueError as exc:
+            raise CommandError(f"名单解析失败：{exc}")
+
+        summary = import_roster(
+            records,
+            workers=options["workers"] or available_cpus(),
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        for error in summary["errors"]:
+            self.stderr.write(f"第 {error['row']} 行（{error['username'] or '-'}）：{error['error']}")
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"[dry-run] 共 {summary['total']} 行：将新建 {summary['would_create']}，"
+                f"已存在 {summary['skipped']}，错误 {len(summary['errors'])}"
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"共 {summary['total']} 行：新建 {summary['created']}，"
+            f"已存在跳过 {summary['skipped']}，错误 {len(summary['errors'])}"
+        ))
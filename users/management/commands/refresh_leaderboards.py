@@ -0,0 +1,23 @@
+# users/management/commands/refresh_leaderboards.py
+from django.core.management.base import BaseCommand
+
+from users.leaderboards import LEADERBOARD_METRICS, LEADERBOARD_SCOPES, refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = "重建排行榜快照（建议 cron 每 5~10 分钟运行一次）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metric", choices=LEADERBOARD_METRICS, help="只刷新某个指标")
+        parser.add_argument("--scope", choices=LEADERBOARD_SCOPES, help="只刷新某个范围")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        metrics = [options["metric"]] if options["metric"] else LEADERBOARD_METRICS
+        scopes = [options["scope"]] if options["scope"] else LEADERBOARD_SCOPES
+
+        for metric in metrics:
+            for scope in scopes:
+                total = refresh_leaderboard(metric, scope, batch_size=options["batch_size"])
+                self.stdout.write(f"{metric}/{scope}: {total} 人")
+        self.stdout.write(self.style.SUCCESS("排行榜快照已刷新"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_customuser_realname'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='email_delivery',
+            field=models.CharField(choices=[('immediate', '即时发送'), ('hourly', '每小时汇总'), ('daily', '每日汇总')], default='immediate', max_length=10),
+        ),
+    ]
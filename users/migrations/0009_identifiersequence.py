@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+def create_user_sequence(apps, schema_editor):
+    IdentifierSequence = apps.get_model('users', 'IdentifierSequence')
+    IdentifierSequence.objects.get_or_create(name='user')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_customuser_email_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_user_sequence, migrations.RunPython.noop),
+    ]
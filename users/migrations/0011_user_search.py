@@ -0,0 +1,89 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:22
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+# 昵称 / 实名的 trigram 全文索引，由触发器与 users_customuser 保持同步
+# （包括 bulk_create、update() 等绕过 save() 的写入）。
+# 实名默认值 'none' 不入索引，否则搜 "non" 会命中所有人。
+CREATE_SEARCH_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_customuser_search
+    USING fts5(nickname, realname, tokenize='trigram')
+    """,
+    # 每个 trigram 出现在多少个用户中，模糊搜索据此跳过过于常见的 trigram
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_customuser_search_vocab
+    USING fts5vocab(users_customuser_search, 'row')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_customuser_search_ai
+    AFTER INSERT ON users_customuser BEGIN
+        INSERT INTO users_customuser_search(rowid, nickname, realname)
+        VALUES (new.id, new.nickname, NULLIF(new.realname, 'none'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_customuser_search_ad
+    AFTER DELETE ON users_customuser BEGIN
+        DELETE FROM users_customuser_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_customuser_search_au
+    AFTER UPDATE OF nickname, realname ON users_customuser
+    WHEN old.nickname IS NOT new.nickname OR old.realname IS NOT new.realname BEGIN
+        DELETE FROM users_customuser_search WHERE rowid = old.id;
+        INSERT INTO users_customuser_search(rowid, nickname, realname)
+        VALUES (new.id, new.nickname, NULLIF(new.realname, 'none'));
+    END
+    """,
+    """
+    INSERT INTO users_customuser_search(rowid, nickname, realname)
+    SELECT id, nickname, NULLIF(realname, 'none') FROM users_customuser
+    """,
+]
+
+DROP_SEARCH_SQL = [
+    "DROP TRIGGER IF EXISTS users_customuser_search_ai",
+    "DROP TRIGGER IF EXISTS users_customuser_search_ad",
+    "DROP TRIGGER IF EXISTS users_customuser_search_au",
+    "DROP TABLE IF EXISTS users_customuser_search_vocab",
+    "DROP TABLE IF EXISTS users_customuser_search",
+]
+
+
+def _execute(schema_editor, statements):
+    # FTS5 只在 SQLite 上建；其它数据库由 users.search 退回 icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, CREATE_SEARCH_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor, DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0010_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('nickname', 'NOCASE'), name='user_nickname_nocase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('realname', 'NOCASE'), name='user_realname_nocase_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
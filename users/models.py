@@ -1,14 +1,99 @@
-import random
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.cache import cache
+from django.db import models, router, transaction
+from django.db.models.functions import Collate
 from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 from notifications.utils import create_notification
+from .identifiers import IDENTIFIER_SPACE, identifier_for_sequence
+
+
+class IdentifierSequence(models.Model):
+    """identifier 分配序号（单行计数器），见 users/identifiers.py"""
+    name = models.CharField(max_length=20, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+# 每轮最多检查的序号数（IN 查询的参数个数）
+_MAX_WINDOW = 5000
+
+
+def allocate_identifiers(count):
+    """
+    一次分配 count 个唯一 identifier。每一轮：
+      1. 读出当前序号，按估计的空闲比例取一段候选序号，一条 IN 查询排除旧版随机生成的 identifier；
+      2. 从头挑够空闲的，用带条件的 UPDATE（序号仍是读到的值才推进）把序号推进到最后一个被挑中的位置之后。
+    跳过的序号都对应已被占用的 identifier，不浪费编号；旧 identifier 再多，一轮也只有 3 条语句。
+    并发注册时条件 UPDATE 失败的一方重读序号再来一轮。
+    """
+    sequence = IdentifierSequence.objects.filter(name='user')
+    allocated = []
+    free_ratio = 1.0
+    while len(allocated) < count:
+        need = count - len(allocated)
+        start = sequence.values_list('next_value', flat=True).first()
+        if start is None:
+            start = IdentifierSequence.objects.get_or_create(name='user')[0].next_value
+        window = min(int(need / free_ratio * 1.2) + 16, _MAX_WINDOW, IDENTIFIER_SPACE - start)
+        if window <= 0:
+            raise RuntimeError("用户 identifier 已全部分配完")
+
+        candidates = [identifier_for_sequence(s) for s in range(start, start + window)]
+        taken = set(
+            CustomUser.objects.filter(identifier__in=candidates).values_list('identifier', flat=True)
+        )
+        free_ratio = max(1 - len(taken) / window, 0.01)
+
+        picked = []
+        end = start
+        for candidate in candidates:
+            end += 1
+            if candidate not in taken:
+                picked.append(candidate)
+                if len(picked) == need:
+                    break
+        if sequence.filter(next_value=start).update(next_value=end):
+            allocated += picked
+    return allocated
+
+
 def generate_unique_user_id():
-    while True:
-        user_id = ''.join([str(random.randint(0, 9)) for _ in range(6)])
-        if user_id[0] != '0' and not CustomUser.objects.filter(identifier=user_id).exists():
-            return user_id
+    return allocate_identifiers(1)[0]
+
+
+def token_version_cache_key(user_id):
+    return f'user_token_version:{user_id}'
+
+
+# 停用或已删除的用户：任何 token 的版本号都不会与之相等
+INACTIVE_TOKEN_VERSION = -1
+
+
+def remember_token_version(user_id, version):
+    """
+    记录用户最新的 token_version，供无状态认证比对（见 users/authentication.py）。
+    只需保留一个 access token 有效期：更早签发的 token 本身已过期。
+    """
+    timeout = int(jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 60
+    cache.set(token_version_cache_key(user_id), version, timeout)
+
+
+def current_token_version(user_id) -> int:
+    """
+    用户当前的 token_version。缓存未命中（其它进程改的、重启过、缓存被清）时读一次库，
+    只缓存 TOKEN_VERSION_CACHE_TIMEOUT 秒：缓存不共享时，这也是别的进程里的变更最晚生效的时间。
+    """
+    key = token_version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        row = CustomUser.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+        version = row[0] if row is not None and row[1] else INACTIVE_TOKEN_VERSION
+        cache.set(key, version, getattr(settings, 'TOKEN_VERSION_CACHE_TIMEOUT', 60))
+    return version
 
 class UserTitle(models.Model):
     name = models.CharField(max_length=50)
@@ -27,6 +112,12 @@ class CustomUser(AbstractUser):
         ('admin', '系统管理员')
     )
 
+    EMAIL_DELIVERY_CHOICES = (
+        ('immediate', '即时发送'),
+        ('hourly', '每小时汇总'),
+        ('daily', '每日汇总'),
+    )
+
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
 
     nickname = models.CharField(max_length=50)
@@ -40,11 +131,68 @@ class CustomUser(AbstractUser):
     level = models.CharField(max_length=10, default='F')
     title = models.ForeignKey(UserTitle, on_delete=models.SET_NULL, null=True, blank=True)
     identifier = models.CharField(max_length=6, unique=True, editable=False, blank=True)
+    email_delivery = models.CharField(max_length=10, choices=EMAIL_DELIVERY_CHOICES, default='immediate')  # 通知邮件的发送方式
+    # access token 中 role / level 等声明的版本号；这些字段或密码变化时递增，旧 token 随之失效
+    token_version = models.PositiveIntegerField(default=0)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # 排行榜：全站与按角色两种口径
+            models.Index(fields=['-experience'], name='user_experience_idx'),
+            models.Index(fields=['role', '-experience'], name='user_role_experience_idx'),
+            models.Index(fields=['-tokens'], name='user_tokens_idx'),
+            models.Index(fields=['role', '-tokens'], name='user_role_tokens_idx'),
+            models.Index(fields=['-volunteerTime'], name='user_volunteertime_idx'),
+            models.Index(fields=['role', '-volunteerTime'], name='user_role_volunteertime_idx'),
+            # 昵称 / 实名前缀搜索：SQLite 的 LIKE 'xx%' 只会用 NOCASE 排序规则的索引
+            models.Index(Collate('nickname', 'NOCASE'), name='user_nickname_nocase_idx'),
+            models.Index(Collate('realname', 'NOCASE'), name='user_realname_nocase_idx'),
+        ]
     
 
+    # 从数据库读出时的等级（见 from_db），新建的实例为 None
+    _loaded_level = None
+    # 读出时写进 token 声明的字段值，save() 时据此判断是否需要递增 token_version
+    _loaded_claims = None
+    # 由 access token 声明构造、其余字段尚未加载的实例（见 from_claims）
+    _claims_only = False
+
+    # 写进 access token 的字段
+    TOKEN_CLAIM_FIELDS = ('role', 'level', 'is_active')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记住读出时的等级，save() 时据此判断是否升级，无需再查一次数据库
+        instance._loaded_level = instance.__dict__.get('level')
+        instance._loaded_claims = {f: instance.__dict__.get(f) for f in cls.TOKEN_CLAIM_FIELDS}
+        return instance
+
+    @classmethod
+    def from_claims(cls, user_id, role, level, token_version):
+        """
+        用 access token 中的声明构造用户，不查数据库。
+        其余字段均为延迟字段，第一次访问时一次性补齐（见 refresh_from_db）。
+        is_active 直接取 True：停用的用户在认证时已按 current_token_version 拒绝。
+        """
+        known = {'id': user_id, 'role': role, 'level': level, 'is_active': True, 'token_version': token_version}
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in known]
+        instance = cls.from_db(router.db_for_read(cls), field_names, [known[name] for name in field_names])
+        instance._claims_only = True
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        if self._claims_only and fields is not None:
+            # 访问任一延迟字段时把其余延迟字段一并取回，避免逐字段查询
+            fields = list({*fields, *self.get_deferred_fields()})
+            self._claims_only = False
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'level' in fields:
+            self._loaded_level = self.__dict__.get('level')
+
     def calculate_level(self):
         xp = self.experience
-        if xp >= 50000 and self.title:
+        if xp >= 50000 and self.title_id:
             return self.title.name
         # 从大到小遍历，找到符合的等级
         for threshold, lvl in reversed(settings.LEVEL_THRESHOLDS):
@@ -70,17 +218,31 @@ class CustomUser(AbstractUser):
         return current_threshold
 
     def save(self, *args, **kwargs):
-        # 保存之前的等级，用来对比是否升级
-        old_level = None
-        if self.pk:  # pk 存在说明是更新，不是新建
-            old_level = CustomUser.objects.filter(pk=self.pk).values_list('level', flat=True).first()
+        # 读出时的等级，用来对比是否升级（新建用户为 None）
+        old_level = self._loaded_level
 
         # 如果没有 identifier 则生成一个
         if not self.identifier:
             self.identifier = generate_unique_user_id()
 
-        self.level = self.calculate_level()
+        # 只有经验或称号可能变化时才重新计算等级
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'experience', 'title'} & set(update_fields):
+            self.level = self.calculate_level()
+            if update_fields is not None and 'level' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'level']
+
+        # 角色、等级、启用状态或密码变化：递增版本号，让携带旧声明的 access token 失效
+        if not self._state.adding and self._token_claims_changed():
+            self.token_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'token_version']
+            version = self.token_version if self.is_active else INACTIVE_TOKEN_VERSION
+            transaction.on_commit(lambda: remember_token_version(self.pk, version))
+
         super().save(*args, **kwargs)
+        self._loaded_level = self.level
+        self._loaded_claims = {f: self.__dict__.get(f) for f in self.TOKEN_CLAIM_FIELDS}
 
         # 如果等级提升，发送通知
         if old_level and self.level != old_level:
@@ -91,5 +253,59 @@ class CustomUser(AbstractUser):
                 task=None
             )
 
+    def _token_claims_changed(self):
+        if self._password is not None:  # set_password() 之后尚未保存
+            return True
+        if self._loaded_claims is None:
+            return False
+        return any(
+            field in self.__dict__ and self.__dict__[field] != old
+            for field, old in self._loaded_claims.items()
+        )
+
     def __str__(self):
         return self.nickname or self.username
+
+
+
+class LeaderboardSnapshot(models.Model):
+    """某个榜单（指标 + 范围）最近一次刷新的概况"""
+    metric = models.CharField(max_length=20)
+    scope = models.CharField(max_length=20)  # all / student / teacher
+    total = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'scope'], name='unique_leaderboard_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}/{self.scope} @ {self.refreshed_at:%Y-%m-%d %H:%M}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    排行榜快照中的一行：定期由 refresh_leaderboards 重建，
+    冗余保存展示字段，接口直接读快照，不再对用户表排序或计数。
+    """
+    metric = models.CharField(max_length=20)
+    scope = models.CharField(max_length=20)
+    rank = models.PositiveIntegerField()
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    value = models.FloatField()
+
+    identifier = models.CharField(max_length=6)
+    nickname = models.CharField(max_length=50)
+    avatar = models.CharField(max_length=50)
+    level = models.CharField(max_length=10)
+
+    class Meta:
+        constraints = [
+            # “我的排名”按 (metric, scope, user) 走唯一索引
+            models.UniqueConstraint(fields=['metric', 'scope', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            # 前 N 名按 (metric, scope, rank) 走索引
+            models.Index(fields=['metric', 'scope', 'rank'], name='leaderboard_rank_idx'),
+        ]
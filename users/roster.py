@@ -0,0 +1,136 @@
+# users/roster.py
+"""
+批量导入学生名单（CSV / JSON）：
+  - 逐行校验，错误按行汇总，不影响其它行；
+  - 已存在的 username 直接跳过，重复导入同一份名单是安全的；
+  - PBKDF2 哈希放到进程池里并行计算，用户按批 bulk_create，identifier 一次性预先分配。
+接口使用各功能共用的进程池（backend/pools.py），管理命令按 --workers 另建临时进程池；
+每个密码约 0.5 秒，接口一次只接受 ROSTER_IMPORT_MAX_ROWS 行，更大的名单用 import_roster 命令导入。
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from backend import pools
+from .models import CustomUser, allocate_identifiers
+
+ROSTER_FIELDS = ('username', 'password', 'nickname', 'realname', 'email', 'role')
+ROSTER_ROLES = ('student', 'teacher')
+
+# 少于这个数量时直接在当前进程哈希，省掉启动进程池的开销
+PARALLEL_HASH_THRESHOLD = 16
+
+
+def parse_roster(content, fmt='csv'):
+    """把上传的名单解析成字典列表；CSV 需要表头，JSON 可以是数组或 {"students": [...]}"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')  # 兼容 Excel 导出的带 BOM 的 CSV
+
+    if fmt == 'json':
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get('students', [])
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise ValueError('JSON 名单必须是对象数组')
+        return data
+
+    reader = csv.DictReader(io.StringIO(content))
+    if not reader.fieldnames or 'username' not in reader.fieldnames:
+        raise ValueError('CSV 名单缺少 username 列')
+    return list(reader)
+
+
+def _clean_row(raw):
+    row = {field: str(raw.get(field) or '').strip() for field in ROSTER_FIELDS}
+    row['role'] = row['role'] or 'student'
+    if not row['realname']:
+        row['realname'] = 'none'
+
+    if not row['username']:
+        raise ValidationError('缺少 username')
+    if len(row['username']) > 150:
+        raise ValidationError('username 长度不能超过150个字符')
+    CustomUser.username_validator(row['username'])
+    if not row['password']:
+        raise ValidationError('缺少 password')
+    if len(row['nickname']) > 50:
+        raise ValidationError('昵称长度不能超过50个字符')
+    if len(row['realname']) > 50:
+        raise ValidationError('姓名长度不能超过50个字符')
+    if row['role'] not in ROSTER_ROLES:
+        raise ValidationError(f'role 只能是 {" / ".join(ROSTER_ROLES)}')
+    return row
+
+
+def hash_passwords(passwords, workers=None):
+    """并行计算密码哈希，返回顺序与输入一致；workers 为 None 时使用共用进程池"""
+    if len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return [make_password(p) for p in passwords]
+    cpus = workers if workers is not None else pools.max_workers()
+    chunksize = max(1, len(passwords) // (max(cpus, 1) * 4))
+    return pools.map_all(make_password, passwords, workers=workers, chunksize=chunksize)
+
+
+def import_roster(records, *, workers=None, batch_size=500, dry_run=False):
+    """
+    导入名单，返回汇总：
+      {'total', 'created', 'skipped'（已存在的 username）, 'errors': [{'row', 'username', 'error'}]}
+    row 为名单中的序号（从 1 开始，不含表头）。
+    """
+    errors, rows, seen = [], [], set()
+    for index, raw in enumerate(records, start=1):
+        try:
+            row = _clean_row(raw)
+        except ValidationError as exc:
+            errors.append({'row': index, 'username': str(raw.get('username') or ''), 'error': '；'.join(exc.messages)})
+            continue
+        if row['username'] in seen:
+            errors.append({'row': index, 'username': row['username'], 'error': '名单内 username 重复'})
+            continue
+        seen.add(row['username'])
+        rows.append(row)
+
+    existing = set()
+    usernames = [row['username'] for row in rows]
+    for start in range(0, len(usernames), 500):
+        existing.update(
+            CustomUser.objects.filter(username__in=usernames[start:start + 500]).values_list('username', flat=True)
+        )
+    rows = [row for row in rows if row['username'] not in existing]
+
+    summary = {'total': len(records), 'created': 0, 'skipped': len(existing), 'errors': errors}
+    if dry_run:
+        summary['would_create'] = len(rows)
+        return summary
+    if not rows:
+        return summary
+
+    hashes = hash_passwords([row['password'] for row in rows], workers=workers)
+    identifiers = allocate_identifiers(len(rows))
+    users = [
+        CustomUser(
+            username=row['username'],
+            password=password_hash,
+            nickname=row['nickname'],
+            realname=row['realname'],
+            email=row['email'],
+            role=row['role'],
+            identifier=identifier,
+        )
+        for row, password_hash, identifier in zip(rows, hashes, identifiers)
+    ]
+
+    for start in range(0, len(users), batch_size):
+        batch = users[start:start + batch_size]
+        with transaction.atomic():
+            # 检查之后、写入之前，同名用户可能已由并发的导入或注册创建：冲突的行直接忽略，
+            # 再按本次分配的 identifier 数出实际写入的行数，其余计为跳过
+            CustomUser.objects.bulk_create(batch, ignore_conflicts=True)
+            created = CustomUser.objects.filter(identifier__in=[user.identifier for user in batch]).count()
+        summary['created'] += created
+        summary['skipped'] += len(batch) - created
+    return summary
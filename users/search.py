@@ -0,0 +1,166 @@
+# users/search.py
+"""
+找队友用的用户搜索：
+  1. 昵称 / 实名前缀匹配，走 NOCASE 排序规则的索引，按字典序取前 N 个；
+  2. 可选的 trigram 模糊匹配，走 FTS5 表 users_customuser_search（见迁移 0011）。
+FTS 表由 users_customuser 上的触发器同步。SQLite 上 AddField 等迁移会重建用户表，顺带删掉这些触发器，
+因此每次 migrate 之后由 ensure_search_triggers 补建（post_migrate，见 apps.py），补建时全量重新同步一次。
+"""
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Collate
+
+from .lookup import USER_CARD_FIELDS
+from .models import CustomUser
+
+# trigram 至少需要 3 个字符
+MIN_FUZZY_LENGTH = 3
+
+# 与迁移 0011 中的触发器相同；实名默认值 'none' 不入索引
+SEARCH_TRIGGERS = {
+    'users_customuser_search_ai': """
+        CREATE TRIGGER IF NOT EXISTS users_customuser_search_ai
+        AFTER INSERT ON users_customuser BEGIN
+            INSERT INTO users_customuser_search(rowid, nickname, realname)
+            VALUES (new.id, new.nickname, NULLIF(new.realname, 'none'));
+        END
+    """,
+    'users_customuser_search_ad': """
+        CREATE TRIGGER IF NOT EXISTS users_customuser_search_ad
+        AFTER DELETE ON users_customuser BEGIN
+            DELETE FROM users_customuser_search WHERE rowid = old.id;
+        END
+    """,
+    'users_customuser_search_au': """
+        CREATE TRIGGER IF NOT EXISTS users_customuser_search_au
+        AFTER UPDATE OF nickname, realname ON users_customuser
+        WHEN old.nickname IS NOT new.nickname OR old.realname IS NOT new.realname BEGIN
+            DELETE FROM users_customuser_search WHERE rowid = old.id;
+            INSERT INTO users_customuser_search(rowid, nickname, realname)
+            VALUES (new.id, new.nickname, NULLIF(new.realname, 'none'));
+        END
+    """,
+}
+
+
+def ensure_search_triggers(using='default') -> bool:
+    """补建缺失的同步触发器并全量重新同步 FTS 表；触发器齐全时什么都不做，返回是否补建过"""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'users_customuser_search' "
+            "OR (type = 'trigger' AND tbl_name = 'users_customuser')"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if 'users_customuser_search' not in existing:
+            return False  # 迁移 0011 之前
+        missing = [name for name in SEARCH_TRIGGERS if name not in existing]
+        if not missing:
+            return False
+        with transaction.atomic(using=using):
+            for name in missing:
+                cursor.execute(SEARCH_TRIGGERS[name])
+            # 触发器缺失期间的写入都没有同步，整表重建
+            cursor.execute("DELETE FROM users_customuser_search")
+            cursor.execute(
+                "INSERT INTO users_customuser_search(rowid, nickname, realname) "
+                "SELECT id, nickname, NULLIF(realname, 'none') FROM users_customuser"
+            )
+    return True
+
+
+def _prefix_matches(field, query, limit):
+    qs = CustomUser.objects.filter(is_active=True, **{f'{field}__istartswith': query})
+    if field == 'realname':
+        qs = qs.exclude(realname='none')
+    return list(
+        qs.order_by(Collate(field, 'NOCASE')).values('id', *USER_CARD_FIELDS)[:limit]
+    )
+
+
+# 出现在超过这么多用户里的 trigram 视为“常见”，不参与 bm25 排序（排序开销与命中行数成正比）
+FUZZY_MAX_DOC_FREQ = 1000
+
+
+def _quote(term):
+    return '"{}"'.format(term.replace('"', '""'))
+
+
+def _match_ids(cursor, expression, limit, ranked):
+    sql = "SELECT rowid FROM users_customuser_search WHERE users_customuser_search MATCH %s"
+    if ranked:
+        sql += " ORDER BY rank"
+    cursor.execute(sql + " LIMIT %s", [expression, limit])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _fuzzy_ids(query, limit):
+    """
+    依次取：
+      1. 包含完整关键词的用户（子串匹配，不排序，命中即停）；
+      2. 与关键词共享较罕见 trigram 的用户，按 bm25 排序，错一两个字也能命中；
+      3. 仍不足时，用常见 trigram 不排序地补齐。
+    """
+    if connection.vendor != 'sqlite':
+        return list(
+            CustomUser.objects.filter(Q(nickname__icontains=query) | Q(realname__icontains=query))
+            .values_list('id', flat=True)[:limit]
+        )
+
+    grams = list(dict.fromkeys(query[i:i + 3].lower() for i in range(len(query) - 2)))
+    with connection.cursor() as cursor:
+        ids = _match_ids(cursor, _quote(query), limit, ranked=False)
+        if len(ids) >= limit or len(grams) < 2:
+            return ids
+
+        cursor.execute(
+            "SELECT term FROM users_customuser_search_vocab WHERE term IN ({}) AND doc > %s".format(
+                ', '.join(['%s'] * len(grams))
+            ),
+            [*grams, FUZZY_MAX_DOC_FREQ],
+        )
+        common = {row[0] for row in cursor.fetchall()}
+        rare = [g for g in grams if g not in common]
+
+        for terms, ranked in ((rare, True), (common, False)):
+            if not terms or len(ids) >= limit:
+                continue
+            matched = _match_ids(cursor, ' OR '.join(_quote(t) for t in terms), limit, ranked)
+            ids += [i for i in matched if i not in ids]
+    return ids[:limit]
+
+
+def search_users(query, *, fuzzy=False, limit=20):
+    """
+    返回按相关度排序的用户名片列表：昵称前缀 > 实名前缀 > 模糊匹配。
+    名片字段与批量查询接口一致（不含实名）。
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    rows = _prefix_matches('nickname', query, limit)
+    if len(rows) < limit:
+        rows += _prefix_matches('realname', query, limit)
+
+    if fuzzy and len(query) >= MIN_FUZZY_LENGTH:
+        seen = {row['id'] for row in rows}
+        ids = [i for i in _fuzzy_ids(query, limit * 2) if i not in seen]
+        if ids:
+            by_id = {
+                row['id']: row
+                for row in CustomUser.objects.filter(id__in=ids, is_active=True).values('id', *USER_CARD_FIELDS)
+            }
+            rows += [by_id[i] for i in ids if i in by_id]
+
+    results, seen = [], set()
+    for row in rows:
+        if row['id'] in seen:
+            continue
+        seen.add(row['id'])
+        results.append({field: row[field] for field in USER_CARD_FIELDS})
+        if len(results) >= limit:
+            break
+    return results
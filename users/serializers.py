@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CustomUser, UserTitle
+from .models import CustomUser, UserTitle, LeaderboardEntry
 
 class UserTitleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,10 +17,16 @@ class UserSerializer(serializers.ModelSerializer):
         fields = [
             'identifier', 'username', 'nickname', 'realname', 'email', 'avatar', 'bio',
             'experience', 'next_level_xp', 'current_level_xp' , 'tokens', 'volunteerTime', 'level', 'title', 'role',
+            'email_delivery',
         ]
     
     def get_next_level_xp(self, obj):
         return obj.get_next_level_xp()
 
     def get_current_level_xp(self, obj):
-        return obj.get_current_level_xp()
\ No newline at end of file
+        return obj.get_current_level_xp()
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LeaderboardEntry
+        fields = ['rank', 'identifier', 'nickname', 'avatar', 'level', 'value']
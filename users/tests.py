@@ -1,3 +1,529 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from notifications.models import Notification
+from tasks.models import Task
+from .authentication import ClaimsRefreshToken
+from .identifiers import identifier_for_sequence
+from .leaderboards import get_snapshot, refresh_leaderboard
+from .lookup import get_user_cards
+from .roster import import_roster, parse_roster
+from .search import ensure_search_triggers, search_users
+from .models import CustomUser, IdentifierSequence, LeaderboardEntry, LeaderboardSnapshot, allocate_identifiers
+
+
+class LevelTrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user(username='stu', password='pw', nickname='学生')
+        cls.teacher = CustomUser.objects.create_user(username='tea', password='pw', nickname='老师', role='teacher')
+
+    def _auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    def _level_selects(self, queries):
+        return [q for q in queries if q['sql'].startswith('SELECT "users_customuser"."level"')]
+
+    def test_loaded_level_is_tracked(self):
+        user = CustomUser.objects.get(pk=self.student.pk)
+        self.assertEqual(user._loaded_level, 'F')
+
+    def test_profile_update_costs_one_select_and_one_update(self):
+        # 1 条：JWT 认证读取用户；1 条：只更新 nickname
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                '/users/update-profile/', {'nickname': '新昵称'}, **self._auth(self.student)
+            )
+        self.assertEqual(response.status_code, 200)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.nickname, '新昵称')
+
+    def test_update_fields_without_experience_skips_level(self):
+        user = CustomUser.objects.get(pk=self.student.pk)
+        user.experience = 200  # 未保存的经验变化不应被顺带写入等级
+        user.nickname = 'x'
+        with self.assertNumQueries(1):
+            user.save(update_fields=['nickname'])
+        user.refresh_from_db()
+        self.assertEqual(user.level, 'F')
+
+    def test_reward_save_detects_level_up_without_extra_select(self):
+        user = CustomUser.objects.get(pk=self.student.pk)
+        user.experience += 150
+        with CaptureQueriesContext(connection) as ctx:
+            user.save(update_fields=['experience'])
+        self.assertEqual(self._level_selects(ctx.captured_queries), [])
+        self.assertEqual(CustomUser.objects.get(pk=user.pk).level, 'E')
+        self.assertTrue(Notification.objects.filter(user=user, type='level_up').exists())
+
+        # 等级未变化时：只有一条 UPDATE
+        user.experience += 10
+        with self.assertNumQueries(1):
+            user.save(update_fields=['experience'])
+
+    def test_approve_completion_reward_queries(self):
+        task = Task.objects.create(
+            title='任务', description='d', task_type='solo', publisher=self.teacher,
+            deadline=timezone.now() + timedelta(days=1), experience_reward=150,
+        )
+        task.accepted_by.add(self.student)
+
+        # 认证 1 + 任务读写 2 + 参与者 1 + 发奖 UPDATE 1
+        # + 升级通知与完成通知各 5（savepoint、insert、计数 2 条、release）+ 请求处理 2
+        with CaptureQueriesContext(connection) as ctx, self.assertNumQueries(17):
+            response = self.client.post(f'/tasks/{task.id}/complete/', **self._auth(self.teacher))
+        self.assertEqual(response.status_code, 200)
+
+        # 发奖时不再为判断升级额外查询等级
+        self.assertEqual(self._level_selects(ctx.captured_queries), [])
+        self.student.refresh_from_db()
+        self.assertEqual((self.student.experience, self.student.level), (150, 'E'))
+        self.assertEqual(
+            Notification.objects.filter(user=self.student, type__in=['level_up', 'completed']).count(), 2
+        )
+
+
+class ClaimsAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = CustomUser.objects.create_user(username='stu', password='pw', nickname='学生')
+
+    def setUp(self):
+        cache.clear()
+
+    def _tokens(self, user):
+        refresh = ClaimsRefreshToken.for_user(user)
+        return str(refresh), str(refresh.access_token)
+
+    def _user_selects(self, queries):
+        return [q for q in queries if q['sql'].startswith('SELECT') and 'FROM "users_customuser"' in q['sql']]
+
+    def _warm(self, access):
+        # 第一次请求缓存未命中，读一次 token_version；之后走纯缓存
+        self.assertEqual(self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 200)
+
+    def test_task_list_does_not_load_user(self):
+        _, access = self._tokens(self.student)
+        self._warm(access)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._user_selects(ctx.captured_queries), [])
+
+    def test_non_claim_attribute_loads_user_once(self):
+        _, access = self._tokens(self.student)
+        self._warm(access)
+        with self.assertNumQueries(2):  # 补齐用户 1 + 更新 nickname 1
+            response = self.client.post(
+                '/users/update-profile/', {'nickname': '新昵称'}, HTTP_AUTHORIZATION=f'Bearer {access}'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'stu')
+
+    def test_level_change_outdates_access_token(self):
+        refresh, access = self._tokens(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = CustomUser.objects.get(pk=self.student.pk)
+            user.experience = 150
+            user.save(update_fields=['experience'])
+        self.assertEqual(CustomUser.objects.get(pk=user.pk).token_version, 1)
+
+        response = self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.post('/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        new_access = response.json()['access']
+        response = self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {new_access}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_change_keeps_token_valid(self):
+        _, access = self._tokens(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/users/update-profile/', {'nickname': 'x'}, HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(CustomUser.objects.get(pk=self.student.pk).token_version, 0)
+        response = self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_miss_reads_version_from_database(self):
+        _, access = self._tokens(self.student)
+        # 其它进程里的变更：本进程缓存里没有新版本号
+        CustomUser.objects.filter(pk=self.student.pk).update(token_version=5)
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self._user_selects(ctx.captured_queries)), 1)
+
+    def test_deactivated_or_deleted_user_is_rejected(self):
+        _, access = self._tokens(self.student)
+        self._warm(access)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = CustomUser.objects.get(pk=self.student.pk)
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 401)
+
+        # 绕过 save() 停用（版本号不变），缓存未命中时同样拒绝
+        other = CustomUser.objects.create_user(username='other', password='pw')
+        _, other_access = self._tokens(other)
+        CustomUser.objects.filter(pk=other.pk).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {other_access}').status_code, 401)
+
+        CustomUser.objects.filter(pk=other.pk).delete()
+        cache.clear()
+        self.assertEqual(self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {other_access}').status_code, 401)
+
+    def test_password_change_revokes_refresh_token(self):
+        refresh, access = self._tokens(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = CustomUser.objects.get(pk=self.student.pk)
+            user.set_password('new-pw')
+            user.save()
+
+        self.assertEqual(self.client.get('/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, 401)
+        self.assertEqual(self.client.post('/token/refresh/', {'refresh': refresh}).status_code, 401)
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def make(name, experience, role='student'):
+            return CustomUser.objects.create_user(
+                username=name, password='pw', nickname=name, role=role, experience=experience,
+            )
+        cls.a = make('a', 300)
+        cls.b = make('b', 200)
+        cls.c = make('c', 200)
+        cls.d = make('d', 100)
+        cls.t = make('t', 250, role='teacher')
+        call_command('refresh_leaderboards', stdout=io.StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, path, user=None, **params):
+        response = self.client.get(
+            path, params, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user or self.a)}',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _ranks(self, **params):
+        return [(r['nickname'], r['rank']) for r in self._get('/users/leaderboard/', **params)['results']]
+
+    def test_ties_share_a_rank(self):
+        self.assertEqual(
+            self._ranks(role='student'),
+            [('a', 1), ('b', 2), ('c', 2), ('d', 4)],
+        )
+
+    def test_role_scopes(self):
+        self.assertEqual(self._ranks()[:2], [('a', 1), ('t', 2)])
+        self.assertEqual(self._ranks(role='teacher'), [('t', 1)])
+        self.assertEqual(self._get('/users/leaderboard/', role='student')['total'], 4)
+
+    def test_my_rank(self):
+        body = self._get('/users/leaderboard/me/', user=self.c, role='student')
+        self.assertEqual((body['rank'], body['value'], body['total']), (2, 200, 4))
+        self.assertIsInstance(body['value'], float)
+        # 不在该范围的榜单上：取用户自己的值，类型与快照一致
+        body = self._get('/users/leaderboard/me/', user=self.c, role='teacher')
+        self.assertIsNone(body['rank'])
+        self.assertEqual(body['value'], 200)
+        self.assertIsInstance(body['value'], float)
+
+    def test_invalid_params(self):
+        response = self.client.get(
+            '/users/leaderboard/', {'metric': 'x'}, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.a)}',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_snapshot_is_served_without_rebuilding(self):
+        stale = timezone.now() - timedelta(hours=2)
+        LeaderboardSnapshot.objects.update(refreshed_at=stale)
+        CustomUser.objects.filter(pk=self.d.pk).update(experience=999)
+
+        # 只读快照一行，不在请求内重建；警告每个周期只记一次
+        with self.assertNumQueries(1), self.assertLogs('users.leaderboards', 'WARNING'):
+            snapshot = get_snapshot('experience', 'all')
+        self.assertEqual(snapshot.refreshed_at, stale)
+        with self.assertNoLogs('users.leaderboards', 'WARNING'):
+            get_snapshot('experience', 'all')
+        self.assertEqual(self._ranks()[0], ('a', 1))
+
+        # 由命令刷新后才反映新数据
+        refresh_leaderboard('experience', 'all')
+        self.assertEqual(self._ranks()[0], ('d', 1))
+
+    def test_missing_snapshot_returns_empty_board(self):
+        LeaderboardSnapshot.objects.all().delete()
+        LeaderboardEntry.objects.all().delete()
+        with self.assertLogs('users.leaderboards', 'WARNING'):
+            body = self._get('/users/leaderboard/')
+        self.assertEqual((body['total'], body['refreshed_at'], body['results']), (0, None, []))
+
+
+class IdentifierAllocationTests(TestCase):
+    def test_skips_legacy_identifiers_without_wasting_sequence(self):
+        # 旧版随机生成、恰好落在前几个序号上的 identifier
+        legacy = [identifier_for_sequence(s) for s in (0, 1, 3)]
+        CustomUser.objects.bulk_create(
+            [CustomUser(username=f'legacy{i}', password='!', identifier=ident) for i, ident in enumerate(legacy)]
+        )
+
+        allocated = allocate_identifiers(2)
+        self.assertEqual(allocated, [identifier_for_sequence(2), identifier_for_sequence(4)])
+        self.assertEqual(IdentifierSequence.objects.get(name='user').next_value, 5)
+
+        with self.assertNumQueries(3):
+            allocate_identifiers(1)
+        user = CustomUser.objects.create_user(username='new', password='pw')
+        self.assertEqual(user.identifier, identifier_for_sequence(6))
+
+
+class SearchTriggerTests(TestCase):
+    def _triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'users_customuser'")
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_triggers_survive_migrations(self):
+        # 0012 的 AddField 会重建用户表；post_migrate 之后触发器仍然齐全
+        self.assertEqual(self._triggers(), {
+            'users_customuser_search_ai', 'users_customuser_search_ad', 'users_customuser_search_au',
+        })
+        self.assertFalse(ensure_search_triggers())
+
+    def test_missing_triggers_are_reinstalled_and_resynced(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER users_customuser_search_ai")
+        CustomUser.objects.create_user(username='ds', password='pw', nickname='Dragonslayer')
+        self.assertEqual(search_users('agonsl', fuzzy=True), [])
+
+        self.assertTrue(ensure_search_triggers())
+        self.assertEqual([r['username'] for r in search_users('agonsl', fuzzy=True)], ['ds'])
+        CustomUser.objects.create_user(username='ds2', password='pw', nickname='Dragonslayer2')
+        self.assertEqual(len(search_users('agonsl', fuzzy=True)), 2)
+
+
+class UserSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for username, nickname, realname in (
+            ('u1', 'dragon', '张三'),
+            ('u2', 'Dragonfly', '李四'),
+            ('u3', 'adragon', '王五'),
+            ('u4', 'knight', '张龙'),
+        ):
+            CustomUser.objects.create_user(username=username, password='pw', nickname=nickname, realname=realname)
+        cls.viewer = CustomUser.objects.create_user(username='viewer', password='pw', nickname='viewer')
+
+    def _search(self, q, **params):
+        response = self.client.get(
+            '/users/search/', {'q': q, **params},
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.viewer)}',
+        )
+        self.assertEqual(response.status_code, 200)
+        return [row['username'] for row in response.json()['results']]
+
+    def test_prefix_order(self):
+        # 昵称前缀按不区分大小写的字典序，再接实名前缀；不含子串命中
+        self.assertEqual(self._search('DRAG'), ['u1', 'u2'])
+        self.assertEqual(self._search('张'), ['u1', 'u4'])
+
+    def test_fuzzy_adds_substring_and_typo_hits_after_prefix_hits(self):
+        self.assertEqual(self._search('dragon', fuzzy=1)[:2], ['u1', 'u2'])
+        self.assertIn('u3', self._search('dragon', fuzzy=1))
+        self.assertIn('u4', self._search('knihgt', fuzzy=1))
+        self.assertEqual(self._search('zzzz', fuzzy=1), [])
+
+    def test_default_realname_is_not_indexed(self):
+        CustomUser.objects.create_user(username='plain', password='pw', nickname='plain')
+        self.assertNotIn('plain', self._search('non', fuzzy=1))
+
+    def test_nickname_update_resyncs_index(self):
+        CustomUser.objects.filter(username='u4').update(nickname='paladin')
+        self.assertNotIn('u4', self._search('knight', fuzzy=1))
+        self.assertEqual(self._search('aladi', fuzzy=1), ['u4'])
+
+    def test_bulk_create_and_delete_are_indexed(self):
+        CustomUser.objects.bulk_create([
+            CustomUser(username='r1', password='!', nickname='Roster Mage', identifier='100001'),
+        ])
+        self.assertEqual(self._search('ster ma', fuzzy=1), ['r1'])
+        CustomUser.objects.filter(username='r1').delete()
+        self.assertEqual(self._search('ster ma', fuzzy=1), [])
+
+    def test_inactive_users_are_hidden(self):
+        CustomUser.objects.filter(username='u1').update(is_active=False)
+        self.assertNotIn('u1', self._search('dragon', fuzzy=1))
+
+    def test_invalid_query(self):
+        response = self.client.get('/users/search/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.viewer)}')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RosterImportTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin', password='pw', is_staff=True)
+
+    def _post(self, students, **params):
+        url = '/users/roster/import/'
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return self.client.post(
+            url, {'students': students}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}',
+        )
+
+    def test_parse_csv_with_bom(self):
+        content = '\ufeffusername,password,nickname\ns1,pw1,小明\n'.encode('utf-8')
+        self.assertEqual(parse_roster(content), [{'username': 's1', 'password': 'pw1', 'nickname': '小明'}])
+
+    def test_parse_csv_requires_username_column(self):
+        with self.assertRaises(ValueError):
+            parse_roster(b'name,password\ns1,pw1\n')
+
+    def test_parse_json_list_or_students_object(self):
+        rows = [{'username': 's1', 'password': 'pw1'}]
+        self.assertEqual(parse_roster('[{"username": "s1", "password": "pw1"}]', 'json'), rows)
+        self.assertEqual(parse_roster('{"students": [{"username": "s1", "password": "pw1"}]}', 'json'), rows)
+        with self.assertRaises(ValueError):
+            parse_roster('["s1"]', 'json')
+
+    def test_row_errors_do_not_block_other_rows(self):
+        summary = import_roster([
+            {'username': 's1', 'password': 'pw1'},
+            {'username': 's2'},
+            {'username': 's3', 'password': 'pw3', 'role': 'admin'},
+            {'username': 's1', 'password': 'pw1'},
+        ], workers=1)
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual([(e['row'], e['username']) for e in summary['errors']], [(2, 's2'), (3, 's3'), (4, 's1')])
+        student = CustomUser.objects.get(username='s1')
+        self.assertTrue(student.check_password('pw1'))
+        self.assertEqual(student.role, 'student')
+        self.assertTrue(student.identifier)
+
+    def test_rerun_skips_existing_usernames(self):
+        records = [{'username': f's{i}', 'password': 'pw'} for i in range(3)]
+        self.assertEqual(import_roster(records[:2], workers=1)['created'], 2)
+        summary = import_roster(records, workers=1)
+        self.assertEqual((summary['created'], summary['skipped']), (1, 2))
+        self.assertEqual(CustomUser.objects.filter(username__startswith='s').count(), 3)
+
+    def test_username_created_during_import_is_skipped(self):
+        from . import roster
+        hash_passwords = roster.hash_passwords
+
+        def register_then_hash(passwords, workers=None):
+            # 已存在检查之后、写入之前，另一个请求注册了同名用户
+            CustomUser.objects.create_user(username='s1', password='other')
+            return hash_passwords(passwords, workers=workers)
+
+        records = [{'username': f's{i}', 'password': 'pw'} for i in range(3)]
+        with mock.patch.object(roster, 'hash_passwords', side_effect=register_then_hash):
+            summary = import_roster(records, workers=1)
+        self.assertEqual((summary['created'], summary['skipped']), (2, 1))
+        self.assertTrue(CustomUser.objects.get(username='s1').check_password('other'))
+        self.assertTrue(CustomUser.objects.get(username='s2').check_password('pw'))
+
+    def test_endpoint_imports_and_dry_run_writes_nothing(self):
+        students = [{'username': 's1', 'password': 'pw1'}, {'username': 's2', 'password': 'pw2'}]
+        response = self._post(students, dry_run='true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['would_create'], 2)
+        self.assertFalse(CustomUser.objects.filter(username='s1').exists())
+
+        response = self._post(students)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 2)
+
+    @override_settings(ROSTER_IMPORT_MAX_ROWS=2)
+    def test_endpoint_rejects_rosters_above_request_limit(self):
+        students = [{'username': f's{i}', 'password': 'pw'} for i in range(3)]
+        response = self._post(students)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('import_roster', response.json()['error'])
+        self.assertFalse(CustomUser.objects.filter(username='s0').exists())
+        # 只校验时不哈希密码，仍按 MAX_ROWS 放行
+        self.assertEqual(self._post(students, dry_run='true').status_code, 200)
+
+    def test_endpoint_requires_staff(self):
+        student = CustomUser.objects.create_user(username='student', password='pw')
+        response = self.client.post(
+            '/users/roster/import/', {'students': []}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(student)}',
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class UserLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = CustomUser.objects.create_user(username='viewer', password='pw', nickname='查询者')
+        cls.users = [
+            CustomUser.objects.create_user(username=f'card{i}', password='pw', nickname=f'名片{i}') for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _lookup(self, **payload):
+        return self.client.post(
+            '/users/lookup/', payload, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.viewer)}',
+        )
+
+    def test_single_in_query_and_not_found(self):
+        identifiers = [u.identifier for u in self.users[:2]]
+        with CaptureQueriesContext(connection) as ctx:
+            cards, not_found = get_user_cards(identifiers + ['999999'], ['card2', 'card0', 'nobody'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn(' IN ', ctx.captured_queries[0]['sql'])
+        # 按请求顺序，同一用户只出现一次
+        self.assertEqual([c['username'] for c in cards], ['card0', 'card1', 'card2'])
+        self.assertEqual(not_found, ['999999', 'nobody'])
+
+    def test_endpoint_reports_not_found(self):
+        response = self._lookup(identifiers=[self.users[0].identifier, '999999'])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([c['nickname'] for c in body['results']], ['名片0'])
+        self.assertEqual(body['not_found'], ['999999'])
+
+    def test_limit_and_invalid_payload(self):
+        from .views import UserLookupView
+        too_many = [f'u{i}' for i in range(UserLookupView.MAX_LOOKUP + 1)]
+        self.assertEqual(self._lookup(usernames=too_many).status_code, 400)
+        self.assertEqual(self._lookup(identifiers='card0').status_code, 400)
+        self.assertEqual(self._lookup().status_code, 400)
+
+    def test_cache_hits_skip_database(self):
+        get_user_cards(usernames=['card0'])
+        with self.assertNumQueries(0):
+            cards, _ = get_user_cards(usernames=['card0'], identifiers=[self.users[0].identifier])
+        self.assertEqual(len(cards), 1)
+
+    def test_profile_update_invalidates_cached_card(self):
+        user = self.users[0]
+        get_user_cards(identifiers=[user.identifier])
+        response = self.client.post(
+            '/users/update-profile/', {'nickname': '新名字'}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+        )
+        self.assertEqual(response.status_code, 200)
+        cards, _ = get_user_cards(identifiers=[user.identifier])
+        self.assertEqual(cards[0]['nickname'], '新名字')
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import RegisterView, LoginView, UserDetailView
-from .views import UpdateProfileView
+from .views import UpdateProfileView, LeaderboardView, MyRankView, UserLookupView
+from .views import UserSearchView, RosterImportView
 
 
 urlpatterns = [
@@ -8,4 +9,9 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('', UserDetailView.as_view(), name='user-detail'),
     path('update-profile/', UpdateProfileView.as_view(), name='update-profile'),
+    path('lookup/', UserLookupView.as_view(), name='user-lookup'),
+    path('roster/import/', RosterImportView.as_view(), name='roster-import'),
+    path('search/', UserSearchView.as_view(), name='user-search'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', MyRankView.as_view(), name='leaderboard-me'),
 ]
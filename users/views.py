@@ -4,15 +4,20 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from .serializers import UserSerializer
+from .serializers import UserSerializer, LeaderboardEntrySerializer
+from .models import LeaderboardEntry
+from .leaderboards import LEADERBOARD_METRICS, LEADERBOARD_SCOPES, get_snapshot
+from .lookup import get_user_cards, invalidate_user_card
+from .search import search_users
+from .roster import import_roster, parse_roster
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import AllowAny
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.authentication import TokenAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken
 
 User = get_user_model()
 
@@ -32,12 +37,13 @@ class RegisterView(APIView):
 
 class UpdateProfileView(APIView):
     permission_classes = [IsAuthenticated]   # 必须登录
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
 
     def post(self, request):
         user = request.user  # 当前登录用户
         nickname = request.data.get("nickname")
         avatar = request.data.get("avatar")
+        changed = []
         
         # 校验 nickname
         if nickname is not None:
@@ -46,6 +52,7 @@ class UpdateProfileView(APIView):
                     "message": "昵称长度不能超过50个字符"
                 }, status=status.HTTP_400_BAD_REQUEST)
             user.nickname = nickname
+            changed.append("nickname")
 
         # 校验 avatar
         if avatar is not None:
@@ -54,8 +61,22 @@ class UpdateProfileView(APIView):
                     "message": "头像地址长度不能超过50个字符"
                 }, status=status.HTTP_400_BAD_REQUEST)
             user.avatar = avatar
+            changed.append("avatar")
 
-        user.save()
+        # 校验通知邮件发送方式
+        email_delivery = request.data.get("email_delivery")
+        if email_delivery is not None:
+            if email_delivery not in dict(User.EMAIL_DELIVERY_CHOICES):
+                return Response({
+                    "message": "email_delivery 只能是 immediate、hourly 或 daily"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            user.email_delivery = email_delivery
+            changed.append("email_delivery")
+
+        # 只写回改动的字段：不会覆盖并发修改的经验/代币，也不会触发等级重算
+        if changed:
+            user.save(update_fields=changed)
+            invalidate_user_card(user)
         return Response({
             "message": "资料更新成功",
             "user": UserSerializer(user).data
@@ -69,7 +90,7 @@ class LoginView(APIView):
         password = request.data.get('password')
         user = authenticate(request, username=username, password=password)
         if user:
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'refresh_token': str(refresh),
                 'access_token': str(refresh.access_token),
@@ -79,7 +100,7 @@ class LoginView(APIView):
 
 class UserDetailView(APIView):
     permission_classes = [AllowAny]  # 允许匿名访问，但使用 me=true 时需要认证
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ClaimsJWTAuthentication]
 
     def get(self, request):
         username = request.query_params.get('username')
@@ -106,3 +127,170 @@ class UserDetailView(APIView):
 
         serializer = UserSerializer(user)
         return Response(serializer.data)
+
+
+class UserLookupView(APIView):
+    """
+    批量查询用户名片：POST {"identifiers": [...], "usernames": [...]}
+    一次请求代替逐个调用 /users/?identifier=，返回找到的名片和未找到的值。
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_LOOKUP = 50
+
+    def post(self, request):
+        identifiers = request.data.get('identifiers', [])
+        usernames = request.data.get('usernames', [])
+        if not isinstance(identifiers, list) or not isinstance(usernames, list):
+            return Response(
+                {'error': 'identifiers 和 usernames 必须是数组'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not identifiers and not usernames:
+            return Response(
+                {'error': '请提供 identifiers 或 usernames'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(identifiers) + len(usernames) > self.MAX_LOOKUP:
+            return Response(
+                {'error': f'一次最多查询 {self.MAX_LOOKUP} 个用户'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cards, not_found = get_user_cards(identifiers, usernames)
+        return Response({'results': cards, 'not_found': not_found})
+
+
+class UserSearchView(APIView):
+    """
+    按昵称 / 实名搜索用户：GET /users/search/?q=小明&fuzzy=1&limit=20
+    默认只做前缀匹配，fuzzy=1 时追加 trigram 模糊匹配（关键词至少 3 个字符）。
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': '请提供搜索关键词 q'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(query) > 50:
+            return Response({'error': '搜索关键词不能超过50个字符'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({'error': 'limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.MAX_LIMIT))
+
+        fuzzy = request.query_params.get('fuzzy', '').lower() in ('1', 'true', 'yes')
+        return Response({'results': search_users(query, fuzzy=fuzzy, limit=limit)})
+
+
+def _leaderboard_params(request):
+    """解析 metric / role 参数，返回 (metric, scope, 错误响应)"""
+    metric = request.query_params.get('metric', 'experience')
+    scope = request.query_params.get('role', 'all')
+    if metric not in LEADERBOARD_METRICS:
+        return None, None, Response(
+            {'error': f'metric 仅支持 {", ".join(LEADERBOARD_METRICS)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if scope not in LEADERBOARD_SCOPES:
+        return None, None, Response(
+            {'error': f'role 仅支持 {", ".join(LEADERBOARD_SCOPES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return metric, scope, None
+
+
+class LeaderboardView(APIView):
+    """排行榜：读取 refresh_leaderboards 生成的快照，不在请求内排序全表"""
+    permission_classes = [IsAuthenticated]
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        metric, scope, error = _leaderboard_params(request)
+        if error:
+            return error
+
+        try:
+            limit = int(request.query_params.get('limit', 50))
+        except ValueError:
+            return Response({'error': 'limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.MAX_LIMIT))
+
+        snapshot = get_snapshot(metric, scope)
+        entries = LeaderboardEntry.objects.filter(
+            metric=metric, scope=scope, rank__lte=limit
+        ).order_by('rank', 'user_id')[:limit]
+
+        return Response({
+            'metric': metric,
+            'scope': scope,
+            'total': snapshot.total,
+            'refreshed_at': snapshot.refreshed_at,
+            'results': LeaderboardEntrySerializer(entries, many=True).data,
+        })
+
+
+class MyRankView(APIView):
+    """当前用户在某个榜单上的名次（以最近一次快照为准）"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        metric, scope, error = _leaderboard_params(request)
+        if error:
+            return error
+
+        snapshot = get_snapshot(metric, scope)
+        entry = LeaderboardEntry.objects.filter(
+            metric=metric, scope=scope, user_id=request.user.id
+        ).only('rank', 'value').first()
+
+        return Response({
+            'metric': metric,
+            'scope': scope,
+            'rank': entry.rank if entry else None,
+            # 与快照的 FloatField 保持同一类型
+            'value': entry.value if entry else float(getattr(request.user, metric)),
+            'total': snapshot.total,
+            'refreshed_at': snapshot.refreshed_at,
+        })
+
+
+class RosterImportView(APIView):
+    """
+    管理员批量导入名单：
+      - multipart 上传 file（.csv / .json），或
+      - JSON 请求体 {"students": [{"username": ..., "password": ..., ...}]}
+    ?dry_run=true 时只校验不写入。已存在的 username 会被跳过，可重复提交。
+    密码哈希很慢（每个约 0.5 秒），实际导入一次最多 ROSTER_IMPORT_MAX_ROWS 行，
+    保证在代理超时之前返回；更大的名单用 manage.py import_roster 导入，或拆分后分批提交。
+    """
+    permission_classes = [permissions.IsAdminUser]
+    MAX_ROWS = 5000  # dry_run 只校验，不哈希密码
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                fmt = request.data.get('format') or ('json' if upload.name.lower().endswith('.json') else 'csv')
+                records = parse_roster(upload.read(), fmt)
+            else:
+                records = request.data.get('students')
+                if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                    return Response(
+                        {'error': '请上传 file，或提供 students 数组'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        except (ValueError, UnicodeDecodeError) as exc:
+            return Response({'error': f'名单解析失败：{exc}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.query_params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        max_rows = self.MAX_ROWS if dry_run else getattr(settings, 'ROSTER_IMPORT_MAX_ROWS', 50)
+        if len(records) > max_rows:
+            return Response(
+                {'error': f'一次最多导入 {max_rows} 行，请拆分后再提交，或用 manage.py import_roster 导入整份名单'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(import_roster(records, dry_run=dry_run))